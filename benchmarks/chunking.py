@@ -0,0 +1,112 @@
+"""Chunker throughput and peak memory on a large generated course.
+
+  python -m benchmarks.chunking                  # 1M-word course
+  python -m benchmarks.chunking --words 200000
+
+Each variant runs in a fresh process so its peak RSS is measured on its own.
+"""
+from __future__ import annotations
+from typing import Any, Dict, List, Optional
+import argparse, multiprocessing as mp, os, random, resource, sys, tempfile, time
+
+_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+if _ROOT not in sys.path:
+    sys.path.insert(0, _ROOT)
+
+_SENTENCES = [
+    "Les moyens de paiement désignent l’ensemble des instruments permettant le transfert de fonds.",
+    "Une opération de paiement se définit comme toute action consistant à verser, transférer ou retirer des fonds.",
+    "L’autonomie de l’opération de paiement est juridiquement consacrée.",
+    "Le prestataire de services de paiement est tenu d’une obligation d’information renforcée !",
+    "Quelle est la portée de cette obligation ?",
+    "La jurisprudence admet une responsabilité de plein droit… sauf faute lourde du payeur.",
+]
+
+
+def write_course(path: str, words: int, seed: int = 0) -> int:
+    """Write a markdown course of about `words` words; returns its size in bytes."""
+    rng = random.Random(seed)
+    n = 0
+    with open(path, "w", encoding="utf-8") as f:
+        section = 0
+        while n < words:
+            section += 1
+            f.write(f"## {section}. Section {section}\n\n")
+            for _p in range(rng.randint(3, 8)):
+                para = " ".join(rng.choice(_SENTENCES) for _ in range(rng.randint(2, 9)))
+                f.write(para + "\n\n")
+                n += len(para.split())
+    return os.path.getsize(path)
+
+
+def _peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024  # bytes on macOS, KiB on Linux
+
+
+def _legacy_word_chunks(text: str, size: int, overlap: int) -> List[str]:
+    # Former /rag/retrieve splitter: whole file in memory, full words list, no sentence boundaries
+    words = text.split()
+    chunks, i = [], 0
+    while i < len(words):
+        chunks.append(" ".join(words[i:i + size]))
+        i += size - overlap
+    return chunks
+
+
+def _run(variant: str, path: str, size: int, overlap: int, out: Any) -> None:
+    from chunking import iter_file_chunks
+    base = _peak_rss_mb()
+    t0 = time.perf_counter()
+    n = 0
+    if variant == "streaming":
+        for _c in iter_file_chunks(path, max_tokens=size, overlap=overlap):
+            n += 1
+    else:
+        with open(path, "r", encoding="utf-8") as f:
+            n = len(_legacy_word_chunks(f.read(), size, overlap))
+    out.send({"chunks": n, "seconds": time.perf_counter() - t0, "base_rss_mb": base, "peak_rss_mb": _peak_rss_mb()})
+    out.close()
+
+
+def measure(variant: str, path: str, size: int = 220, overlap: int = 40) -> Dict[str, Any]:
+    ctx = mp.get_context("spawn")
+    recv, send = ctx.Pipe(duplex=False)
+    p = ctx.Process(target=_run, args=(variant, path, size, overlap, send))
+    p.start()
+    res = recv.recv()
+    p.join()
+    return res
+
+
+def run(words: int = 1_000_000, size: int = 220, overlap: int = 40, variants: Optional[List[str]] = None) -> Dict[str, Any]:
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "course.md")
+        nbytes = write_course(path, words)
+        rows = {}
+        for v in variants or ["streaming", "legacy_words"]:
+            r = measure(v, path, size, overlap)
+            r.update({"mb_per_s": round(nbytes / 1e6 / r["seconds"], 2), "words_per_s": int(words / r["seconds"]),
+                      "rss_delta_mb": round(r["peak_rss_mb"] - r["base_rss_mb"], 1)})
+            r["seconds"] = round(r["seconds"], 3)
+            rows[v] = r
+    return {"words": words, "mb": round(nbytes / 1e6, 2), "chunk_size": size, "overlap": overlap, "variants": rows}
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="Benchmark du découpage en chunks (débit, RSS max)")
+    ap.add_argument("--words", type=int, default=1_000_000)
+    ap.add_argument("--chunk-size", type=int, default=220)
+    ap.add_argument("--overlap", type=int, default=40)
+    args = ap.parse_args(argv)
+    report = run(args.words, args.chunk_size, args.overlap)
+    print(f"cours: {report['words']} mots, {report['mb']} Mo")
+    print(f"{'variante':<14} {'chunks':>8} {'s':>8} {'Mo/s':>8} {'mots/s':>10} {'RSS +Mo':>9} {'RSS max':>9}")
+    for name, r in report["variants"].items():
+        print(f"{name:<14} {r['chunks']:>8} {r['seconds']:>8} {r['mb_per_s']:>8} {r['words_per_s']:>10} "
+              f"{r['rss_delta_mb']:>9} {r['peak_rss_mb']:>9.1f}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,215 @@
+"""Offline endpoint benchmarks against the FastAPI app with a fake model backend.
+
+  python -m benchmarks.endpoints                 # run and print
+  python -m benchmarks.endpoints --save          # record benchmarks/baselines/endpoints.json (not committed)
+  python -m benchmarks.endpoints --check         # exit 1 on p95/throughput regression (records it on first run)
+
+Timings depend on the host, so the baseline is recorded on the machine that runs the
+check. Each scenario keeps the median of `--rounds` measured runs, each preceded by a
+run of a reference route; the limits follow that reference, so a busier moment on the
+same host does not read as a regression.
+"""
+from __future__ import annotations
+from typing import Any, Dict, List, Optional
+import argparse, json, os, platform, statistics, sys, tempfile, time
+from contextlib import contextmanager
+
+_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+if _ROOT not in sys.path:
+    sys.path.insert(0, _ROOT)
+
+from fake_provider import FakeLLMProvider  # noqa: E402
+from benchmarks.loadgen import run_load  # noqa: E402
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "baselines", "endpoints.json")
+
+_COURSE = (
+    "Les moyens de paiement désignent l’ensemble des instruments permettant le transfert de fonds. "
+    "Une opération de paiement se définit comme toute action consistant à verser, transférer ou retirer des fonds. "
+    "L’autonomie de l’opération de paiement est juridiquement consacrée.\n"
+) * 40
+_MCQ = {"status": "ok", "items": [{"id": f"q{i}", "difficulty": "easy", "bloom": "rappel",
+                                   "question": "Quelle est la bonne réponse ?", "options": ["a", "b", "c", "d"],
+                                   "answer_index": i % 4, "rationale": "", "citations": ["p1"]} for i in range(10)]}
+_SHEETS = {"title": "Fiches", "sheets": [{"title": f"Thème {i}", "summary": "Résumé court.", "full": "Texte complet.\nSuite."}
+                                          for i in range(8)]}
+
+_PARAPHRASES = ["Pourquoi l'opération de paiement est-elle autonome ?", "Pourquoi l’opération de paiement est autonome",
+                "Explique pourquoi l'opération de paiement est autonome.", "Pourquoi les opérations de paiement sont-elles autonomes ?"]
+
+
+def _course_id() -> str:
+    import server.app as srv
+    return srv.COURSES.put(_COURSE).id
+
+
+def _sheet_id() -> str:
+    import server.app as srv
+    return srv.SHEETS.put(_SHEETS)[0]
+
+
+# name -> (request factory, response check)
+SCENARIOS: Dict[str, tuple] = {
+    "api_chat": (lambda i: ("POST", "/api/chat", {"prompt": f"Qu'est-ce qu'une opération de paiement ? ({i})", "context": _COURSE}),
+                 lambda r: bool(r.json().get("reply"))),
+    "api_chat_course": (lambda i: ("POST", "/api/chat", {"prompt": f"Qu'est-ce qu'une opération de paiement ? ({i})", "course_id": _course_id()}),
+                        lambda r: bool(r.json().get("reply"))),
+    "api_chat_session": (lambda i: ("POST", "/api/chat", {"messages": [{"role": "user", "content": f"Et l'autonomie de l'opération ? ({i})"}],
+                                                          "session_id": "bench", "course_id": _course_id()}),
+                         lambda r: bool(r.json().get("reply"))),
+    # Paraphrases of a few questions: after the first answers, served by the semantic answer cache
+    "api_chat_paraphrase": (lambda i: ("POST", "/api/chat", {"prompt": _PARAPHRASES[i % len(_PARAPHRASES)], "course_id": _course_id()}),
+                            lambda r: bool(r.json().get("reply"))),
+    # Defined word for word in the course: answered by the extractive fast path
+    "api_chat_definition": (lambda i: ("POST", "/api/chat", {"prompt": "Qu'est-ce qu'une opération de paiement ?", "course_id": _course_id()}),
+                            lambda r: r.json().get("model") == "extractive"),
+    "llm_run": (lambda i: ("POST", "/llm/run", {"task": "chat", "prompt": f"Résume le cours. {i}", "provider": "fake", "max_tokens": 32}),
+                lambda r: r.json().get("status") == "ok"),
+    "extract": (lambda i: ("POST", "/v1/extract", {"text": _COURSE}),
+                lambda r: bool(r.json()["data"]["notions_cles"])),
+    "rag_retrieve": (lambda i: ("POST", "/rag/retrieve", {"text": _COURSE, "query": "autonomie paiement", "k": 4}),
+                     lambda r: bool(r.json().get("passages"))),
+    "validate_mcq": (lambda i: ("POST", "/validate/mcq", _MCQ),
+                     lambda r: r.json().get("ok") is True),
+    "validate_batch": (lambda i: ("POST", "/validate/mcq/batch", [_MCQ] * 20),
+                       lambda r: r.json().get("valid") == 20),
+    "mcq_grade": (lambda i: ("POST", "/mcq/grade", {"mcq": _MCQ, "answers": [(i + k) % 4 for k in range(10)]}),
+                  lambda r: r.json().get("status") == "ok"),
+    "sheets_publish": (lambda i: ("POST", "/sheets", _SHEETS),
+                       lambda r: bool(r.json().get("id"))),
+    "sheet_view": (lambda i: ("GET", f"/sheets/{_sheet_id()}", None),
+                   lambda r: "Thème 0" in r.text),
+}
+
+
+@contextmanager
+def fake_backend(prompt_eval_ms: float = 0.05, token_ms: float = 1.0, max_new_tokens: int = 32):
+    """Install a FakeLLMProvider as the internal model and redirect server writes to a temp dir."""
+    import server.app as srv
+    saved = {k: getattr(srv, k) for k in ("qwen_model", "tinyllama_model", "STORAGE_DIR", "RUNS_DIR", "_QWEN_CFG", "ROUTER", "COURSES", "CONVERSATIONS", "JOBS", "ANSWERS", "DEFINITIONS", "SHEETS")}
+    with tempfile.TemporaryDirectory() as tmp:
+        fake = FakeLLMProvider(prompt_eval_ms=prompt_eval_ms, token_ms=token_ms, max_new_tokens=max_new_tokens)
+        srv.qwen_model, srv.tinyllama_model = fake, None
+        srv._QWEN_CFG = {**srv._QWEN_CFG, "max_new_tokens": max_new_tokens}
+        srv.STORAGE_DIR, srv.RUNS_DIR = os.path.join(tmp, "sheets"), os.path.join(tmp, "runs")
+        os.makedirs(srv.STORAGE_DIR, exist_ok=True)
+        srv.SHEETS = type(srv.SHEETS)(srv.STORAGE_DIR)
+        srv.ROUTER = type(srv.ROUTER)(log_path=os.path.join(srv.RUNS_DIR, "routing.jsonl"))
+        srv.COURSES = type(srv.COURSES)(os.path.join(tmp, "courses"))
+        srv.CONVERSATIONS = type(srv.CONVERSATIONS)()
+        srv.ANSWERS = type(srv.ANSWERS)(threshold=srv.ANSWERS.threshold)
+        srv.DEFINITIONS = type(srv.DEFINITIONS)(threshold=srv.DEFINITIONS.threshold)
+        srv.JOBS = type(srv.JOBS)(os.path.join(tmp, "jobs"), srv.JOBS.handlers)
+        try:
+            yield srv.app
+        finally:
+            srv.CONVERSATIONS.close()
+            srv.JOBS.close()
+            srv.SHEETS.close()
+            for k, v in saved.items():
+                setattr(srv, k, v)
+
+
+# Cheapest route: timed next to each scenario as an in-run reference for how busy the host is
+_REFERENCE = (lambda i: ("GET", "/health", None), lambda r: r.json().get("status") == "ok")
+
+
+def _median_run(runs: List[Dict[str, Any]]) -> Dict[str, Any]:
+    out = {k: round(statistics.median(r[k] for r in runs), 2) for k in runs[0] if k not in ("requests", "errors")}
+    out.update(requests=sum(r["requests"] for r in runs), errors=sum(r["errors"] for r in runs))
+    return out
+
+
+def run_suite(requests: int = 100, concurrency: int = 8, only: Optional[List[str]] = None,
+              prompt_eval_ms: float = 0.05, token_ms: float = 1.0, rounds: int = 1) -> Dict[str, Any]:
+    results: Dict[str, Any] = {}
+    import server.app as srv
+    with fake_backend(prompt_eval_ms=prompt_eval_ms, token_ms=token_ms) as app:
+        for name, (factory, check) in SCENARIOS.items():
+            if only and name not in only:
+                continue
+            run_load(app, factory, requests=min(10, requests), concurrency=concurrency, check=check)  # warm-up
+            runs, refs = [], []
+            for _ in range(max(1, rounds)):
+                refs.append(run_load(app, _REFERENCE[0], requests=requests, concurrency=concurrency, check=_REFERENCE[1]))
+                srv.ANSWERS = type(srv.ANSWERS)(threshold=srv.ANSWERS.threshold)  # measured runs start with no cached answers
+                runs.append(run_load(app, factory, requests=requests, concurrency=concurrency, check=check))
+            results[name] = dict(_median_run(runs), ref_ms=round(statistics.median(r["mean_ms"] for r in refs), 2))
+    return {
+        "meta": {"python": platform.python_version(), "machine": platform.machine(), "requests": requests,
+                 "concurrency": concurrency, "prompt_eval_ms": prompt_eval_ms, "token_ms": token_ms,
+                 "rounds": max(1, rounds), "recorded_at": int(time.time())},
+        "scenarios": results,
+    }
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], tolerance: float = 0.25,
+            slack_ms: float = 20.0) -> List[str]:
+    """Regressions where p95 grew or throughput dropped by more than `tolerance`.
+
+    When the reference route ran slower than at recording time (a busy host), the limits
+    are relaxed by the same factor; they are never tightened, since the fake model's
+    sleeps do not get faster. `slack_ms` absorbs scheduler jitter on millisecond routes.
+    """
+    concurrency = (current.get("meta") or {}).get("concurrency") or 1
+    problems = []
+    for name, base in (baseline.get("scenarios") or {}).items():
+        cur = (current.get("scenarios") or {}).get(name)
+        if cur is None:
+            continue
+        if cur.get("errors"):
+            problems.append(f"{name}: {cur['errors']} erreurs")
+        scale = max(1.0, cur["ref_ms"] / base["ref_ms"]) if base.get("ref_ms") and cur.get("ref_ms") else 1.0
+        note = f", ×{scale:.2f} hôte" if scale > 1.0 else ""
+        if base.get("p95_ms") and cur["p95_ms"] > base["p95_ms"] * scale * (1 + tolerance) + slack_ms:
+            problems.append(f"{name}: p95 {cur['p95_ms']} ms > {base['p95_ms']} ms (+{tolerance:.0%}{note})")
+        # Throughput as wall time per request, so the same slack applies
+        if base.get("rps") and cur.get("rps") and \
+                1000 / cur["rps"] > 1000 / base["rps"] * scale * (1 + tolerance) + slack_ms / concurrency:
+            problems.append(f"{name}: débit {cur['rps']} req/s < {base['rps']} req/s (-{tolerance:.0%}{note})")
+    return problems
+
+
+def _print(report: Dict[str, Any]) -> None:
+    print(f"{'scénario':<16} {'req':>5} {'err':>4} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'req/s':>9}")
+    for name, r in report["scenarios"].items():
+        print(f"{name:<16} {r['requests']:>5} {r['errors']:>4} {r['p50_ms']:>9} {r['p95_ms']:>9} {r['p99_ms']:>9} {r['rps']:>9}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="Benchmarks des endpoints (backend LLM factice)")
+    ap.add_argument("--requests", type=int, default=100)
+    ap.add_argument("--concurrency", type=int, default=8)
+    ap.add_argument("--only", action="append", choices=sorted(SCENARIOS), help="scénario (répétable)")
+    ap.add_argument("--prompt-eval-ms", type=float, default=0.05, help="latence factice par mot du prompt")
+    ap.add_argument("--token-ms", type=float, default=1.0, help="latence factice par token généré")
+    ap.add_argument("--baseline", default=BASELINE_PATH)
+    ap.add_argument("--save", action="store_true", help="enregistrer le résultat comme baseline")
+    ap.add_argument("--check", action="store_true", help="comparer à la baseline (code retour 1 si régression)")
+    ap.add_argument("--tolerance", type=float, default=0.25)
+    ap.add_argument("--rounds", type=int, default=3, help="mesures par scénario (médiane)")
+    ap.add_argument("--slack-ms", type=float, default=20.0, help="écart absolu toléré en plus de --tolerance")
+    args = ap.parse_args(argv)
+    report = run_suite(args.requests, args.concurrency, args.only, args.prompt_eval_ms, args.token_ms, args.rounds)
+    _print(report)
+    if args.check and not os.path.exists(args.baseline):
+        # First run on this machine: it becomes the reference for the next checks
+        args.save, args.check = True, False
+    if args.save:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"✅ Baseline enregistrée: {args.baseline}")
+    if args.check:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            problems = compare(report, json.load(f), args.tolerance, args.slack_ms)
+        for p in problems:
+            print(f"❌ {p}")
+        if problems:
+            return 1
+        print("✅ Pas de régression")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,105 @@
+"""/v1/extract throughput in MB/s: the extraction engine vs. the former per-request function.
+
+  python -m benchmarks.extraction                       # 200 courses of ~5000 words
+  python -m benchmarks.extraction --docs 500 --words 20000
+
+Variants: `legacy` (former /v1/extract body, one document at a time), `engine`
+(extraction.extract_data), `batch_inline` and `batch_pool` (extraction.extract_many
+in this process vs. on a process pool). Every variant must produce the same output.
+"""
+from __future__ import annotations
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional
+import argparse, multiprocessing as mp, os, random, re, sys, time, unicodedata
+
+_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+if _ROOT not in sys.path:
+    sys.path.insert(0, _ROOT)
+
+
+def make_docs(n: int, words: int, seed: int = 0) -> List[str]:
+    """`n` markdown courses of about `words` words, with sentences from the chunking benchmark."""
+    from benchmarks.chunking import _SENTENCES
+    rng = random.Random(seed)
+    docs = []
+    for d in range(n):
+        parts, count = [f"# Cours {d}\n"], 0
+        while count < words:
+            para = " ".join(rng.choice(_SENTENCES) for _ in range(rng.randint(2, 9)))
+            parts.append(para + "\n")
+            count += len(para.split())
+        docs.append("\n".join(parts))
+    return docs
+
+
+def _legacy(text: str) -> Dict[str, Any]:
+    # Former /v1/extract: stopwords rebuilt, accents folded twice per token, regex compiled per line
+    def _norm(s: str) -> str:
+        return unicodedata.normalize("NFKD", s).encode("ascii", "ignore").decode().lower()
+    text = (text or "").strip()
+    if not text:
+        return {"notions_cles": [], "definitions": [], "questions": []}
+    tokens = re.findall(r"[A-Za-zÀ-ÿ]{3,}", text)
+    stop = set("le la les de des du un une et ou a au aux en dans pour par avec sans sur sous entre d l que qui quoi dont est sont ete été etre être ce cet cette ces il elle nous vous on ne pas".split())
+    toks = [_norm(t) for t in tokens if _norm(t) not in stop]
+    notions = [w for w, _ in Counter(toks).most_common(12)]
+    lines = [l.strip() for l in text.splitlines() if l.strip()]
+    defs = []
+    for l in lines:
+        if re.search(r"(définition|se définit|est|consiste en)", l, re.I):
+            defs.append(l[:220])
+            if len(defs) >= 8:
+                break
+    return {"notions_cles": notions, "definitions": defs,
+            "questions": [f"Expliquez la notion: « {w} »." for w in notions[:6]]}
+
+
+def run(docs: int = 200, words: int = 5000, workers: Optional[int] = None,
+        variants: Optional[List[str]] = None) -> Dict[str, Any]:
+    from extraction import extract_data, extract_many
+    texts = make_docs(docs, words)
+    mb = sum(len(t.encode("utf-8")) for t in texts) / 1e6
+    batch = [(i, None, t) for i, t in enumerate(texts)]
+    workers = workers or os.cpu_count() or 1
+    todo = variants or ["legacy", "engine", "batch_inline", "batch_pool"]
+    rows: Dict[str, Any] = {}
+    outputs: Dict[str, List[Dict[str, Any]]] = {}
+
+    def timed(name: str, fn: Any) -> None:
+        t0 = time.perf_counter()
+        outputs[name] = fn()
+        s = time.perf_counter() - t0
+        rows[name] = {"docs": docs, "mb": round(mb, 2), "seconds": round(s, 3), "mb_per_s": round(mb / s, 2) if s else 0.0}
+
+    if "legacy" in todo:
+        timed("legacy", lambda: [_legacy(t) for t in texts])
+    if "engine" in todo:
+        timed("engine", lambda: [extract_data(t) for t in texts])
+    if "batch_inline" in todo:
+        timed("batch_inline", lambda: [r["data"] for r in extract_many(batch)])
+    if "batch_pool" in todo:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=mp.get_context("spawn")) as ex:
+            ex.submit(int).result()  # start-up of the workers is not part of the measure
+            timed("batch_pool", lambda: [r["data"] for r in extract_many(batch, ex, chunk_chars=256_000)])
+        rows["batch_pool"]["workers"] = workers
+    first = next(iter(outputs.values()), None)
+    return {"docs": docs, "mb": round(mb, 2), "same_output": all(o == first for o in outputs.values()), "variants": rows}
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="Benchmark de /v1/extract (MB/s)")
+    ap.add_argument("--docs", type=int, default=200, help="nombre de cours")
+    ap.add_argument("--words", type=int, default=5000, help="mots par cours")
+    ap.add_argument("--workers", type=int, default=None, help="processus pour batch_pool (défaut : nombre de cœurs)")
+    args = ap.parse_args(argv)
+    report = run(args.docs, args.words, args.workers)
+    print(f"{report['docs']} cours, {report['mb']} Mo, sorties identiques : {report['same_output']}")
+    print(f"{'variante':<14} {'s':>8} {'Mo/s':>8}")
+    for name, r in report["variants"].items():
+        print(f"{name:<14} {r['seconds']:>8} {r['mb_per_s']:>8}")
+    return 0 if report["same_output"] else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
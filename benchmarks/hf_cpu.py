@@ -0,0 +1,111 @@
+"""HFProvider on the CPU: tokens/sec and resident memory per mode.
+
+  python -m benchmarks.hf_cpu --model gpt2                 # any causal LM repo or local checkpoint
+  python -m benchmarks.hf_cpu --tiny                       # small random Llama written locally (offline)
+  python -m benchmarks.hf_cpu --model gpt2 --modes off,int8 --threads 4
+
+Modes: `off` (former loading: torch_dtype="auto", default threads), `fp32`, `int8`
+(dynamic int8 Linear layers) and `int8_compile` (int8 + torch.compile). Each mode loads
+the model in a fresh process, so its RSS is measured on its own.
+"""
+from __future__ import annotations
+from typing import Any, Dict, List, Optional
+import argparse, multiprocessing as mp, os, sys, tempfile, time
+
+_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+if _ROOT not in sys.path:
+    sys.path.insert(0, _ROOT)
+
+from benchmarks.chunking import _SENTENCES, _peak_rss_mb  # noqa: E402
+
+MODES = {"off": {"mode": "off"}, "fp32": {"mode": "fp32"}, "int8": {"mode": "int8"},
+         "int8_compile": {"mode": "int8", "compile": True}}
+PROMPT = "Tu es Professeur Nour. Explique en quelques phrases le principe d'autonomie de l'opération de paiement.\n\nRéponse:"
+
+
+def make_tiny_model(path: str, layers: int = 4, width: int = 256) -> str:
+    """A random Llama-style model (nn.Linear layers, like the configured checkpoint) with a word-level
+    French tokenizer, saved as a local checkpoint (no download)."""
+    import re
+    from tokenizers import Tokenizer, models, pre_tokenizers
+    from transformers import LlamaConfig, LlamaForCausalLM, PreTrainedTokenizerFast
+    words = sorted({w for s in _SENTENCES + [PROMPT, "Bonjour"] for w in re.findall(r"\w+|[^\w\s]", s)})
+    vocab = {w: i for i, w in enumerate(["[UNK]", "[EOS]"] + words)}
+    tk = Tokenizer(models.WordLevel(vocab, unk_token="[UNK]"))
+    tk.pre_tokenizer = pre_tokenizers.Whitespace()
+    tok = PreTrainedTokenizerFast(tokenizer_object=tk, unk_token="[UNK]", eos_token="[EOS]")
+    cfg = LlamaConfig(vocab_size=len(vocab), hidden_size=width, intermediate_size=width * 2, num_hidden_layers=layers,
+                      num_attention_heads=4, num_key_value_heads=4, max_position_embeddings=256,
+                      bos_token_id=1, eos_token_id=1)
+    tok.save_pretrained(path)
+    LlamaForCausalLM(cfg).save_pretrained(path)
+    return path
+
+
+def _run(model: str, cpu: Dict[str, Any], tokens: int, requests: int, out: Any) -> None:
+    from hf_provider import HFProvider
+    base = _peak_rss_mb()
+    t0 = time.perf_counter()
+    p = HFProvider(model, cpu=cpu)
+    ready = time.perf_counter() - t0
+    ids = len(p.tok(PROMPT)["input_ids"])
+    generated, t0 = 0, time.perf_counter()
+    for _ in range(requests):
+        text_ids = p.tok(p.generate(PROMPT, max_tokens=tokens, temperature=0.0))["input_ids"]
+        generated += max(0, len(text_ids) - ids)
+    s = time.perf_counter() - t0
+    out.send({"ready_s": round(ready, 3), "seconds": round(s, 3), "tokens": generated,
+              "tok_s": round(generated / s, 1) if s else 0.0, "base_rss_mb": base, "peak_rss_mb": _peak_rss_mb(),
+              "info": p.info})
+    out.close()
+
+
+def measure(model: str, cpu: Dict[str, Any], tokens: int = 64, requests: int = 4) -> Dict[str, Any]:
+    ctx = mp.get_context("spawn")
+    recv, send = ctx.Pipe(duplex=False)
+    p = ctx.Process(target=_run, args=(model, cpu, tokens, requests, send))
+    p.start()
+    res = recv.recv()
+    p.join()
+    res["rss_delta_mb"] = round(res["peak_rss_mb"] - res["base_rss_mb"], 1)
+    return res
+
+
+def run(model: Optional[str] = None, modes: Optional[List[str]] = None, tokens: int = 64, requests: int = 4,
+        threads: Optional[int] = None) -> Dict[str, Any]:
+    with tempfile.TemporaryDirectory() as tmp:
+        if not model:
+            # Written by a child process: importing torch here would raise the RSS baseline of every mode
+            model = os.path.join(tmp, "tiny-llama")
+            p = mp.get_context("spawn").Process(target=make_tiny_model, args=(model,))
+            p.start()
+            p.join()
+        rows = {}
+        for m in modes or ["off", "fp32", "int8"]:
+            cpu = dict(MODES[m], threads=threads, warmup_tokens=8)
+            rows[m] = measure(model, cpu, tokens, requests)
+    return {"model": model, "tokens": tokens, "requests": requests, "modes": rows}
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="Benchmark HFProvider sur CPU (tokens/s, RSS) par mode")
+    ap.add_argument("--model", default=None, help="repo Hugging Face ou dossier local")
+    ap.add_argument("--tiny", action="store_true", help="petit Llama aléatoire généré localement (hors ligne)")
+    ap.add_argument("--modes", default="off,fp32,int8", help=f"parmi {','.join(MODES)}")
+    ap.add_argument("--tokens", type=int, default=64)
+    ap.add_argument("--requests", type=int, default=4)
+    ap.add_argument("--threads", type=int, default=None)
+    args = ap.parse_args(argv)
+    if not args.model and not args.tiny:
+        ap.error("--model ou --tiny requis")
+    report = run(None if args.tiny else args.model, args.modes.split(","), args.tokens, args.requests, args.threads)
+    print(f"modèle: {report['model']}, {report['requests']} requêtes × {report['tokens']} tokens")
+    print(f"{'mode':<14} {'prêt s':>8} {'tok/s':>8} {'RSS +Mo':>9} {'RSS max':>9} {'threads':>8} {'int8':>6}")
+    for name, r in report["modes"].items():
+        print(f"{name:<14} {r['ready_s']:>8} {r['tok_s']:>8} {r['rss_delta_mb']:>9} {r['peak_rss_mb']:>9.1f} "
+              f"{r['info'].get('threads', '-'):>8} {r['info'].get('quantized_layers', 0):>6}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
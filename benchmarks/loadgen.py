@@ -0,0 +1,59 @@
+from __future__ import annotations
+from typing import Any, Callable, Dict, List, Optional
+import asyncio, time
+import httpx
+
+# A request factory returns (method, path, json_body); it receives the request index
+RequestFactory = Callable[[int], tuple]
+
+
+def _percentile(sorted_ms: List[float], q: float) -> float:
+    if not sorted_ms:
+        return 0.0
+    i = min(len(sorted_ms) - 1, max(0, int(round(q * (len(sorted_ms) - 1)))))
+    return sorted_ms[i]
+
+
+def summarize(latencies_ms: List[float], errors: int, wall_s: float) -> Dict[str, Any]:
+    lat = sorted(latencies_ms)
+    n = len(lat)
+    return {
+        "requests": n + errors, "errors": errors,
+        "p50_ms": round(_percentile(lat, 0.50), 2), "p95_ms": round(_percentile(lat, 0.95), 2),
+        "p99_ms": round(_percentile(lat, 0.99), 2), "mean_ms": round(sum(lat) / n, 2) if n else 0.0,
+        "rps": round(n / wall_s, 2) if wall_s else 0.0,
+    }
+
+
+async def _drive(app: Any, factory: RequestFactory, requests: int, concurrency: int,
+                 check: Optional[Callable[[httpx.Response], bool]]) -> Dict[str, Any]:
+    latencies: List[float] = []
+    errors = 0
+    counter = iter(range(requests))
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120.0) as client:
+        async def client_loop() -> None:
+            nonlocal errors
+            for i in counter:
+                method, path, body = factory(i)
+                t0 = time.perf_counter()
+                try:
+                    r = await client.request(method, path, json=body)
+                    ok = r.status_code < 400 and (check is None or check(r))
+                except Exception:
+                    ok = False
+                if ok:
+                    latencies.append((time.perf_counter() - t0) * 1000)
+                else:
+                    errors += 1
+
+        t0 = time.perf_counter()
+        await asyncio.gather(*[client_loop() for _ in range(max(1, concurrency))])
+        wall = time.perf_counter() - t0
+    return summarize(latencies, errors, wall)
+
+
+def run_load(app: Any, factory: RequestFactory, requests: int = 100, concurrency: int = 8,
+             check: Optional[Callable[[httpx.Response], bool]] = None) -> Dict[str, Any]:
+    """Drive an ASGI app in-process with `concurrency` clients sharing `requests` calls."""
+    return asyncio.run(_drive(app, factory, requests, concurrency, check))
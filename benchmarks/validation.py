@@ -0,0 +1,90 @@
+"""Schema validation throughput: compiled validators vs. loading the schema on every call.
+
+  python -m benchmarks.validation                # 2000 payloads per variant
+  python -m benchmarks.validation --n 10000
+
+Variants: `legacy` (open + json.load + jsonschema.validate per payload, stops at the
+first error), `compiled` (validation.validate), and `batch_endpoint` / `single_endpoint`
+(the same payloads through /validate/mcq/batch in one request vs. one request each).
+"""
+from __future__ import annotations
+from typing import Any, Callable, Dict, List, Optional
+import argparse, copy, json, os, sys, time
+
+_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+if _ROOT not in sys.path:
+    sys.path.insert(0, _ROOT)
+
+
+def make_payloads(n: int, invalid_every: int = 4) -> List[Dict[str, Any]]:
+    """MCQ payloads of 10 items; every `invalid_every`-th one breaks a schema and an extra rule."""
+    from benchmarks.endpoints import _MCQ
+    out = []
+    for i in range(n):
+        p = copy.deepcopy(_MCQ)
+        if invalid_every and i % invalid_every == 0:
+            p["items"][0]["difficulty"] = "impossible"
+            p["items"][1]["options"] = ["a", "a", "b"]
+        out.append(p)
+    return out
+
+
+def _legacy(kind: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+    # Former validate(): schema read from disk and validator rebuilt for every payload
+    from jsonschema import validate as _validate, ValidationError
+    from validation import SCHEMAS_DIR
+    with open(os.path.join(SCHEMAS_DIR, f"{kind}.schema.json"), "r", encoding="utf-8") as f:
+        schema = json.load(f)
+    try:
+        _validate(instance=payload, schema=schema)
+        return {"ok": True, "errors": []}
+    except ValidationError as e:
+        return {"ok": False, "errors": [str(e)]}
+
+
+def _timed(fn: Callable[[], int], n: int) -> Dict[str, Any]:
+    t0 = time.perf_counter()
+    invalid = fn()
+    s = time.perf_counter() - t0
+    return {"payloads": n, "invalid": invalid, "seconds": round(s, 3), "per_s": int(n / s) if s else 0}
+
+
+def run(n: int = 2000, variants: Optional[List[str]] = None) -> Dict[str, Any]:
+    from validation import validate, compile_all
+    payloads = make_payloads(n)
+    rows: Dict[str, Any] = {}
+    todo = variants or ["legacy", "compiled", "single_endpoint", "batch_endpoint"]
+    compile_all()
+    if "legacy" in todo:
+        rows["legacy"] = _timed(lambda: sum(not _legacy("mcq", p)["ok"] for p in payloads), n)
+    if "compiled" in todo:
+        rows["compiled"] = _timed(lambda: sum(not validate("mcq", p)["ok"] for p in payloads), n)
+    if "single_endpoint" in todo or "batch_endpoint" in todo:
+        from fastapi.testclient import TestClient
+        from benchmarks.endpoints import fake_backend
+        with fake_backend() as app:
+            client = TestClient(app)
+            if "single_endpoint" in todo:
+                rows["single_endpoint"] = _timed(
+                    lambda: sum(not client.post("/validate/mcq", json=p).json()["ok"] for p in payloads), n)
+            if "batch_endpoint" in todo:
+                body = "\n".join(json.dumps(p, ensure_ascii=False) for p in payloads)
+                rows["batch_endpoint"] = _timed(lambda: client.post(
+                    "/validate/mcq/batch", content=body.encode("utf-8"),
+                    headers={"Content-Type": "application/x-ndjson"}).json()["invalid"], n)
+    return {"payloads": n, "variants": rows}
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="Benchmark de la validation JSON schema (validations/s)")
+    ap.add_argument("--n", type=int, default=2000, help="nombre de payloads QCM")
+    args = ap.parse_args(argv)
+    report = run(args.n)
+    print(f"{'variante':<16} {'payloads':>9} {'invalides':>10} {'s':>8} {'valid./s':>10}")
+    for name, r in report["variants"].items():
+        print(f"{name:<16} {r['payloads']:>9} {r['invalid']:>10} {r['seconds']:>8} {r['per_s']:>10}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,111 @@
+from __future__ import annotations
+from typing import Any, Dict, Iterable, List, Optional
+import os, json, time, socket
+
+# Per-host profiles live next to the other server data (override with CALIBRATION_DIR)
+PROFILE_DIR = os.getenv("CALIBRATION_DIR") or os.path.join(os.path.dirname(os.path.abspath(__file__)), "server", "db", "calibration")
+# ctransformers defaults, used as the reference row of the report
+DEFAULTS = {"threads": -1, "batch_size": 8}
+# Typical grounded-chat request used to rank settings: long prompt, short answer
+TYPICAL_PROMPT_TOKENS, TYPICAL_DECODE_TOKENS = 1024, 128
+
+_SAMPLE = ("La Révolution française a été provoquée par une crise financière, des tensions sociales "
+           "et la diffusion des idées des Lumières. ")
+
+
+def profile_path(host: Optional[str] = None) -> str:
+    return os.path.join(PROFILE_DIR, f"{host or socket.gethostname()}.json")
+
+
+def model_key(model: str, model_file: Optional[str] = None) -> str:
+    return os.path.basename(model_file or str(model).rstrip("/"))
+
+
+def default_grid() -> Dict[str, List[int]]:
+    n = os.cpu_count() or 1
+    threads = sorted({t for t in (1, 2, 4, 6, 8, 12, 16, n // 2, n) if 1 <= t <= n})
+    return {"threads": threads, "batch_size": [8, 32, 128, 512]}
+
+
+def load_profile(model: str, model_file: Optional[str] = None) -> Dict[str, Any]:
+    """Best settings recorded for this host and model, or {} when not calibrated."""
+    try:
+        with open(profile_path(), "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if data.get("cpu_count") != os.cpu_count():
+        return {}
+    best = (data.get("models") or {}).get(model_key(model, model_file)) or {}
+    return {k: best[k] for k in ("threads", "batch_size") if k in best}
+
+
+def save_profile(model: str, model_file: Optional[str], result: Dict[str, Any]) -> str:
+    path = profile_path()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        data = {}
+    data.update({"host": socket.gethostname(), "cpu_count": os.cpu_count()})
+    data.setdefault("models", {})[model_key(model, model_file)] = {
+        **result["best"], "default": result["default"], "measured_at": int(time.time())
+    }
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    return path
+
+
+def measure(llm: Any, threads: int, batch_size: int, prompt_tokens: int = 256, decode_tokens: int = 32) -> Dict[str, Any]:
+    """Prompt-eval and decode throughput of a loaded ctransformers LLM for one setting."""
+    tokens = llm.tokenize(_SAMPLE * (prompt_tokens // 20 + 1))[:prompt_tokens]
+    llm.reset()
+    t0 = time.perf_counter()
+    llm.eval(tokens, batch_size=batch_size, threads=threads)
+    t_prompt = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    for _ in range(decode_tokens):
+        tok = llm.sample(temperature=0.0, seed=0)
+        llm.eval([tok], batch_size=batch_size, threads=threads)
+    t_decode = time.perf_counter() - t0
+    llm.reset()
+    prompt_tps = len(tokens) / t_prompt if t_prompt else 0.0
+    decode_tps = decode_tokens / t_decode if t_decode else 0.0
+    return {"threads": threads, "batch_size": batch_size, "prompt_tok_s": round(prompt_tps, 2),
+            "decode_tok_s": round(decode_tps, 2), "typical_ms": _typical_ms(prompt_tps, decode_tps)}
+
+
+def _typical_ms(prompt_tps: float, decode_tps: float) -> float:
+    if prompt_tps <= 0 or decode_tps <= 0:
+        return float("inf")
+    return round(1000 * (TYPICAL_PROMPT_TOKENS / prompt_tps + TYPICAL_DECODE_TOKENS / decode_tps), 1)
+
+
+def calibrate(llm: Any, threads: Optional[Iterable[int]] = None, batch_sizes: Optional[Iterable[int]] = None,
+              prompt_tokens: int = 256, decode_tokens: int = 32) -> Dict[str, Any]:
+    """Benchmark the grid and pick the setting with the lowest typical request latency.
+
+    Decode speed depends on threads only, so the batch grid is swept at the best
+    decode thread count instead of as a full cross product.
+    """
+    grid = default_grid()
+    threads = list(threads or grid["threads"])
+    batch_sizes = list(batch_sizes or grid["batch_size"])
+    default = measure(llm, DEFAULTS["threads"], DEFAULTS["batch_size"], prompt_tokens, decode_tokens)
+    rows = [measure(llm, t, batch_sizes[0], prompt_tokens, decode_tokens) for t in threads]
+    t_best = max(rows, key=lambda r: r["decode_tok_s"])["threads"]
+    rows += [measure(llm, t_best, b, prompt_tokens, decode_tokens) for b in batch_sizes[1:]]
+    best = min(rows, key=lambda r: r["typical_ms"])
+    return {"best": best, "default": default, "rows": rows}
+
+
+def report(name: str, result: Dict[str, Any]) -> str:
+    lines = [f"== {name}", f"{'threads':>8} {'batch':>6} {'prompt tok/s':>13} {'decode tok/s':>13} {'typical ms':>11}"]
+    for r in [result["default"]] + result["rows"]:
+        tag = "  (défaut)" if r is result["default"] else ("  ← choisi" if r is result["best"] else "")
+        lines.append(f"{r['threads']:>8} {r['batch_size']:>6} {r['prompt_tok_s']:>13} {r['decode_tok_s']:>13} {r['typical_ms']:>11}{tag}")
+    d, b = result["default"]["typical_ms"], result["best"]["typical_ms"]
+    if d and b and d != float("inf"):
+        lines.append(f"gain vs défaut: {d / b:.2f}x ({d:.0f} ms → {b:.0f} ms pour {TYPICAL_PROMPT_TOKENS}+{TYPICAL_DECODE_TOKENS} tokens)")
+    return "\n".join(lines)
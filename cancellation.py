@@ -0,0 +1,78 @@
+from __future__ import annotations
+from typing import Any, Awaitable, Callable, Dict, Iterable, Iterator, List, Optional
+import asyncio, threading, time
+
+
+class GenerationBudget:
+    """Deadline and cancellation of one generation, checked between tokens.
+
+    `stopped` ends up as "cancelled" (client went away) or "timeout" (deadline
+    reached) when the generation was cut short, None when it ran to the end.
+    """
+
+    def __init__(self, deadline_ms: Optional[float] = None, poll_s: float = 0.1):
+        self.deadline = time.monotonic() + float(deadline_ms) / 1000 if deadline_ms else None
+        self.poll_s = poll_s
+        self.stopped: Optional[str] = None
+        self._cancelled = threading.Event()
+        self._on_cancel: List[Callable[[], Any]] = []
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    def remaining_s(self) -> Optional[float]:
+        return None if self.deadline is None else max(0.0, self.deadline - time.monotonic())
+
+    def on_cancel(self, fn: Callable[[], Any]) -> None:
+        """Also run `fn` on cancel (e.g. forward it to a model worker process)."""
+        self._on_cancel.append(fn)
+        if self.cancelled:
+            fn()
+
+    def cancel(self) -> None:
+        if self.cancelled:
+            return
+        self._cancelled.set()
+        for fn in self._on_cancel:
+            fn()
+
+    def exhausted(self) -> bool:
+        if self.stopped is None:
+            if self.cancelled:
+                self.stopped = "cancelled"
+            elif self.deadline is not None and time.monotonic() >= self.deadline:
+                self.stopped = "timeout"
+        return self.stopped is not None
+
+    def worker_params(self) -> Dict[str, Any]:
+        """Generation params for a ModelPool worker, which enforces the deadline itself."""
+        rem = self.remaining_s()
+        return {} if rem is None else {"deadline_s": rem}
+
+    async def wait(self, aw: Awaitable[Any], is_disconnected: Optional[Callable[[], Awaitable[bool]]] = None) -> Any:
+        """Await a generation running off the event loop, cancelling it if the client disconnects.
+
+        The generation stops at its next token; its (partial) result is still returned.
+        """
+        fut = asyncio.ensure_future(aw)
+        while True:
+            done, _pending = await asyncio.wait({fut}, timeout=self.poll_s)
+            if done:
+                return fut.result()
+            if is_disconnected is not None and not self.cancelled and await is_disconnected():
+                self.cancel()
+
+
+def budgeted(tokens: Iterable[str], budget: Optional[GenerationBudget]) -> Iterator[str]:
+    """Tokens of a stream until the budget runs out; closing the stream stops the model."""
+    it = iter(tokens)
+    try:
+        for tok in it:
+            if budget is not None and budget.exhausted():
+                break
+            yield tok
+    finally:
+        close = getattr(it, "close", None)
+        if close is not None:
+            close()
@@ -2,20 +2,23 @@ from __future__ import annotations
 from typing import List, Dict
 from ..embeddings.factory import EmbeddingFactory
 from ..vectorstores.faiss_store import FAISSStore
+from ..chunking import iter_chunks, iter_file_chunks
 
 class RagChain:
     def __init__(self, embed: EmbeddingFactory, store: FAISSStore, llm):
         self.embed, self.store, self.llm = embed, store, llm
 
     def ingest(self, docs: List[Dict[str, str]], chunk_size=800, overlap=120):
+        # chunk_size/overlap are in characters; the chunker counts words (~6 chars each in French)
         chunks, metas = [], []
         for d in docs:
-            text = d.get("text",""); src = d.get("source","user")
-            step = max(1, chunk_size - overlap)
-            for i in range(0, len(text), step):
-                ch = text[i:i+chunk_size]
-                if ch.strip():
-                    chunks.append(ch); metas.append({"source": src, "i": i})
+            src = d.get("source","user")
+            size, ov = max(1, chunk_size // 6), overlap // 6
+            # Large courses can be passed as {"path": ...} and are streamed from disk
+            it = iter_file_chunks(d["path"], max_tokens=size, overlap=ov) if d.get("path") \
+                else iter_chunks(d.get("text",""), max_tokens=size, overlap=ov)
+            for c in it:
+                chunks.append(c["text"]); metas.append({"source": src, "i": c["start"], "end": c["end"], "section": c["section"]})
         if not chunks:
             return
         X = self.embed.encode(chunks)
@@ -0,0 +1,201 @@
+from __future__ import annotations
+from typing import Any, Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, TextIO, Union
+import io, re
+
+# Sentence end: ., !, ?, … (and runs like "?!" or "..."), followed by whitespace or the end
+SENT_END_RE = re.compile(r"([\.\!\?…]+)(?=\s|$)")
+_MD_HEADING_RE = re.compile(r"#{1,6}\s+\S")
+# "1.2 Titre", "II) Titre", "Chapitre 3 …": only short lines without final punctuation count as headings
+_NUM_HEADING_RE = re.compile(r"(?:\d+(?:\.\d+)*|[IVXLC]+)[.)]?\s+\S|(?:chapitre|partie|section|titre)\b", re.I)
+_WORD_RE = re.compile(r"\S+")
+# Longest line read at once; longer lines arrive in pieces and are still chunked correctly
+_MAX_LINE = 1 << 16
+
+Counter = Callable[[str], int]
+
+
+def word_count(text: str) -> int:
+    return len(text.split())
+
+
+class Unit(NamedTuple):
+    text: str
+    start: int
+    end: int
+    tokens: int
+    heading: bool
+    lead: str  # whitespace between the previous unit and this one
+
+
+def _is_heading(line: str) -> bool:
+    s = line.strip()
+    if not s:
+        return False
+    if s.startswith("#"):
+        return bool(_MD_HEADING_RE.match(s))
+    return len(s.split()) <= 12 and s[-1] not in ".!?…:;," and bool(_NUM_HEADING_RE.match(s))
+
+
+class _Segmenter:
+    """Turns lines into sentence/heading units with absolute character offsets."""
+
+    def __init__(self, max_tokens: int, count: Counter):
+        self.max_tokens, self.count = max_tokens, count
+        self.buf = ""       # text of the current paragraph not yet emitted
+        self.buf_start = 0  # offset of buf[0] in the source
+        self.pos = 0        # offset of the next line
+        self.gap = ""
+
+    def feed(self, line: str) -> Iterator[Unit]:
+        if _is_heading(line) and not self.buf.strip():
+            yield from self._drain(final=True)
+            lead = len(line) - len(line.lstrip())
+            self.gap += line[:lead]
+            yield from self._fit(line.strip(), self.pos + lead, heading=True)
+            self.gap += line[lead + len(line.strip()):]
+        elif not line.strip():
+            # Blank line: paragraph boundary
+            yield from self._drain(final=True)
+            self.gap += line
+        else:
+            if not self.buf:
+                self.buf_start = self.pos
+            self.buf += line
+            yield from self._drain(final=False)
+        self.pos += len(line)
+
+    def close(self) -> Iterator[Unit]:
+        yield from self._drain(final=True)
+
+    def _drain(self, final: bool) -> Iterator[Unit]:
+        buf, i = self.buf, 0
+        for m in SENT_END_RE.finditer(buf):
+            if m.end() >= len(buf) and not final:
+                break
+            yield from self._segment(buf, i, m.end())
+            i = m.end()
+        if final:
+            yield from self._segment(buf, i, len(buf))
+            i = len(buf)
+        elif self.count(buf[i:]) > self.max_tokens:
+            # Run-on text without punctuation: cut at the last word boundary
+            # (a line longer than _MAX_LINE may end mid-word: keep that word for the next piece)
+            cut = len(buf) if buf[-1:].isspace() else buf.rfind(" ", i)
+            if cut > i:
+                yield from self._segment(buf, i, cut)
+                i = cut
+        self.buf = buf[i:]
+        self.buf_start += i
+
+    def _segment(self, buf: str, a: int, b: int) -> Iterator[Unit]:
+        raw = buf[a:b]
+        text = raw.strip()
+        if not text:
+            self.gap += raw
+            return
+        lead = len(raw) - len(raw.lstrip())
+        self.gap += raw[:lead]
+        yield from self._fit(text, self.buf_start + a + lead)
+        self.gap += raw[lead + len(text):]
+
+    def _fit(self, text: str, start: int, heading: bool = False) -> Iterator[Unit]:
+        if self.count(text) <= self.max_tokens:
+            yield from self._emit(text, start, heading)
+            return
+        # One sentence (or heading) longer than a chunk: split it on words; only the first piece names the section
+        words = [(m.start(), m.end()) for m in _WORD_RE.finditer(text)]
+        step = max(1, self.max_tokens)
+        prev_end = 0
+        for j in range(0, len(words), step):
+            s, e = words[j][0], words[min(j + step, len(words)) - 1][1]
+            self.gap += text[prev_end:s]
+            yield from self._emit(text[s:e], start + s, heading and j == 0)
+            prev_end = e
+
+    def _emit(self, text: str, start: int, heading: bool = False) -> Iterator[Unit]:
+        yield Unit(text, start, start + len(text), self.count(text), heading, self.gap)
+        self.gap = ""
+
+
+def _lines(source: Union[str, TextIO, Iterable[str]]) -> Iterator[str]:
+    if isinstance(source, str):
+        source = io.StringIO(source, newline="")
+    if hasattr(source, "readline"):
+        return iter(lambda: source.readline(_MAX_LINE), "")
+    return iter(source)
+
+
+def iter_units(source: Union[str, TextIO, Iterable[str]], max_tokens: int = 220,
+               count: Optional[Counter] = None) -> Iterator[Unit]:
+    seg = _Segmenter(max_tokens, count or word_count)
+    for line in _lines(source):
+        yield from seg.feed(line)
+    yield from seg.close()
+
+
+def iter_chunks(source: Union[str, TextIO, Iterable[str]], max_tokens: int = 220, overlap: int = 40,
+                count: Optional[Counter] = None) -> Iterator[Dict[str, Any]]:
+    """Stream chunks of whole sentences from text, a text file object or an iterable of lines.
+
+    A chunk holds at most `max_tokens` tokens (words by default, or `count(text)`),
+    starts a new section at each heading, and repeats up to `overlap` tokens of
+    trailing sentences from the previous chunk. `start`/`end` are character
+    offsets in the source, so `source[start:end] == chunk["text"]`. Memory use is
+    bounded by one chunk, whatever the size of the source.
+    """
+    cur: List[Unit] = []
+    tokens, fresh, n = 0, 0, 0
+    section = chunk_section = ""
+
+    def emit() -> Dict[str, Any]:
+        text = cur[0].text + "".join(u.lead + u.text for u in cur[1:])
+        return {"id": f"p{n}", "text": text, "start": cur[0].start, "end": cur[-1].end,
+                "tokens": tokens, "section": chunk_section}
+
+    for u in iter_units(source, max_tokens, count):
+        if u.heading:
+            # A new section, or a run of headings (a table of contents) that outgrew the chunk
+            if fresh and (not all(x.heading for x in cur) or tokens + u.tokens > max_tokens):
+                yield emit()
+                n += 1
+                cur, tokens, fresh = [], 0, 0
+            elif not fresh:
+                cur, tokens = [], 0
+            section = u.text.lstrip("#").strip()
+            if not cur:
+                chunk_section = section
+            cur.append(u)
+            tokens += u.tokens
+            fresh += 1
+            continue
+        if cur and tokens + u.tokens > max_tokens:
+            if fresh:
+                yield emit()
+                n += 1
+            # Carry whole trailing sentences (not headings) up to `overlap` tokens
+            carry: List[Unit] = []
+            kept = 0
+            for prev in reversed(cur):
+                if prev.heading or kept + prev.tokens > overlap or kept + prev.tokens + u.tokens > max_tokens:
+                    break
+                carry.insert(0, prev)
+                kept += prev.tokens
+            cur, tokens, fresh = carry, kept, 0
+            chunk_section = section
+        if not cur:
+            chunk_section = section
+        cur.append(u)
+        tokens += u.tokens
+        fresh += 1
+    if fresh:
+        yield emit()
+
+
+def iter_file_chunks(path: str, encoding: str = "utf-8", **kw: Any) -> Iterator[Dict[str, Any]]:
+    """iter_chunks over a text/markdown file read line by line (offsets in decoded characters)."""
+    with open(path, "r", encoding=encoding, errors="replace", newline="") as f:
+        yield from iter_chunks(f, **kw)
+
+
+def chunk_text(text: str, max_tokens: int = 220, overlap: int = 40, count: Optional[Counter] = None) -> List[Dict[str, Any]]:
+    return list(iter_chunks(text, max_tokens=max_tokens, overlap=overlap, count=count))
@@ -0,0 +1,162 @@
+from __future__ import annotations
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Optional, Tuple
+import asyncio, contextvars, hashlib, json, threading
+from cancellation import GenerationBudget
+
+
+def coalesce_key(*parts: Any) -> str:
+    """Identity of a generation: route, model, params and the prompt with its whitespace collapsed."""
+    norm = [" ".join(p.split()) if isinstance(p, str) else p for p in parts]
+    return hashlib.sha256(json.dumps(norm, ensure_ascii=False, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+class Flight:
+    """One generation shared by every request attached to it.
+
+    The leader starts it on a thread; everyone (leader included) then awaits its
+    result or follows its tokens. It is cancelled only when all of them have left.
+    """
+
+    def __init__(self, key: str, poll_s: float = 0.1, on_empty: Optional[Callable[["Flight"], None]] = None,
+                 budget: Optional[GenerationBudget] = None):
+        self.key = key
+        self.budget = budget or GenerationBudget(poll_s=poll_s)
+        self.participants = 1
+        self.tokens: List[str] = []
+        self._future: Future = Future()
+        self._cond = threading.Condition()
+        self._on_empty = on_empty
+
+    @property
+    def done(self) -> bool:
+        return self._future.done()
+
+    def start(self, fn: Callable[[], Any]) -> None:
+        """Run `fn` (the generation, which pushes its tokens) in the caller's context (tracing spans).
+
+        From a request handler it takes a slot in the event loop's default executor, the
+        bounded pool asyncio.to_thread uses; outside a loop it gets a thread of its own.
+        """
+        ctx = contextvars.copy_context()
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            threading.Thread(target=ctx.run, args=(self._run, fn), daemon=True).start()
+            return
+        loop.run_in_executor(None, ctx.run, self._run, fn)
+
+    def _run(self, fn: Callable[[], Any]) -> None:
+        try:
+            res = fn()
+        except BaseException as e:
+            self._future.set_exception(e)
+        else:
+            self._future.set_result(res)
+        with self._cond:
+            self._cond.notify_all()
+
+    def push(self, token: str) -> None:
+        with self._cond:
+            self.tokens.append(token)
+            self._cond.notify_all()
+
+    def attach(self) -> bool:
+        """Join as a follower; refused once everyone has left (the generation is being cancelled)."""
+        with self._cond:
+            if self.participants <= 0 or self.budget.cancelled:
+                return False
+            self.participants += 1
+            return True
+
+    def detach(self) -> None:
+        """A client went away; the generation stops once nobody is left to receive it."""
+        with self._cond:
+            self.participants -= 1
+            empty = self.participants <= 0
+        if empty and not self.done:
+            self.budget.cancel()
+            if self._on_empty is not None:
+                self._on_empty(self)
+
+    def result(self, timeout: Optional[float] = None) -> Any:
+        return self._future.result(timeout)
+
+    async def wait(self, is_disconnected: Optional[Callable[[], Awaitable[bool]]] = None) -> Optional[Any]:
+        """The generation's result, or None if this client disconnected first (it is then detached)."""
+        fut = asyncio.wrap_future(self._future)
+        while True:
+            done, _pending = await asyncio.wait({fut}, timeout=self.budget.poll_s)
+            if done:
+                return fut.result()
+            if is_disconnected is not None and await is_disconnected():
+                self.detach()
+                return None
+
+    def stream(self) -> Iterator[str]:
+        """Tokens produced so far, then the next ones as they come; closing the iterator detaches."""
+        i = 0
+        try:
+            while True:
+                with self._cond:
+                    while i >= len(self.tokens) and not self._future.done():
+                        self._cond.wait(self.budget.poll_s)
+                    batch = self.tokens[i:]
+                    finished = self._future.done() and i + len(batch) >= len(self.tokens)
+                i += len(batch)
+                yield from batch
+                if finished:
+                    break
+        finally:
+            if not self._future.done():
+                self.detach()
+
+
+class SingleFlight:
+    """Concurrent requests with the same key share one in-flight generation.
+
+    A flight takes at most `max_followers` requests besides its leader; the next
+    identical request starts a new flight that later requests then join.
+    """
+
+    def __init__(self, max_followers: int = 32, poll_s: float = 0.1, enabled: bool = True):
+        self.max_followers, self.poll_s, self.enabled = max_followers, poll_s, enabled
+        self._flights: Dict[str, Flight] = {}
+        self._lock = threading.Lock()
+        self._stats = {"generations": 0, "coalesced": 0, "cap_reached": 0, "abandoned": 0}
+
+    def join(self, key: str) -> Tuple[Flight, bool]:
+        """(flight, is_leader); the leader must start() it."""
+        with self._lock:
+            f = self._flights.get(key)
+            if f is not None and not f.done:
+                if f.participants - 1 >= self.max_followers:
+                    self._stats["cap_reached"] += 1
+                elif f.attach():
+                    self._stats["coalesced"] += 1
+                    return f, False
+            f = Flight(key, self.poll_s, on_empty=self._abandoned)
+            self._flights[key] = f
+            self._stats["generations"] += 1
+        f._future.add_done_callback(lambda _fut, f=f: self._forget(f))
+        return f, True
+
+    def _forget(self, f: Flight) -> None:
+        with self._lock:
+            if self._flights.get(f.key) is f:
+                del self._flights[f.key]
+
+    def _abandoned(self, f: Flight) -> None:
+        with self._lock:
+            self._stats["abandoned"] += 1
+        self._forget(f)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            s = dict(self._stats)
+            s["in_flight"] = len(self._flights)
+        total = s["generations"] + s["coalesced"]
+        # Requests served by another request's generation: the generations avoided
+        s["avoided_ratio"] = round(s["coalesced"] / total, 3) if total else 0.0
+        s.update(enabled=self.enabled, max_followers=self.max_followers)
+        return s
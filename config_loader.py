@@ -6,10 +6,13 @@ import os, yaml, pathlib, copy
 DEFAULTS = {
     "llm": "ctransformers",
     "ctransformers": {"model": "TheBloke/Wizard-Vicuna-7B-Uncensored-GGML","model_file": None,"model_type": "llama","config": {"gpu_layers": 0}},
-    "huggingface": {"model": "TheBloke/Wizard-Vicuna-7B-Uncensored-HF", "device": None},
+    "huggingface": {"model": "TheBloke/Wizard-Vicuna-7B-Uncensored-HF", "device": None,
+                    "cpu": {"mode": "off", "threads": None, "interop_threads": 1, "compile": False, "warmup_tokens": 8}},
     "embeddings": {"model": "sentence-transformers/all-MiniLM-L6-v2", "model_kwargs": {"device": "cpu"}},
     "vectorstore": {"backend": "faiss", "path": "db"},
-    "rag": {"k": 4, "chunk_size": 800, "chunk_overlap": 120, "rerank": False}
+    "rag": {"k": 4, "chunk_size": 800, "chunk_overlap": 120, "rerank": False},
+    "fake": {"prompt_eval_ms": 0.05, "token_ms": 2.0},
+    "routing": {"enabled": False, "strength": {"qwen2": 2, "tinyllama": 1, "ctransformers": 2, "hf": 1}, "min_success": 0.6}
 }
 
 @dataclass
@@ -0,0 +1,213 @@
+from __future__ import annotations
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Deque, Dict, Iterable, List, Optional, Tuple
+import re, time, threading
+
+Turn = Tuple[str, str]  # (role, content)
+# summarizer(previous_summary, turns_to_fold, max_words) -> new summary
+Summarizer = Callable[[str, List[Turn], int], str]
+# Token counter of the model the history is rendered for
+Counter = Callable[[str], int]
+
+_SENT_RE = re.compile(r"(?<=[.!?…])\s+")
+
+
+def _words(text: str) -> int:
+    return len((text or "").split())
+
+
+def approx_tokens(text: str) -> int:
+    """Model tokens of `text` when no tokenizer is at hand: about 3 characters per token in French."""
+    return (len(text or "") + 2) // 3
+
+
+def _clip_words(text: str, n: int, keep_end: bool = False) -> str:
+    w = (text or "").split()
+    if len(w) <= n:
+        return " ".join(w)
+    return ("… " + " ".join(w[-n:])) if keep_end else (" ".join(w[:n]) + " …")
+
+
+def _clip(text: str, n: int, count: Counter, keep_end: bool = False) -> str:
+    """`text` cut to at most `n` tokens on a word boundary (at least one word is kept)."""
+    w = (text or "").split()
+    if count(" ".join(w)) <= n:
+        return " ".join(w)
+    lo, hi = 1, len(w) - 1
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if count(_clip_words(text, mid, keep_end)) <= n:
+            lo = mid
+        else:
+            hi = mid - 1
+    return _clip_words(text, lo, keep_end)
+
+
+def extractive_summary(previous: str, turns: List[Turn], max_words: int) -> str:
+    """Default summarizer: one clipped line per folded turn, oldest lines dropped past the budget."""
+    lines = [l for l in (previous or "").splitlines() if l.strip()]
+    for role, content in turns:
+        first = _SENT_RE.split((content or "").strip(), maxsplit=1)[0]
+        lines.append(f"{'Q' if role == 'user' else 'R'}: {_clip_words(first, 30)}")
+    while len(lines) > 1 and sum(_words(l) for l in lines) > max_words:
+        lines.pop(0)
+    return "\n".join(lines)
+
+
+class Conversation:
+    __slots__ = ("id", "turns", "pending", "summary", "seen", "folded", "updated", "lock", "job")
+
+    def __init__(self, sid: str):
+        self.id = sid
+        self.turns: Deque[Turn] = deque()     # recent turns, kept verbatim
+        self.pending: List[Turn] = []         # older turns waiting to be folded into the summary
+        self.summary = ""
+        self.seen = 0                         # messages received from the client so far
+        self.folded = 0
+        self.updated = time.time()
+        self.lock = threading.Lock()
+        self.job: Optional[Future] = None
+
+
+class ConversationStore:
+    """Bounded per-session chat memory.
+
+    The last `keep_turns` turns are kept verbatim; older turns are folded into a
+    rolling summary by a background thread, so a request never waits for it.
+    render() stays within `max_tokens` model tokens (`count`) whatever the length
+    of the session: the summary is capped at `summary_tokens`, then the oldest
+    unsummarized and recent turns are dropped until the history fits. System
+    messages (course passages sent by the client) are not conversation turns and
+    are not stored.
+    """
+
+    def __init__(self, summarizer: Optional[Summarizer] = None, keep_turns: int = 6, max_tokens: int = 1024,
+                 summary_tokens: int = 256, max_sessions: int = 500, ttl_s: float = 6 * 3600,
+                 count: Optional[Counter] = None):
+        self.summarizer = summarizer or extractive_summary
+        self.count = count or approx_tokens
+        self.keep_turns, self.max_tokens, self.summary_tokens = int(keep_turns), int(max_tokens), int(summary_tokens)
+        self.max_sessions, self.ttl_s = int(max_sessions), float(ttl_s)
+        self._sessions: "OrderedDict[str, Conversation]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="conv-summary")
+        self._summaries = 0
+        self._summary_ms = 0.0
+        self._errors = 0
+
+    # --- sessions ---
+    def get(self, sid: str, create: bool = True) -> Optional[Conversation]:
+        now = time.time()
+        with self._lock:
+            conv = self._sessions.get(sid)
+            if conv is not None and now - conv.updated > self.ttl_s:
+                del self._sessions[sid]
+                conv = None
+            if conv is None:
+                if not create:
+                    return None
+                conv = self._sessions[sid] = Conversation(sid)
+            self._sessions.move_to_end(sid)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+            return conv
+
+    def drop(self, sid: str) -> bool:
+        with self._lock:
+            return self._sessions.pop(sid, None) is not None
+
+    # --- turns ---
+    def ingest(self, sid: str, messages: Iterable[Dict[str, Any]]) -> Conversation:
+        """Add the client's messages not seen yet.
+
+        Clients may resend the whole `messages[]` list on every turn or only the
+        new message; turns already stored are skipped by count.
+        """
+        msgs = [m for m in messages if isinstance(m, dict) and (m.get("content") or "").strip()
+                and m.get("role") != "system"]
+        conv = self.get(sid)
+        if len(msgs) > conv.seen:
+            new = msgs[conv.seen:]
+        else:
+            # A single new message, or a retry of a list already stored (last user turn unchanged)
+            new = msgs[-1:]
+            with conv.lock:
+                last_user = next((c for r, c in reversed(conv.turns) if r == "user"), None)
+            if new and last_user == str(new[0].get("content") or "").strip() and len(msgs) > 1:
+                new = []
+        for m in new:
+            self.add(sid, str(m.get("role") or "user"), str(m.get("content") or ""), conv=conv)
+        return conv
+
+    def add(self, sid: str, role: str, content: str, conv: Optional[Conversation] = None) -> None:
+        conv = conv or self.get(sid)
+        with conv.lock:
+            conv.turns.append((role, content.strip()))
+            conv.seen += 1
+            conv.updated = time.time()
+            while len(conv.turns) > self.keep_turns:
+                conv.pending.append(conv.turns.popleft())
+            if conv.pending and conv.job is None:
+                conv.job = self._executor.submit(self._fold, conv)
+
+    def _fold(self, conv: Conversation) -> None:
+        while True:
+            with conv.lock:
+                batch = list(conv.pending)
+                previous = conv.summary
+                if not batch:
+                    conv.job = None
+                    return
+            t0 = time.perf_counter()
+            try:
+                summary = self.summarizer(previous, batch, self.summary_tokens)
+            except Exception:
+                # Keep the turns pending (render() still bounds them); retry on the next turn
+                self._errors += 1
+                with conv.lock:
+                    conv.job = None
+                return
+            with conv.lock:
+                conv.summary = _clip(summary, self.summary_tokens, self.count, keep_end=True)
+                del conv.pending[:len(batch)]
+                conv.folded += len(batch)
+            self._summaries += 1
+            self._summary_ms += (time.perf_counter() - t0) * 1000
+
+    # --- prompt ---
+    def render(self, conv: Conversation) -> str:
+        """History as 'role: content' lines (plus summary) within `max_tokens` tokens."""
+        with conv.lock:
+            summary = conv.summary
+            turns = list(conv.pending) + list(conv.turns)
+        head = f"Résumé de la conversation précédente :\n{summary}\n" if summary else ""
+        budget = self.max_tokens - self.count(head)
+        lines: List[str] = []
+        # Newest turn first: always keep it (clipped), then older ones while they fit
+        for i, (role, content) in enumerate(reversed(turns)):
+            line = f"{role}: {content}"
+            n = self.count(line)
+            if n > budget:
+                if i == 0:
+                    room = max(1, budget - self.count(f"{role}: "))
+                    lines.append(f"{role}: {_clip(content, room, self.count, keep_end=True)}")
+                break
+            lines.append(line)
+            budget -= n
+        return head + "\n".join(reversed(lines))
+
+    def wait(self, sid: str, timeout: Optional[float] = None) -> None:
+        """Block until the session's background summary is up to date (tests, shutdown)."""
+        conv = self.get(sid, create=False)
+        job = conv.job if conv is not None else None
+        if job is not None:
+            job.result(timeout=timeout)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"sessions": len(self._sessions), "keep_turns": self.keep_turns, "max_tokens": self.max_tokens,
+                "summaries": self._summaries, "summary_errors": self._errors,
+                "avg_summary_ms": round(self._summary_ms / self._summaries, 2) if self._summaries else None}
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=False)
@@ -0,0 +1,193 @@
+from __future__ import annotations
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+import json, os, time
+import multiprocessing as mp
+from chunking import chunk_text
+from course_store import course_id_for, normalize_text
+from pregeneration import course_sections, extract_prompt, first_json, mcq_prompt, sheet_cards, sheet_prompt
+from sheet_store import SheetStore
+from validation import validate
+
+COURSE_EXTS = (".txt", ".md", ".markdown")
+
+# loader(spec, threads) -> callable model (ctransformers-style: model(prompt, stream=True, **params))
+Loader = Callable[[Dict[str, Any], int], Any]
+
+
+def load_model(spec: Dict[str, Any], threads: int) -> Any:
+    """Default loader: a GGUF model through ctransformers, or the offline FakeLLMProvider (spec["fake"])."""
+    if spec.get("fake"):
+        from fake_provider import FakeLLMProvider
+        return FakeLLMProvider(**{k: v for k, v in spec.items() if k != "fake"})
+    from model_pool import _load_ctransformers
+    return _load_ctransformers(spec, threads)
+
+
+def find_courses(root: str) -> List[str]:
+    paths = []
+    for d, _dirs, files in os.walk(root):
+        paths.extend(os.path.join(d, f) for f in files if f.lower().endswith(COURSE_EXTS) and not f.startswith("."))
+    return sorted(paths)
+
+
+def read_course(path: str) -> str:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return f.read()
+    except UnicodeDecodeError:
+        with open(path, "r", encoding="latin-1", errors="ignore") as f:
+            return f.read()
+
+
+class Manifest:
+    """Content hash → outcome of the last run for that course, saved after every file.
+
+    A course whose hash is recorded as "ok" (and whose sheets are still in the store) is
+    skipped, so an interrupted or repeated run only processes new or edited files.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                self.entries = json.load(f)
+
+    def done(self, h: str, sheets: SheetStore) -> bool:
+        e = self.entries.get(h)
+        return bool(e and e.get("status") == "ok" and sheets.exists(e["sheet_id"]))
+
+    def record(self, h: str, entry: Dict[str, Any]) -> None:
+        self.entries[h] = entry
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.entries, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, self.path)
+
+
+# --- worker side: one model per process, loaded by the pool initializer ---
+_MODEL: Any = None
+_OPTS: Dict[str, Any] = {}
+
+
+def _init_worker(loader: Loader, spec: Dict[str, Any], threads: int, opts: Dict[str, Any]) -> None:
+    global _MODEL, _OPTS
+    _MODEL, _OPTS = loader(spec, threads), opts
+
+
+def _generate(prompt: str, field: str, kind: Optional[str]) -> Tuple[Optional[Dict[str, Any]], int, str]:
+    """(payload, generated tokens, last error); invalid outputs are generated again up to `attempts` times."""
+    tokens, error = 0, ""
+    params = {"max_new_tokens": _OPTS.get("max_tokens", 1200), "temperature": _OPTS.get("temperature", 0.2)}
+    for _attempt in range(max(1, int(_OPTS.get("attempts", 2)))):
+        parts = list(_MODEL(prompt, stream=True, **params))
+        tokens += len(parts)
+        obj = first_json("".join(parts), field)
+        if obj is None:
+            error = f"no JSON object with '{field}'"
+            continue
+        if obj.get("status") == "insufficient_context":
+            return obj, tokens, ""
+        res = validate(kind, obj) if kind else {"ok": bool(obj.get(field)), "errors": [f"{field} empty"]}
+        if res["ok"]:
+            return obj, tokens, ""
+        error = "; ".join(str(e)[:200] for e in res["errors"][:3])
+    return None, tokens, error
+
+
+def process_course(path: str) -> Dict[str, Any]:
+    """Chunk one course file, then extract → sheets and MCQs for each section (runs in a worker)."""
+    t0 = time.perf_counter()
+    text = normalize_text(read_course(path))
+    title = next((l.lstrip("#").strip() for l in text.splitlines() if l.startswith("#")), "") or \
+        os.path.splitext(os.path.basename(path))[0]
+    sections = course_sections(chunk_text(text, 220, 40), _OPTS.get("section_words", 1200))
+    cards: List[Dict[str, Any]] = []
+    items: List[Dict[str, Any]] = []
+    tokens, errors = 0, []
+    for i, (section, passages) in enumerate(sections):
+        themes, n, err = _generate(extract_prompt(passages, section), "themes", None)
+        tokens += n
+        if themes is None:
+            errors.append(f"section {i} extract: {err}")
+        elif themes.get("themes"):
+            sheets, n, err = _generate(sheet_prompt(themes["themes"]), "sheets", "sheet")
+            tokens += n
+            if sheets is None:
+                errors.append(f"section {i} sheets: {err}")
+            else:
+                cards.extend(sheet_cards(sheets.get("sheets") or []))
+        mcq, n, err = _generate(mcq_prompt(passages, _OPTS.get("mcq_n", 5)), "items", "mcq")
+        tokens += n
+        if mcq is None:
+            errors.append(f"section {i} mcq: {err}")
+        else:
+            # Ids unique across the course's sections
+            items.extend({**it, "id": f"s{i}_{it.get('id')}"} for it in mcq.get("items") or [])
+    return {"file": path, "course_id": course_id_for(text), "title": title, "sections": len(sections),
+            "sheets": cards, "mcq": {"status": "ok", "items": items}, "tokens": tokens, "errors": errors,
+            "seconds": round(time.perf_counter() - t0, 3), "pid": os.getpid()}
+
+
+# --- parent side ---
+def _save(sheets: SheetStore, res: Dict[str, Any]) -> str:
+    """Store the course's sheets (+ its MCQs) under its content hash, served by /sheets/<id> and /api/sheets/<id>."""
+    sid, _created = sheets.put({"title": res["title"], "sheets": res["sheets"], "mcq": res["mcq"], "source": res["file"]},
+                               sid=res["course_id"])
+    return sid
+
+
+def run(paths: Iterable[str], store: str, manifest_path: str, spec: Dict[str, Any], workers: int = 1,
+        threads: int = 1, loader: Loader = load_model, on_result: Optional[Callable[[Dict[str, Any]], None]] = None,
+        **opts: Any) -> Dict[str, Any]:
+    """Process course files on `workers` processes (0 = in this process); returns a throughput report."""
+    manifest = Manifest(manifest_path)
+    sheets = SheetStore(store)
+    todo, skipped = [], 0
+    for p in paths:
+        if manifest.done(course_id_for(read_course(p)), sheets):
+            skipped += 1
+        else:
+            todo.append(p)
+    t0 = time.perf_counter()
+    results: List[Dict[str, Any]] = []
+
+    def collect(res: Dict[str, Any]) -> None:
+        status = "ok" if not res["errors"] else ("partial" if res["sheets"] or res["mcq"]["items"] else "error")
+        sid = _save(sheets, res) if status != "error" else None
+        manifest.record(res["course_id"], {"file": res["file"], "status": status, "sheet_id": sid,
+                                           "sections": res["sections"], "sheets": len(res["sheets"]),
+                                           "mcq": len(res["mcq"]["items"]), "tokens": res["tokens"],
+                                           "seconds": res["seconds"], "errors": res["errors"], "finished": time.time()})
+        res["status"] = status
+        results.append(res)
+        if on_result:
+            on_result(res)
+
+    if workers <= 0:
+        _init_worker(loader, spec, threads, opts)
+        for p in todo:
+            collect(process_course(p))
+    elif todo:
+        ctx = mp.get_context("fork") if "fork" in mp.get_all_start_methods() else mp.get_context()
+        with ProcessPoolExecutor(max_workers=min(workers, len(todo)), mp_context=ctx, initializer=_init_worker,
+                                 initargs=(loader, spec, threads, opts)) as ex:
+            futures = {ex.submit(process_course, p): p for p in todo}
+            for fut in as_completed(futures):
+                try:
+                    res = fut.result()
+                except Exception as e:  # worker crashed on this file: record it, keep going
+                    p = futures[fut]
+                    res = {"file": p, "course_id": course_id_for(read_course(p)), "title": "", "sections": 0,
+                           "sheets": [], "mcq": {"status": "ok", "items": []}, "tokens": 0, "errors": [str(e)],
+                           "seconds": 0.0}
+                collect(res)
+    wall = time.perf_counter() - t0
+    sheets.close()
+    tokens = sum(r["tokens"] for r in results)
+    return {"files": len(results), "skipped": skipped, "errors": sum(r["status"] != "ok" for r in results),
+            "seconds": round(wall, 3), "tokens": tokens, "workers": workers,
+            "files_per_min": round(len(results) / wall * 60, 2) if wall and results else 0.0,
+            "tokens_per_s": round(tokens / wall, 1) if wall and results else 0.0}
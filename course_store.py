@@ -0,0 +1,128 @@
+from __future__ import annotations
+from collections import OrderedDict
+from typing import Any, Dict, FrozenSet, List, Optional
+import os, re, json, time, hashlib, threading, unicodedata
+from chunking import chunk_text
+
+_WORD_RE = re.compile(r"\w+")
+
+
+def normalize_text(text: str) -> str:
+    """NFC, unified newlines, collapsed spaces and at most one blank line in a row."""
+    t = unicodedata.normalize("NFC", text or "").replace("\r\n", "\n").replace("\r", "\n")
+    t = re.sub(r"[ \t\u00a0]+", " ", t)
+    t = re.sub(r" *\n *", "\n", t)
+    t = re.sub(r"\n{3,}", "\n\n", t)
+    return t.strip()
+
+
+def _hash(norm: str) -> str:
+    return hashlib.sha256(norm.encode("utf-8")).hexdigest()[:16]
+
+
+def course_id_for(text: str) -> str:
+    """Content-hash id of a course (same text → same id, on any machine)."""
+    return _hash(normalize_text(text))
+
+
+class Course:
+    __slots__ = ("id", "title", "text", "chunks", "_terms", "created", "cache")
+
+    def __init__(self, cid: str, title: str, text: str, chunks: List[Dict[str, Any]], created: float):
+        self.id, self.title, self.text, self.chunks, self.created = cid, title, text, chunks, created
+        # Retrieval index: one lowercase term set per chunk, built once per course
+        self._terms: List[FrozenSet[str]] = [frozenset(_WORD_RE.findall(c["text"].lower())) for c in chunks]
+        # Per-course derived data (answers, extractive indexes, ...) keyed by feature name
+        self.cache: Dict[str, Any] = {}
+
+    def meta(self) -> Dict[str, Any]:
+        return {"course_id": self.id, "title": self.title, "chars": len(self.text),
+                "words": len(self.text.split()), "chunks": len(self.chunks), "created": self.created}
+
+    def retrieve(self, query: str, k: int = 8) -> List[Dict[str, Any]]:
+        """Top-k chunks by Jaccard overlap with the query (same scoring as /rag/retrieve)."""
+        q = frozenset(_WORD_RE.findall((query or "").lower()))
+        if not q:
+            return self.chunks[:k]
+        scored = []
+        for i, terms in enumerate(self._terms):
+            inter = len(q & terms)
+            if inter:
+                scored.append((inter / (len(q | terms) or 1), i))
+        scored.sort(key=lambda x: (-x[0], x[1]))
+        return [self.chunks[i] for _s, i in scored[:k]]
+
+    def context_for(self, query: str, max_words: int = 1200) -> str:
+        """Most relevant chunks for `query` within a word budget, in course order."""
+        picked, words = [], 0
+        for c in self.retrieve(query, k=len(self.chunks)):
+            n = len(c["text"].split())
+            if picked and words + n > max_words:
+                break
+            picked.append(c)
+            words += n
+        if not picked:
+            picked = self.chunks[:1]
+        picked.sort(key=lambda c: c["start"])
+        return "\n[…]\n".join(c["text"] for c in picked)
+
+
+class CourseStore:
+    """Courses uploaded once and referenced by content-hash id.
+
+    Each course is saved as `<root>/<course_id>.json` (normalized text + chunks);
+    recently used courses stay in memory with their retrieval index.
+    """
+
+    def __init__(self, root: str, max_cached: int = 32, chunk_size: int = 220, overlap: int = 40):
+        self.root = root
+        self.max_cached, self.chunk_size, self.overlap = max_cached, chunk_size, overlap
+        self._mem: "OrderedDict[str, Course]" = OrderedDict()
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    def put(self, text: str, title: Optional[str] = None) -> Course:
+        norm = normalize_text(text)
+        cid = _hash(norm)
+        existing = self.get(cid)
+        if existing is not None:
+            return existing
+        course = Course(cid, (title or "").strip() or _guess_title(norm), norm,
+                        chunk_text(norm, self.chunk_size, self.overlap), time.time())
+        path = os.path.join(self.root, f"{cid}.json")
+        tmp = f"{path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"id": cid, "title": course.title, "text": norm, "chunks": course.chunks,
+                       "created": course.created}, f, ensure_ascii=False)
+        os.replace(tmp, path)
+        self._remember(course)
+        return course
+
+    def get(self, cid: str) -> Optional[Course]:
+        if not cid or not re.fullmatch(r"[0-9a-f]{16}", cid):
+            return None
+        with self._lock:
+            course = self._mem.get(cid)
+            if course is not None:
+                self._mem.move_to_end(cid)
+                return course
+        path = os.path.join(self.root, f"{cid}.json")
+        if not os.path.exists(path):
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            d = json.load(f)
+        course = Course(d["id"], d.get("title") or "", d["text"], d["chunks"], d.get("created") or 0.0)
+        self._remember(course)
+        return course
+
+    def _remember(self, course: Course) -> None:
+        with self._lock:
+            self._mem[course.id] = course
+            self._mem.move_to_end(course.id)
+            while len(self._mem) > self.max_cached:
+                self._mem.popitem(last=False)
+
+
+def _guess_title(text: str) -> str:
+    first = next((l.strip("# ").strip() for l in text.splitlines() if l.strip()), "")
+    return first[:80] or "Cours"
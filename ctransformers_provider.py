@@ -41,6 +41,13 @@ class CTransformersProvider(BaseLLMProvider):
             for k, v in config.items():
                 if k in allowed:
                     kwargs[k] = v
+        # Fill threads/batch_size from this host's calibration profile unless configured explicitly
+        try:
+            from calibration import load_profile
+            for k, v in load_profile(model, model_file).items():
+                kwargs.setdefault(k, v)
+        except Exception:
+            pass
         try:
             # Build explicit args for better type inference
             base_args = {
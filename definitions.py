@@ -0,0 +1,141 @@
+from __future__ import annotations
+from collections import OrderedDict
+from typing import Any, Dict, FrozenSet, List, Optional, Sequence
+import re, threading
+from chunking import iter_units
+from semantic_cache import content_words
+
+# Definition sentences, strongest wording first: (pattern, confidence of an exact term match).
+# Same markers as /v1/extract (définition, se définit, consiste en, est), anchored on the defined term.
+_TERM = r"(?P<term>[^;:!?]{2,90}?)"
+_DEF_PATTERNS = [
+    (re.compile(r"^d[ée]finitions?\s*(?:de\s+la\s+|de\s+l['’]\s*|du\s+|des\s+|de\s+|d['’]\s*)?" + _TERM + r"\s*:\s*(?P<def>.{10,})$", re.I), 1.0),
+    (re.compile(r"^" + _TERM + r"\s+(?:se\s+d[ée]fini(?:t|ssent)|(?:est|sont)\s+d[ée]fini(?:e|s|es)?)\s+(?:comme|par)\s+(?P<def>.{10,})$", re.I), 1.0),
+    (re.compile(r"^on\s+(?:appelle|nomme|entend\s+par)\s+" + _TERM + r"\s*,\s*(?P<def>.{10,})$", re.I), 0.95),
+    (re.compile(r"^" + _TERM + r"\s+(?:d[ée]signe(?:nt)?|signifie(?:nt)?|consiste(?:nt)?\s+(?:en|à|a))\s+(?P<def>.{10,})$", re.I), 0.9),
+    (re.compile(r"^" + _TERM + r"\s+(?:est|sont)\s+(?P<def>(?:un|une|le|la|les|l['’]|des|ce|cette|tout|toute)\b.{10,})$", re.I), 0.8),
+]
+# "Qu'est-ce qu'un X ?", "C'est quoi X", "X, c'est quoi ?", "Définis X", "Que signifie X ?", "Qu'appelle-t-on X ?"
+_QUESTION_RE = re.compile(
+    r"^\s*(?:qu['’]est[- ]ce\s+qu|c['’]est\s+quoi|d[ée]fini(?:s|r|ssez)|(?:donne[rz]?(?:-moi)?\s+)?(?:la\s+)?d[ée]finition"
+    r"|que\s+(?:signifie|d[ée]signe|veut\s+dire)|qu['’]appelle[- ]t[- ]on|qu['’]entend[- ]on\s+par)"
+    r"|c['’]est\s+quoi\s*\??\s*$", re.I)
+_LEAD_DET_RE = re.compile(r"^(?:(?:les|le|la|une|un|des|du|de\s+la)\s+|(?:de\s+)?l['’]\s*)", re.I)
+
+
+def is_definition_question(question: str) -> bool:
+    return bool(_QUESTION_RE.search((question or "").strip()))
+
+
+class Definition:
+    __slots__ = ("term", "words", "sentence", "start", "end", "section", "strength")
+
+    def __init__(self, term: str, sentence: str, start: int, end: int, section: str, strength: float):
+        self.term, self.sentence, self.start, self.end = term, sentence, start, end
+        self.section, self.strength = section, strength
+        self.words: FrozenSet[str] = frozenset(content_words(term))
+
+
+def _match(sentence: str) -> Optional[tuple]:
+    s = sentence.strip().lstrip("-•*").strip()
+    for pattern, strength in _DEF_PATTERNS:
+        m = pattern.match(s)
+        if m:
+            # "Selon la loi, le chèque est un …": the term follows the last comma
+            term = _LEAD_DET_RE.sub("", m.group("term").split(",")[-1].strip())
+            if term and len(term.split()) <= 8:
+                return term, strength
+    return None
+
+
+class DefinitionIndex:
+    """Definition sentences of a course, by the content words of the defined term.
+
+    Built once per course text in one streaming pass over its sentences
+    (`chunking.iter_units`), so offsets cite the exact source sentence.
+    """
+
+    def __init__(self, text: str, chunks: Optional[Sequence[Dict[str, Any]]] = None):
+        self.entries: List[Definition] = []
+        self._by_word: Dict[str, List[int]] = {}
+        self._chunks = [(c["start"], c["end"], c["id"]) for c in chunks or []]
+        section = ""
+        for u in iter_units(text, max_tokens=120):
+            if u.heading:
+                section = u.text.lstrip("#").strip()
+                continue
+            hit = _match(u.text)
+            if hit is None:
+                continue
+            d = Definition(hit[0], u.text, u.start, u.end, section, hit[1])
+            if not d.words:
+                continue
+            for w in d.words:
+                self._by_word.setdefault(w, []).append(len(self.entries))
+            self.entries.append(d)
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def _passage(self, start: int) -> Optional[str]:
+        for a, b, cid in self._chunks:
+            if a <= start < b:
+                return cid
+        return None
+
+    def lookup(self, question: str) -> Optional[Dict[str, Any]]:
+        """Best definition for a definition question: {answer, confidence, citation}, or None."""
+        if not is_definition_question(question):
+            return None
+        q = frozenset(content_words(question))
+        if not q:
+            return None
+        best, best_score = None, 0.0
+        for i in sorted({i for w in q for i in self._by_word.get(w, ())}):
+            d = self.entries[i]
+            score = len(q & d.words) / len(q | d.words) * d.strength
+            if score > best_score:
+                best, best_score = d, score
+        if best is None:
+            return None
+        return {"answer": best.sentence, "term": best.term, "confidence": round(best_score, 3),
+                "citation": {"passage_id": self._passage(best.start), "section": best.section,
+                             "start": best.start, "end": best.end, "text": best.sentence}}
+
+
+class DefinitionAnswerer:
+    """Definition indexes by course content hash, plus the share of questions answered extractively."""
+
+    def __init__(self, threshold: float = 0.7, maxsize: int = 64):
+        self.threshold = float(threshold)
+        self.maxsize = maxsize
+        self._indexes: "OrderedDict[str, DefinitionIndex]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.checked = self.answered = 0
+
+    def index(self, key: str, text: str, chunks: Optional[Sequence[Dict[str, Any]]] = None) -> DefinitionIndex:
+        with self._lock:
+            idx = self._indexes.get(key)
+            if idx is not None:
+                self._indexes.move_to_end(key)
+                return idx
+        idx = DefinitionIndex(text, chunks)
+        with self._lock:
+            self._indexes[key] = idx
+            while len(self._indexes) > self.maxsize:
+                self._indexes.popitem(last=False)
+        return idx
+
+    def answer(self, idx: DefinitionIndex, question: str) -> Optional[Dict[str, Any]]:
+        hit = idx.lookup(question)
+        ok = hit is not None and hit["confidence"] >= self.threshold
+        with self._lock:
+            self.checked += 1
+            self.answered += ok
+        return hit if ok else None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"courses": len(self._indexes), "threshold": self.threshold, "checked": self.checked,
+                    "answered": self.answered,
+                    "share": round(self.answered / self.checked, 4) if self.checked else 0.0}
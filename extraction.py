@@ -0,0 +1,91 @@
+from __future__ import annotations
+from collections import Counter
+from concurrent.futures import Executor
+from functools import lru_cache
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+import re, unicodedata
+
+# Same rules as the former /v1/extract, compiled once
+_TOKEN_RE = re.compile(r"[A-Za-zÀ-ÿ]{3,}")
+_DEFINITION_RE = re.compile(r"(définition|se définit|est|consiste en)", re.I)
+STOPWORDS = frozenset("le la les de des du un une et ou a au aux en dans pour par avec sans sur sous entre d l que qui quoi "
+                      "dont est sont ete été etre être ce cet cette ces il elle nous vous on ne pas".split())
+
+MAX_NOTIONS = 12
+MAX_DEFINITIONS = 8
+MAX_QUESTIONS = 6
+
+
+@lru_cache(maxsize=65536)
+def fold(word: str) -> str:
+    """Lowercase without accents ("Définit" → "definit"); a course reuses a small vocabulary, so this is memoized."""
+    if word.isascii():
+        return word.lower()
+    return unicodedata.normalize("NFKD", word).encode("ascii", "ignore").decode().lower()
+
+
+def count_notions(text: str) -> Counter:
+    """Folded word counts without stopwords, in order of first occurrence (ties keep that order)."""
+    # One C-level pass counts the raw tokens; folding then runs once per distinct token
+    raw = Counter(_TOKEN_RE.findall(text))
+    counts: Counter = Counter()
+    for word, n in raw.items():
+        w = fold(word)
+        if w not in STOPWORDS:
+            counts[w] += n
+    return counts
+
+
+def definition_lines(text: str, limit: int = MAX_DEFINITIONS) -> List[str]:
+    out = []
+    for line in text.splitlines():
+        line = line.strip()
+        if line and _DEFINITION_RE.search(line):
+            out.append(line[:220])
+            if len(out) >= limit:
+                break
+    return out
+
+
+def extract_data(text: str) -> Dict[str, List[str]]:
+    """Key notions, definition lines and review questions of a course (the /v1/extract payload)."""
+    text = (text or "").strip()
+    if not text:
+        return {"notions_cles": [], "definitions": [], "questions": []}
+    notions = [w for w, _ in count_notions(text).most_common(MAX_NOTIONS)]
+    return {"notions_cles": notions, "definitions": definition_lines(text),
+            "questions": [f"Expliquez la notion: « {w} »." for w in notions[:MAX_QUESTIONS]]}
+
+
+# --- batches ---
+Doc = Tuple[int, Any, str]  # (index, client id, text)
+
+
+def _extract_chunk(docs: List[Doc]) -> List[Dict[str, Any]]:
+    # Runs in a pool worker: one pickled round trip per chunk, not per document
+    return [{"index": i, "id": did, "data": extract_data(text)} for i, did, text in docs]
+
+
+def chunks(docs: Iterable[Doc], chunk_chars: int) -> Iterator[List[Doc]]:
+    """Consecutive documents grouped until about `chunk_chars` characters (a larger document is a chunk by itself)."""
+    cur: List[Doc] = []
+    size = 0
+    for d in docs:
+        cur.append(d)
+        size += len(d[2])
+        if size >= chunk_chars:
+            yield cur
+            cur, size = [], 0
+    if cur:
+        yield cur
+
+
+def extract_many(docs: List[Doc], executor: Optional[Executor] = None,
+                 chunk_chars: int = 1 << 20) -> Iterator[Dict[str, Any]]:
+    """One result per document, in input order; with an executor, chunks run in parallel."""
+    if executor is None:
+        for chunk in chunks(docs, chunk_chars):
+            yield from _extract_chunk(chunk)
+        return
+    for results in executor.map(_extract_chunk, chunks(docs, chunk_chars)):
+        yield from results
@@ -0,0 +1,44 @@
+from __future__ import annotations
+from typing import Iterable, Iterator, Optional
+import time
+from base import BaseLLMProvider
+
+_DEFAULT_REPLY = ("La Révolution française a été provoquée par la crise financière, les tensions sociales "
+                  "et la diffusion des idées des Lumières.")
+
+
+class FakeLLMProvider(BaseLLMProvider):
+    """Deterministic offline stand-in for a local model.
+
+    Sleeps `prompt_eval_ms` per prompt word, then `token_ms` per generated token,
+    and cycles through the words of `reply`. Also callable like a ctransformers
+    model so it can replace `qwen_model`/`tinyllama_model` in benchmarks.
+    """
+
+    def __init__(self, prompt_eval_ms: float = 0.0, token_ms: float = 0.0, reply: Optional[str] = None,
+                 max_new_tokens: int = 64):
+        self.prompt_eval_ms, self.token_ms = float(prompt_eval_ms), float(token_ms)
+        self.words = (reply or _DEFAULT_REPLY).split()
+        self.max_new_tokens = int(max_new_tokens)
+        self.calls = 0
+        self.last_prompt = ""
+
+    def _tokens(self, prompt: str, max_new_tokens: Optional[int]) -> Iterator[str]:
+        self.calls += 1
+        self.last_prompt = prompt
+        if self.prompt_eval_ms:
+            time.sleep(self.prompt_eval_ms * len(prompt.split()) / 1000)
+        n = int(max_new_tokens or self.max_new_tokens)
+        for i in range(n):
+            if self.token_ms:
+                time.sleep(self.token_ms / 1000)
+            yield (" " if i else "") + self.words[i % len(self.words)]
+
+    def generate(self, prompt: str, **params) -> str:
+        return "".join(self._tokens(prompt, params.get("max_new_tokens") or params.get("max_tokens")))
+
+    def stream(self, prompt: str, **params) -> Iterable[str]:
+        yield from self._tokens(prompt, params.get("max_new_tokens") or params.get("max_tokens"))
+
+    def __call__(self, prompt: str, stream: bool = False, **params):
+        return self.stream(prompt, **params) if stream else self.generate(prompt, **params)
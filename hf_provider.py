@@ -1,33 +1,125 @@
 from __future__ import annotations
-from typing import Iterable, Optional
+from typing import Any, Dict, Iterable, Optional
+import os, threading, time
 from base import BaseLLMProvider
 
+# config.yml -> huggingface.cpu, used when no GPU device is configured
+CPU_DEFAULTS: Dict[str, Any] = {
+    "mode": "off",         # "off": torch_dtype="auto"; opt-in: "fp32" (float32 only), "int8" (dynamic int8 Linear layers, changes outputs)
+    "threads": None,       # intra-op threads (torch.set_num_threads); None = cores available to the process
+    "interop_threads": 1,  # generation is sequential: extra inter-op threads only add contention
+    "compile": False,      # torch.compile the forward pass (slow first call, needs a C++ compiler)
+    "warmup_tokens": 8,    # tokens generated once at load so the first request does not pay for lazy init
+}
+
+_THREADS_LOCK = threading.Lock()
+_INTEROP_SET = False
+
+
+def _available_cores() -> int:
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def set_threads(threads: Optional[int], interop_threads: Optional[int]) -> Dict[str, int]:
+    """Process-wide torch thread counts; inter-op threads can only be set once, before any parallel work."""
+    import torch
+    global _INTEROP_SET
+    with _THREADS_LOCK:
+        torch.set_num_threads(int(threads or _available_cores()))
+        if interop_threads and not _INTEROP_SET:
+            try:
+                torch.set_num_interop_threads(int(interop_threads))
+            except RuntimeError:  # already started by earlier torch work in this process
+                pass
+            _INTEROP_SET = True
+        return {"threads": torch.get_num_threads(), "interop_threads": torch.get_num_interop_threads()}
+
+
+def quantize_int8(model: Any) -> Any:
+    """Dynamic int8 quantization of the Linear layers (weights int8, activations quantized on the fly)."""
+    import torch
+    from torch.ao.quantization import quantize_dynamic
+    if torch.backends.quantized.engine == "none":
+        engines = torch.backends.quantized.supported_engines
+        torch.backends.quantized.engine = next((e for e in ("x86", "fbgemm", "qnnpack") if e in engines), engines[0])
+    # In place: a copy would briefly double the resident weights
+    return quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+
+
 class HFProvider(BaseLLMProvider):
-    def __init__(self, model: str, device: Optional[int] = None):
+    def __init__(self, model: str, device: Optional[int] = None, cpu: Optional[Dict[str, Any]] = None):
         from transformers import AutoModelForCausalLM, AutoTokenizer
-        import torch  # noqa: F401
+        import torch
         if not model or not str(model).strip():
             raise ValueError("huggingface: model repo is missing. Configure config.yml -> huggingface.model or set LLM_MODEL.")
+        opts = {**CPU_DEFAULTS, **(cpu or {})}
+        # CPU mode only applies without a GPU device (and can be turned off)
+        self.cpu_mode = opts["mode"] if device is None and opts["mode"] in ("int8", "fp32") else None
+        self.info: Dict[str, Any] = {"model": model, "mode": self.cpu_mode or "auto"}
+        t0 = time.perf_counter()
         try:
             self.tok = AutoTokenizer.from_pretrained(model, use_fast=True)
             device_map = "auto" if device is not None else None
-            self.model = AutoModelForCausalLM.from_pretrained(model, torch_dtype="auto", device_map=device_map)
+            # Quantized kernels and the CPU thread pool want float32 weights, not the checkpoint's half precision
+            dtype = torch.float32 if self.cpu_mode else "auto"
+            self.model = AutoModelForCausalLM.from_pretrained(model, torch_dtype=dtype, device_map=device_map)
         except Exception as e:
             raise RuntimeError(f"huggingface: unable to load model '{model}'. Ensure it is downloadable or cached. Error: {e}")
+        if self.cpu_mode:
+            self.model.eval()
+            self.info.update(set_threads(opts["threads"], opts["interop_threads"]))
+            if self.cpu_mode == "int8":
+                self.model = quantize_int8(self.model)
+                self.info["quantized_layers"] = sum(type(m).__name__ == "Linear" and "quantized" in type(m).__module__
+                                                    for m in self.model.modules())
+            self.info["compiled"] = False
+            if opts["compile"]:
+                try:
+                    self.model.forward = torch.compile(self.model.forward, dynamic=True)
+                    self.info["compiled"] = True
+                except Exception as e:  # no compiler / unsupported platform: run eagerly
+                    self.info["compile_error"] = str(e)[:200]
+        self.info["load_s"] = round(time.perf_counter() - t0, 3)
+        if self.cpu_mode and opts["warmup_tokens"]:
+            t0 = time.perf_counter()
+            self.generate("Bonjour", max_tokens=int(opts["warmup_tokens"]))
+            self.info["warmup_s"] = round(time.perf_counter() - t0, 3)
+
+    def _gen_kwargs(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        kw = dict(max_new_tokens=params.get("max_tokens", 256), temperature=params.get("temperature", 0.2))
+        if self.cpu_mode:
+            # Reuse the KV cache between steps; pad with EOS for models that have no pad token
+            kw.update(use_cache=True, pad_token_id=self.tok.pad_token_id if self.tok.pad_token_id is not None else self.tok.eos_token_id)
+        return kw
 
     def generate(self, prompt: str, **params) -> str:
         import torch
         inputs = self.tok(prompt, return_tensors="pt").to(self.model.device)
-        out = self.model.generate(**inputs, max_new_tokens=params.get("max_tokens", 256), temperature=params.get("temperature", 0.2))
+        with torch.inference_mode():
+            out = self.model.generate(**inputs, **self._gen_kwargs(params))
         return self.tok.decode(out[0], skip_special_tokens=True)
 
     def stream(self, prompt: str, **params) -> Iterable[str]:
-        from transformers import TextIteratorStreamer
-        import threading
+        from transformers import StoppingCriteria, StoppingCriteriaList, TextIteratorStreamer
+        import torch
         inputs = self.tok(prompt, return_tensors="pt").to(self.model.device)
         streamer = TextIteratorStreamer(self.tok, skip_prompt=True)
-        kw = dict(max_new_tokens=params.get("max_tokens", 256), temperature=params.get("temperature", 0.2), streamer=streamer)
-        thread = threading.Thread(target=self.model.generate, kwargs={**inputs, **kw})
+        kw = dict(self._gen_kwargs(params), streamer=streamer)
+        should_stop = params.get("should_stop")
+        if should_stop is not None:
+            # Stops generate() itself on cancel/deadline, not just the consumer of the stream
+            class _Stop(StoppingCriteria):
+                def __call__(self, input_ids, scores, **kwargs) -> bool:
+                    return bool(should_stop())
+            kw["stopping_criteria"] = StoppingCriteriaList([_Stop()])
+
+        def run() -> None:
+            # inference_mode is per thread: enter it in the generation thread
+            with torch.inference_mode():
+                self.model.generate(**inputs, **kw)
+        thread = threading.Thread(target=run)
         thread.start()
         for token in streamer: yield token
         thread.join()
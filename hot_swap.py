@@ -0,0 +1,144 @@
+from __future__ import annotations
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional, Sequence
+import gc, threading, time
+
+
+class Leases:
+    """In-flight generations per model instance, so a replaced instance is freed only once idle."""
+
+    def __init__(self) -> None:
+        self._counts: Dict[int, int] = {}
+        self._cond = threading.Condition()
+
+    @contextmanager
+    def hold(self, model_obj: Any) -> Iterator[None]:
+        self.acquire(lambda: (model_obj,))
+        try:
+            yield
+        finally:
+            self.release(model_obj)
+
+    def acquire(self, select: Callable[[], Sequence[Any]]) -> List[Any]:
+        """Read the current models with `select` and lease them in one step, so a swap cannot
+        count them idle in between. Returns them as selected; release() each non-None one."""
+        with self._cond:
+            models = list(select())
+            for m in models:
+                if m is not None:
+                    self._counts[id(m)] = self._counts.get(id(m), 0) + 1
+        return models
+
+    def release(self, model_obj: Any) -> None:
+        key = id(model_obj)
+        with self._cond:
+            n = self._counts[key] - 1
+            if n:
+                self._counts[key] = n
+            else:
+                del self._counts[key]
+            self._cond.notify_all()
+
+    def count(self, model_obj: Any) -> int:
+        with self._cond:
+            return self._counts.get(id(model_obj), 0)
+
+    def wait_idle(self, model_obj: Any, timeout: Optional[float] = None) -> bool:
+        with self._cond:
+            return self._cond.wait_for(lambda: id(model_obj) not in self._counts, timeout)
+
+
+class SwapBusy(RuntimeError):
+    pass
+
+
+class ModelSwapper:
+    """Replaces a named model by a new version without stopping traffic.
+
+    The new version is loaded and given a warm-up generation on a background
+    thread while the current one keeps serving; `install` then switches to it
+    in one assignment. The old instance is released once its in-flight
+    generations (see Leases) are done. A failed load or warm-up leaves the
+    current model in place.
+    """
+
+    def __init__(self, loader: Callable[[Dict[str, Any]], Any], current: Callable[[str], Any],
+                 install: Callable[[str, Any, Dict[str, Any]], None], leases: Leases,
+                 warmup_prompt: str = "Bonjour", warmup_tokens: int = 8, drain_timeout_s: float = 300.0,
+                 release: Optional[Callable[[Any], None]] = None, keep: int = 10):
+        self.loader, self.current, self.install, self.leases = loader, current, install, leases
+        self.warmup_prompt, self.warmup_tokens, self.drain_timeout_s = warmup_prompt, warmup_tokens, drain_timeout_s
+        self.release = release
+        self._lock = threading.Lock()
+        self._running: Dict[str, Dict[str, Any]] = {}
+        self._threads: Dict[str, threading.Thread] = {}
+        self._history: Deque[Dict[str, Any]] = deque(maxlen=keep)
+
+    def start(self, name: str, spec: Dict[str, Any]) -> Dict[str, Any]:
+        """Begin swapping `name` to `spec` in the background; raises SwapBusy if a swap of `name` is running."""
+        with self._lock:
+            if name in self._running:
+                raise SwapBusy(f"swap of '{name}' already in progress")
+            job = {"model": name, "spec": dict(spec), "state": "loading", "started": time.time(), "error": None}
+            self._running[name] = job
+            t = threading.Thread(target=self._run, args=(job,), name=f"swap-{name}", daemon=True)
+            self._threads[name] = t
+        t.start()
+        return dict(job)
+
+    def join(self, name: str, timeout: Optional[float] = None) -> None:
+        t = self._threads.get(name)
+        if t is not None:
+            t.join(timeout)
+
+    def _run(self, job: Dict[str, Any]) -> None:
+        name = job["model"]
+        t0 = time.perf_counter()
+        new = None
+        try:
+            new = self.loader(job["spec"])
+            job["load_s"] = round(time.perf_counter() - t0, 3)
+            job["state"] = "warming"
+            t1 = time.perf_counter()
+            out = new(self.warmup_prompt, max_new_tokens=self.warmup_tokens)
+            if not isinstance(out, str):
+                out = "".join(out)
+            if not out.strip():
+                raise RuntimeError("warm-up generation returned no text")
+            job["warmup_s"] = round(time.perf_counter() - t1, 3)
+        except Exception as e:
+            job.update(state="failed", error=f"{type(e).__name__}: {e}"[:300])
+            new = None
+            self._finish(job, t0)
+            return
+        old = self.current(name)
+        t2 = time.perf_counter()
+        self.install(name, new, job["spec"])
+        job["switch_ms"] = round((time.perf_counter() - t2) * 1000, 3)
+        # Requests lease their model as they read it (Leases.acquire): any that read `old` are counted here
+        job["in_flight_at_switch"] = self.leases.count(old) if old is not None else 0
+        job["state"] = "draining"
+        if old is not None:
+            t3 = time.perf_counter()
+            job["drained"] = self.leases.wait_idle(old, self.drain_timeout_s)
+            job["drain_s"] = round(time.perf_counter() - t3, 3)
+            if self.release is not None:
+                self.release(old)
+            del old
+            gc.collect()
+        job["state"] = "done"
+        self._finish(job, t0)
+
+    def _finish(self, job: Dict[str, Any], t0: float) -> None:
+        job["total_s"] = round(time.perf_counter() - t0, 3)
+        job["finished"] = time.time()
+        with self._lock:
+            self._running.pop(job["model"], None)
+            self._history.append(dict(job))
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            running: List[Dict[str, Any]] = [dict(j) for j in self._running.values()]
+            history = list(self._history)
+        return {"running": running, "last": history[-1] if history else None, "history": history}
@@ -0,0 +1,196 @@
+from __future__ import annotations
+from typing import Any, Callable, Dict, List, Optional
+import os, json, time, uuid, sqlite3, threading
+
+# Job states: queued → running → done | failed (queued again between retries)
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    course_id TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    section INTEGER NOT NULL DEFAULT 0,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    depends_on TEXT,
+    payload TEXT NOT NULL,
+    result_path TEXT,
+    error TEXT,
+    not_before REAL NOT NULL DEFAULT 0,
+    created REAL NOT NULL,
+    updated REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_ready ON jobs (status, not_before, created);
+CREATE INDEX IF NOT EXISTS jobs_course ON jobs (course_id);
+"""
+
+# handler(job, queue) -> result dict; raise to retry
+Handler = Callable[[Dict[str, Any], "JobQueue"], Dict[str, Any]]
+
+
+class JobError(Exception):
+    """A job attempt failed (generation error, invalid output); it is retried until max_attempts."""
+
+
+class JobQueue:
+    """Persistent background jobs in SQLite, processed by worker threads.
+
+    State survives restarts: jobs left `running` by a crash are queued again on
+    open. Failed attempts are retried with exponential backoff; a job whose
+    dependency failed for good fails too. Results are JSON files under
+    `<root>/<course_id>/`, the database only keeps their paths.
+    """
+
+    def __init__(self, root: str, handlers: Dict[str, Handler], max_attempts: int = 3, backoff_s: float = 2.0):
+        self.root = root
+        self.handlers = handlers
+        self.max_attempts, self.backoff_s = int(max_attempts), float(backoff_s)
+        os.makedirs(root, exist_ok=True)
+        self._db = sqlite3.connect(os.path.join(root, "jobs.sqlite3"), check_same_thread=False, isolation_level=None)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(_SCHEMA)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._threads: List[threading.Thread] = []
+        self.recovered = self._exec("UPDATE jobs SET status='queued', updated=? WHERE status='running'", (time.time(),))
+
+    # One connection shared by the workers and the API: every statement runs under the lock
+    def _exec(self, sql: str, args: tuple = ()) -> int:
+        with self._lock:
+            return self._db.execute(sql, args).rowcount
+
+    def _query(self, sql: str, args: tuple = ()) -> List[sqlite3.Row]:
+        with self._lock:
+            return self._db.execute(sql, args).fetchall()
+
+    # --- producing ---
+    def enqueue(self, course_id: str, kind: str, payload: Dict[str, Any], section: int = 0,
+                depends_on: Optional[str] = None, max_attempts: Optional[int] = None) -> str:
+        jid = uuid.uuid4().hex[:10]
+        now = time.time()
+        self._exec("INSERT INTO jobs (id, course_id, kind, section, status, max_attempts, depends_on, payload, created, updated) "
+                   "VALUES (?, ?, ?, ?, 'queued', ?, ?, ?, ?, ?)",
+                   (jid, course_id, kind, section, max_attempts or self.max_attempts, depends_on,
+                    json.dumps(payload, ensure_ascii=False), now, now))
+        self._wake.set()
+        return jid
+
+    def has_jobs(self, course_id: str) -> bool:
+        return bool(self._query("SELECT 1 FROM jobs WHERE course_id=? LIMIT 1", (course_id,)))
+
+    # --- reading ---
+    def get(self, jid: str) -> Optional[Dict[str, Any]]:
+        rows = self._query("SELECT * FROM jobs WHERE id=?", (jid,))
+        return self._public(rows[0]) if rows else None
+
+    def for_course(self, course_id: str) -> List[Dict[str, Any]]:
+        rows = self._query("SELECT * FROM jobs WHERE course_id=? ORDER BY section, created", (course_id,))
+        return [self._public(r) for r in rows]
+
+    def result(self, jid: str) -> Optional[Dict[str, Any]]:
+        rows = self._query("SELECT result_path FROM jobs WHERE id=? AND status='done'", (jid,))
+        if not rows or not rows[0]["result_path"] or not os.path.exists(rows[0]["result_path"]):
+            return None
+        with open(rows[0]["result_path"], "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def counts(self) -> Dict[str, int]:
+        return {r["status"]: r["n"] for r in self._query("SELECT status, COUNT(*) AS n FROM jobs GROUP BY status")}
+
+    @staticmethod
+    def _public(row: sqlite3.Row) -> Dict[str, Any]:
+        d = dict(row)
+        d.pop("payload", None)
+        d.pop("result_path", None)
+        return d
+
+    # --- processing ---
+    def claim(self) -> Optional[Dict[str, Any]]:
+        """Atomically take the oldest ready job (dependencies done, backoff elapsed)."""
+        now = time.time()
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._db.execute(
+                    "SELECT j.* FROM jobs j LEFT JOIN jobs d ON d.id = j.depends_on "
+                    "WHERE j.status='queued' AND j.not_before <= ? AND (j.depends_on IS NULL OR d.status='done') "
+                    "ORDER BY j.created LIMIT 1", (now,)).fetchone()
+                if row is not None:
+                    self._db.execute("UPDATE jobs SET status='running', attempts=attempts+1, updated=? WHERE id=?", (now, row["id"]))
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+        if row is None:
+            return None
+        job = dict(row)
+        job["attempts"] += 1
+        job["payload"] = json.loads(job["payload"])
+        return job
+
+    def run_once(self) -> Optional[str]:
+        """Process one ready job; returns its id (None when nothing is ready)."""
+        job = self.claim()
+        if job is None:
+            return None
+        handler = self.handlers.get(job["kind"])
+        try:
+            if handler is None:
+                raise JobError(f"no handler for {job['kind']}")
+            result = handler(job, self)
+        except Exception as e:
+            self._fail(job, str(e) or e.__class__.__name__)
+            return job["id"]
+        path = os.path.join(self.root, job["course_id"], f"{job['kind']}-{job['section']:03d}-{job['id']}.json")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, path)
+        self._exec("UPDATE jobs SET status='done', result_path=?, error=NULL, updated=? WHERE id=?",
+                   (path, time.time(), job["id"]))
+        self._wake.set()
+        return job["id"]
+
+    def _fail(self, job: Dict[str, Any], error: str) -> None:
+        now = time.time()
+        if job["attempts"] < job["max_attempts"]:
+            delay = self.backoff_s * (2 ** (job["attempts"] - 1))
+            self._exec("UPDATE jobs SET status='queued', error=?, not_before=?, updated=? WHERE id=?",
+                       (error, now + delay, now, job["id"]))
+            return
+        self._exec("UPDATE jobs SET status='failed', error=?, updated=? WHERE id=?", (error, now, job["id"]))
+        # Dependents can never run
+        for row in self._query("SELECT * FROM jobs WHERE depends_on=? AND status='queued'", (job["id"],)):
+            self._fail({**dict(row), "attempts": row["max_attempts"]}, f"dependency {job['id']} failed")
+
+    def dependency_result(self, job: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        return self.result(job["depends_on"]) if job.get("depends_on") else None
+
+    # --- workers ---
+    def start(self, workers: int = 1, poll_s: float = 1.0) -> None:
+        self._stop.clear()
+        for i in range(max(0, workers)):
+            t = threading.Thread(target=self._loop, args=(poll_s,), name=f"jobs-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def _loop(self, poll_s: float) -> None:
+        while not self._stop.is_set():
+            if self.run_once() is None:
+                self._wake.wait(poll_s)
+                self._wake.clear()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self._stop.set()
+        self._wake.set()
+        for t in self._threads:
+            t.join(timeout)
+        self._threads = []
+
+    def close(self) -> None:
+        self.stop()
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,185 @@
+from __future__ import annotations
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Sequence
+import hashlib, json, threading, time, uuid
+import numpy as np
+
+_DIFFICULTIES = ("easy", "medium", "hard")
+UNANSWERED = -1
+
+
+def quiz_id_for(mcq: Dict[str, Any]) -> str:
+    """Content hash of the whole items (the cached key also serves rationale, citations, difficulty),
+    so the same quiz always gets the same id and an edited one a new id."""
+    items = mcq.get("items") or []
+    return hashlib.sha256(json.dumps(items, ensure_ascii=False, sort_keys=True, default=str).encode("utf-8")).hexdigest()[:16]
+
+
+class InvalidIndex(ValueError):
+    """An answer_index or a chosen option outside the item's options."""
+
+
+class AnswerKey:
+    """An MCQ payload compiled once for grading: answers and difficulty codes as arrays."""
+
+    def __init__(self, mcq: Dict[str, Any]):
+        items = [it for it in (mcq.get("items") or []) if isinstance(it, dict)]
+        self.id = quiz_id_for(mcq)
+        self.items = items
+        self.ids: List[str] = [str(it.get("id") or f"q{i}") for i, it in enumerate(items)]
+        self.pos = {cid: i for i, cid in enumerate(self.ids)}
+        self.n_options = [len(it.get("options") or []) for it in items]
+        for cid, it, n in zip(self.ids, items, self.n_options):
+            a = it.get("answer_index")
+            if isinstance(a, int) and not 0 <= a < n:
+                raise InvalidIndex(f"{cid}: answer_index {a} outside its {n} options")
+        self.answers = np.array([it.get("answer_index") if isinstance(it.get("answer_index"), int) else -2
+                                 for it in items], dtype=np.int16)
+        difficulty = [_DIFFICULTIES.index(it["difficulty"]) if it.get("difficulty") in _DIFFICULTIES else 1 for it in items]
+        # (items × 3) one-hot: per-difficulty counts of any boolean matrix are one matmul
+        self.difficulty = np.eye(3, dtype=np.int32)[np.array(difficulty, dtype=np.int64)].reshape(len(items), 3)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def matrix(self, attempts: Sequence[Any]) -> np.ndarray:
+        """(attempts × items) chosen option indexes; UNANSWERED where missing.
+
+        An attempt is a list of indexes in quiz order or a {item_id: index} mapping,
+        optionally wrapped as {"answers": ...}. Raises InvalidIndex for an index
+        outside the item's options.
+        """
+        m = np.full((len(attempts), len(self.ids)), UNANSWERED, dtype=np.int16)
+        for r, att in enumerate(attempts):
+            ans = att["answers"] if isinstance(att, dict) and "answers" in att else att
+            if isinstance(ans, dict):
+                pairs = [(self.pos.get(str(cid)), v) for cid, v in ans.items()]
+            elif isinstance(ans, (list, tuple)):
+                pairs = list(enumerate(ans[:len(self.ids)]))
+            else:
+                continue
+            for c, v in pairs:
+                if c is None or not isinstance(v, int):
+                    continue
+                if not 0 <= v < self.n_options[c]:
+                    raise InvalidIndex(f"{self.ids[c]}: answer {v} outside its {self.n_options[c]} options")
+                m[r, c] = v
+        return m
+
+
+def grade(key: AnswerKey, attempts: Sequence[Any], details: bool = True) -> Dict[str, Any]:
+    """Grade every attempt at once: correctness, scores and per-item success rates are array operations."""
+    chosen = key.matrix(attempts)
+    correct = chosen == key.answers                      # (attempts × items) bool
+    answered = chosen != UNANSWERED
+    n = max(1, len(key))
+    n_correct = correct.sum(axis=1)
+    by_diff = key.difficulty.sum(axis=0)                # items per difficulty
+    diff_correct = correct.astype(np.int32) @ key.difficulty  # (attempts × 3)
+    results = []
+    for r in range(len(attempts)):
+        res: Dict[str, Any] = {
+            "score": round(float(n_correct[r]) / n, 4), "correct": int(n_correct[r]), "total": len(key),
+            "answered": int(answered[r].sum()),
+            "by_difficulty": {name: {"correct": int(diff_correct[r, d]), "total": int(by_diff[d])}
+                              for d, name in enumerate(_DIFFICULTIES) if by_diff[d]},
+        }
+        if details:
+            # Same per-item fields as the grade-mcq prompt, from the stored rationale/citations
+            res["items"] = [{
+                "id": key.ids[c], "status": "ok", "correct": bool(correct[r, c]),
+                "user_answer_index": (int(chosen[r, c]) if answered[r, c] else None),
+                "answer_index": int(key.answers[c]),
+                "explanation_short": key.items[c].get("rationale") or "",
+                "next_hint": "" if correct[r, c] else (key.items[c].get("distractors_rationale") or ""),
+                "citations": list(key.items[c].get("citations") or []),
+            } for c in range(len(key))]
+        results.append(res)
+    p_correct = correct.mean(axis=0) if len(attempts) else np.zeros(len(key))
+    return {"status": "ok", "quiz_id": key.id, "attempts": results,
+            "item_stats": [{"id": key.ids[c], "p_correct": round(float(p_correct[c]), 4)} for c in range(len(key))]}
+
+
+class KeyCache:
+    """Compiled answer keys by quiz_id, so a quiz can be graded again without resending it."""
+
+    def __init__(self, maxsize: int = 256):
+        self.maxsize = maxsize
+        self._keys: "OrderedDict[str, AnswerKey]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, quiz_id: str) -> Optional[AnswerKey]:
+        with self._lock:
+            key = self._keys.get(quiz_id)
+            if key is not None:
+                self._keys.move_to_end(quiz_id)
+            return key
+
+    def compile(self, mcq: Dict[str, Any]) -> AnswerKey:
+        key = self.get(quiz_id_for(mcq))
+        if key is None:
+            key = AnswerKey(mcq)
+            with self._lock:
+                self._keys[key.id] = key
+                while len(self._keys) > self.maxsize:
+                    self._keys.popitem(last=False)
+        return key
+
+
+class HintJobs:
+    """Personalised hints for wrong answers, generated in the background.
+
+    `generate(prompt) -> str` is called once per wrong item on a single worker
+    thread; grading never waits for it. Results are polled by job id.
+    """
+
+    def __init__(self, generate: Callable[[str], str], maxlen: int = 200):
+        self.generate = generate
+        self.maxlen = maxlen
+        self._jobs: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="mcq-hints")
+
+    def submit(self, key: AnswerKey, graded: Dict[str, Any]) -> Optional[str]:
+        wrong = [it for it in graded.get("items") or [] if not it["correct"]]
+        if not wrong:
+            return None
+        jid = uuid.uuid4().hex[:12]
+        with self._lock:
+            self._jobs[jid] = {"status": "pending", "hints": {}, "created": time.time()}
+            while len(self._jobs) > self.maxlen:
+                self._jobs.popitem(last=False)
+        self._executor.submit(self._run, jid, key, wrong)
+        return jid
+
+    def get(self, jid: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            job = self._jobs.get(jid)
+            return {"job_id": jid, **job, "hints": dict(job["hints"])} if job is not None else None
+
+    def _run(self, jid: str, key: AnswerKey, wrong: List[Dict[str, Any]]) -> None:
+        job = self._jobs.get(jid)
+        if job is None:
+            return
+        try:
+            for it in wrong:
+                item = key.items[key.pos[it["id"]]]
+                opts = item.get("options") or []
+                ua = it.get("user_answer_index")
+                prompt = (
+                    "Tu es Professeur Nour. Donne un indice court (1 phrase, en français) pour aider l'étudiant "
+                    "à trouver la bonne réponse sans la révéler.\n"
+                    f"Question : {item.get('question') or ''}\n"
+                    f"Choix de l'étudiant : {opts[ua] if ua is not None and ua < len(opts) else '(aucun)'}\n"
+                    f"Explication du cours : {item.get('rationale') or ''}\nIndice :"
+                )
+                hint = (self.generate(prompt) or "").strip()
+                with self._lock:
+                    job["hints"][it["id"]] = hint
+            job["status"] = "done"
+        except Exception as e:
+            job["status"], job["error"] = "error", str(e)
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=False)
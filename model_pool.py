@@ -0,0 +1,326 @@
+from __future__ import annotations
+from collections import deque
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional
+import os, time, threading, itertools
+import multiprocessing as mp
+from multiprocessing.connection import wait as _wait_conns
+
+# Generation params that must not reach the worker's model call (the pool owns streaming
+# and each pinned worker owns its thread count)
+_DROP_PARAMS = {"stream", "threads"}
+
+
+def _load_ctransformers(spec: Dict[str, Any], threads: int) -> Any:
+    """Default worker loader: one ctransformers model, weights shared through mmap."""
+    from ctransformers import AutoModelForCausalLM
+    cfg = {"threads": threads, "mmap": True, **(spec.get("config") or {})}
+    return AutoModelForCausalLM.from_pretrained(
+        spec["path"], model_file=spec.get("file"), model_type=spec.get("model_type") or "llama", **cfg
+    )
+
+
+def _worker_main(idx: int, specs: Dict[str, Dict[str, Any]], threads: int, cores: List[int],
+                 loader: Callable[[Dict[str, Any], int], Any], conn: Any) -> None:
+    # Pin before loading so ggml's thread pool starts on the assigned cores
+    if cores and hasattr(os, "sched_setaffinity"):
+        try:
+            os.sched_setaffinity(0, cores)
+        except OSError:
+            pass
+    models: Dict[str, Any] = {}
+    for name, spec in specs.items():
+        try:
+            models[name] = loader(spec, threads)
+        except Exception as e:
+            conn.send(("log", None, f"{name}: {e}"))
+    conn.send(("ready", None, sorted(models)))
+    backlog: deque = deque()  # requests received while a generation was running
+    cancelled: set = set()
+    while True:
+        if backlog:
+            msg = backlog.popleft()
+        else:
+            try:
+                msg = conn.recv()
+            except EOFError:
+                break
+        if msg is None:
+            break
+        rid, kind, name, prompt, params = msg
+        if kind == "ping":
+            conn.send(("pong", rid, None))
+            continue
+        if kind == "cancel":
+            cancelled.add(rid)
+            continue
+        if rid in cancelled:
+            cancelled.discard(rid)
+            conn.send(("done", rid, ("", {"completion_tokens": 0, "ms": 0, "stopped": "cancelled"})))
+            continue
+        t0 = time.perf_counter()
+        params = dict(params)
+        budget_s = params.pop("deadline_s", None)
+        deadline = t0 + budget_s if budget_s is not None else None
+        stopped = None
+        try:
+            model = models.get(name) if name else None
+            if model is None:
+                if name or not models:
+                    raise RuntimeError(f"model not loaded in worker: {name}")
+                model = next(iter(models.values()))
+            parts = []
+            for tok in model(prompt, stream=True, **params):
+                # Cancellation and deadline are checked at every token
+                while conn.poll():
+                    m = conn.recv()
+                    if m is not None and m[1] == "cancel":
+                        cancelled.add(m[0])
+                    else:
+                        backlog.append(m)
+                if rid in cancelled:
+                    cancelled.discard(rid)
+                    stopped = "cancelled"
+                elif deadline is not None and time.perf_counter() >= deadline:
+                    stopped = "timeout"
+                if stopped:
+                    break
+                parts.append(tok)
+            ms = int((time.perf_counter() - t0) * 1000)
+            usage: Dict[str, Any] = {"completion_tokens": len(parts), "ms": ms}
+            if stopped:
+                usage["stopped"] = stopped
+            conn.send(("done", rid, ("".join(parts), usage)))
+        except Exception as e:
+            conn.send(("error", rid, str(e)))
+        # Requests run in arrival order: a cancel for an earlier id came too late to matter
+        cancelled = {r for r in cancelled if r > rid}
+
+
+class _Worker:
+    def __init__(self, idx: int, cores: List[int], threads: int):
+        self.idx, self.cores, self.threads = idx, cores, threads
+        self.proc: Any = None
+        self.conn: Any = None
+        self.send_lock = threading.Lock()
+        self.ready = False
+        self.models: List[str] = []
+        self.pending = 0
+        self.served = 0
+        self.restarts = 0
+        self.ping_sent: Optional[float] = None
+        self.last_error: Optional[str] = None
+
+
+class ModelPool:
+    """Front-side router for N model-worker processes.
+
+    Each worker is pinned to its own slice of cores and loads every spec once;
+    requests go to the ready worker with the fewest in-flight generations.
+    A monitor thread restarts workers that die or stop answering pings.
+    """
+
+    def __init__(self, specs: Dict[str, Dict[str, Any]], workers: int = 2, threads: Optional[int] = None,
+                 loader: Callable[[Dict[str, Any], int], Any] = _load_ctransformers,
+                 start_method: str = "spawn", health_interval: float = 5.0, health_timeout: float = 10.0):
+        self.specs = specs
+        self.loader = loader
+        self.health_interval, self.health_timeout = health_interval, health_timeout
+        self._ctx = mp.get_context(start_method)
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._futures: Dict[int, tuple] = {}
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+        if hasattr(os, "sched_getaffinity"):
+            cpus = sorted(os.sched_getaffinity(0))
+        else:
+            cpus = list(range(os.cpu_count() or 1))
+        n = max(1, int(workers))
+        slices = [cpus[i::n] for i in range(n)] if len(cpus) >= n else [cpus for _ in range(n)]
+        self.workers = [_Worker(i, sl, int(threads or max(1, len(sl)))) for i, sl in enumerate(slices)]
+
+    # --- lifecycle ---
+    def start(self) -> "ModelPool":
+        for w in self.workers:
+            self._spawn(w)
+        for target in (self._collect, self._monitor):
+            t = threading.Thread(target=target, daemon=True)
+            t.start()
+            self._threads.append(t)
+        return self
+
+    def wait_ready(self, timeout: float = 120.0) -> bool:
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            if all(w.ready for w in self.workers):
+                return True
+            time.sleep(0.05)
+        return any(w.ready for w in self.workers)
+
+    def close(self) -> None:
+        self._stop.set()
+        for w in self.workers:
+            try:
+                self._send(w, None)
+            except Exception:
+                pass
+        for w in self.workers:
+            if w.proc is not None:
+                w.proc.join(timeout=5)
+                if w.proc.is_alive():
+                    w.proc.terminate()
+        self._fail_pending(None, "pool closed")
+
+    def _spawn(self, w: _Worker) -> None:
+        # One pipe per worker: a crashed worker cannot leave a shared queue lock held
+        if w.conn is not None:
+            w.conn.close()
+        w.conn, child = self._ctx.Pipe()
+        w.ready, w.models, w.pending, w.ping_sent = False, [], 0, None
+        w.proc = self._ctx.Process(
+            target=_worker_main,
+            args=(w.idx, self.specs, w.threads, w.cores, self.loader, child),
+            daemon=True,
+        )
+        w.proc.start()
+        child.close()
+
+    def _send(self, w: _Worker, msg: Any) -> None:
+        with w.send_lock:
+            w.conn.send(msg)
+
+    # --- routing ---
+    def submit(self, prompt: str, model: Optional[str] = None, **params) -> Future:
+        fut: Future = Future()
+        params = {k: v for k, v in params.items() if k not in _DROP_PARAMS}
+        with self._lock:
+            cands = [w for w in self.workers if w.ready and (model is None or model in w.models)]
+            if not cands:
+                fut.set_exception(RuntimeError("no ready model worker"))
+                return fut
+            w = min(cands, key=lambda x: (x.pending, x.served))
+            rid = next(self._ids)
+            self._futures[rid] = (w.idx, fut)
+            w.pending += 1
+        try:
+            self._send(w, (rid, "gen", model, prompt, params))
+        except (OSError, ValueError):
+            # Worker died between routing and send; the monitor restarts it
+            self._fail_pending(None, f"model worker {w.idx} unavailable", rids=[rid])
+        return fut
+
+    def cancel(self, fut: Future) -> bool:
+        """Stop a pending generation at its next token; its future resolves with the partial text."""
+        with self._lock:
+            found = next(((rid, idx) for rid, (idx, f) in self._futures.items() if f is fut), None)
+        if found is None:
+            return False
+        rid, idx = found
+        try:
+            self._send(self.workers[idx], (rid, "cancel", None, "", {}))
+        except (OSError, ValueError):
+            return False
+        return True
+
+    def generate(self, prompt: str, model: Optional[str] = None, timeout: Optional[float] = None, **params) -> str:
+        return self.submit(prompt, model=model, **params).result(timeout=timeout)[0]
+
+    def available(self) -> List[str]:
+        names = set()
+        for w in self.workers:
+            if w.ready:
+                names.update(w.models)
+        return sorted(names)
+
+    def stats(self) -> List[Dict[str, Any]]:
+        return [{
+            "worker": w.idx, "pid": (w.proc.pid if w.proc is not None else None),
+            "alive": bool(w.proc is not None and w.proc.is_alive()), "ready": w.ready,
+            "models": w.models, "cores": w.cores, "threads": w.threads, "pending": w.pending,
+            "served": w.served, "restarts": w.restarts, "last_error": w.last_error,
+        } for w in self.workers]
+
+    # --- background threads ---
+    def _collect(self) -> None:
+        while not self._stop.is_set():
+            by_conn = {w.conn: w for w in self.workers if w.conn is not None and not w.conn.closed}
+            for conn in _wait_conns(list(by_conn), timeout=0.5):
+                w = by_conn[conn]
+                try:
+                    kind, rid, payload = conn.recv()
+                except (EOFError, OSError):
+                    # Worker exited: stop polling its pipe until the monitor respawns it
+                    w.ready = False
+                    if w.conn is conn:
+                        conn.close()
+                    continue
+                self._handle(w, kind, rid, payload)
+
+    def _handle(self, w: _Worker, kind: str, rid: Any, payload: Any) -> None:
+        if kind == "ready":
+            w.models, w.ready = list(payload), True
+        elif kind == "log":
+            w.last_error = payload
+        elif kind == "pong":
+            w.ping_sent = None
+        elif kind in ("done", "error"):
+            with self._lock:
+                entry = self._futures.pop(rid, None)
+                if entry is not None:
+                    w.pending = max(0, w.pending - 1)
+                    w.served += 1
+            if entry is None:
+                return
+            if kind == "done":
+                entry[1].set_result(payload)
+            else:
+                entry[1].set_exception(RuntimeError(payload))
+
+    def _monitor(self) -> None:
+        while not self._stop.wait(self.health_interval):
+            for w in self.workers:
+                if w.proc is None:
+                    continue
+                hung = w.ping_sent is not None and (time.time() - w.ping_sent) > self.health_timeout
+                if w.proc.is_alive() and not hung:
+                    # Only idle workers can answer a ping; a busy one is healthy by definition
+                    if w.ready and w.pending == 0 and w.ping_sent is None:
+                        w.ping_sent = time.time()
+                        try:
+                            self._send(w, (0, "ping", None, "", {}))
+                        except (OSError, ValueError):
+                            pass
+                    continue
+                if w.proc.is_alive():
+                    w.proc.terminate()
+                    w.proc.join(timeout=5)
+                self._fail_pending(w.idx, f"model worker {w.idx} crashed (exit={w.proc.exitcode})")
+                w.restarts += 1
+                w.last_error = "restarted"
+                self._spawn(w)
+
+    def _fail_pending(self, idx: Optional[int], reason: str, rids: Optional[List[int]] = None) -> None:
+        with self._lock:
+            if rids is None:
+                rids = [rid for rid, (i, _f) in self._futures.items() if idx is None or i == idx]
+            failed = [self._futures.pop(rid)[1] for rid in rids if rid in self._futures]
+        for fut in failed:
+            if not fut.done():
+                fut.set_exception(RuntimeError(reason))
+
+
+class PooledModel:
+    """Callable stand-in for an in-process model, backed by a ModelPool."""
+
+    def __init__(self, pool: ModelPool, name: str):
+        self.pool, self.name = pool, name
+
+    def submit(self, prompt: str, **params) -> Future:
+        return self.pool.submit(prompt, model=self.name, **params)
+
+    def cancel(self, fut: Future) -> bool:
+        return self.pool.cancel(fut)
+
+    def __call__(self, prompt: str, **params) -> str:
+        return self.submit(prompt, **params).result()[0]
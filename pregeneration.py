@@ -0,0 +1,71 @@
+from __future__ import annotations
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+import os, re, json
+
+PROMPTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "prompts")
+_PROMPT_CACHE: Dict[str, str] = {}
+
+Section = Tuple[str, List[Dict[str, str]]]
+
+
+def prompt_template(name: str) -> str:
+    """prompts/<name>.md with its partials ({{> _system_common }}) inlined; read once."""
+    tpl = _PROMPT_CACHE.get(name)
+    if tpl is None:
+        with open(os.path.join(PROMPTS_DIR, f"{name}.md"), "r", encoding="utf-8") as f:
+            tpl = f.read()
+        tpl = _PROMPT_CACHE[name] = re.sub(r"\{\{>\s*([\w-]+)\s*\}\}", lambda m: prompt_template(m.group(1)).strip(), tpl)
+    return tpl
+
+
+def render_prompt(name: str, **values: Any) -> str:
+    return re.sub(r"\{\{(\w+)\}\}", lambda m: str(values.get(m.group(1), m.group(0))), prompt_template(name))
+
+
+def first_json(text: str, field: str) -> Optional[Dict[str, Any]]:
+    """First JSON object of a model output with a top-level `field` (outputs often go on after it)."""
+    start = text.find("{")
+    while start != -1:
+        try:
+            obj, _end = json.JSONDecoder().raw_decode(text, start)
+            if isinstance(obj, dict) and field in obj:
+                return obj
+        except ValueError:
+            pass
+        start = text.find("{", start + 1)
+    return None
+
+
+def course_sections(chunks: Sequence[Dict[str, Any]], max_words: int = 1200) -> List[Section]:
+    """Consecutive chunks grouped by heading, split further past `max_words` words."""
+    sections: List[Section] = []
+    words = 0
+    for c in chunks:
+        n = len(c["text"].split())
+        if not sections or sections[-1][0] != c.get("section", "") or words + n > max_words:
+            sections.append((c.get("section", ""), []))
+            words = 0
+        sections[-1][1].append({"id": c["id"], "text": c["text"]})
+        words += n
+    return sections
+
+
+# --- the three generation steps of a section: extract → sheets, and MCQs ---
+def extract_prompt(passages: List[Dict[str, str]], topic: str = "") -> str:
+    return render_prompt("extract-concepts", retrieved_passages_json=json.dumps(passages, ensure_ascii=False),
+                         topic_or_empty=topic)
+
+
+def mcq_prompt(passages: List[Dict[str, str]], n: int) -> str:
+    return render_prompt("make-mcq", n=n, retrieved_passages_json=json.dumps(passages, ensure_ascii=False))
+
+
+def sheet_prompt(themes: List[Dict[str, Any]]) -> str:
+    return render_prompt("make-sheets", themes_json_from_extract_concepts=json.dumps(themes, ensure_ascii=False))
+
+
+def sheet_cards(sheets: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """make-sheets output → the SheetCard shape served by /sheets/<id> (title, summary, full)."""
+    return [{"title": s.get("title") or "",
+             "summary": "\n".join(f"• {b}" for b in (s.get("short_version") or {}).get("content") or []),
+             "full": (s.get("long_version") or {}).get("content") or None} for s in sheets]
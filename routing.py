@@ -0,0 +1,176 @@
+from __future__ import annotations
+from collections import deque
+from typing import Any, Deque, Dict, Iterable, List, Optional, Tuple
+import os, json, re, time, threading
+
+# Tasks whose output must be structured (JSON schemas, validators) go to the stronger model
+_STRUCTURED_RE = re.compile(r"mcq|qcm|sheet|fiche|json|extract|concept|srs|plan|grade")
+# Question openings that call for a short factual answer
+_FACTUAL_RE = re.compile(r"^\s*(qu['’]est[- ]ce|c['’]est quoi|que signifie|définis|defini|donne la définition|quel(le)?s? (est|sont)|qui (est|a)|quand|où)\b", re.I)
+
+DEFAULTS: Dict[str, Any] = {
+    # Off: the strongest loaded model is used, as before the router existed
+    "enabled": False,
+    # Higher = stronger; unknown names rank 0
+    "strength": {"qwen2": 2, "tinyllama": 1, "ctransformers": 2, "hf": 1},
+    "short_question_words": 25,
+    "min_success": 0.6,
+    "expected_completion_tokens": 128,
+    "ewma_alpha": 0.2,
+    "window": 50,
+    # Decisions are written in batches; the log is rotated to `<name>.1` past this size
+    "log_flush_every": 32,
+    "log_max_bytes": 5_000_000,
+}
+
+
+def task_class(task: str, out_format: str = "text", question: str = "",
+               max_words: int = DEFAULTS["short_question_words"]) -> str:
+    t = f"{task or ''} {out_format or ''}".lower()
+    if _STRUCTURED_RE.search(t):
+        return "structured"
+    words = len((question or "").split())
+    if words and words <= max_words and _FACTUAL_RE.match(question or ""):
+        return "short_chat"
+    return "chat"
+
+
+class _Stats:
+    __slots__ = ("ms_per_tok", "n", "results")
+
+    def __init__(self, window: int):
+        self.ms_per_tok: Optional[float] = None
+        self.n = 0
+        self.results: Deque[bool] = deque(maxlen=window)
+
+    def success(self) -> float:
+        return (sum(self.results) / len(self.results)) if self.results else 1.0
+
+
+class ModelRouter:
+    """Chooses a model/provider per request from task type, prompt size and observed latency.
+
+    Latency is learnt as an EWMA of milliseconds per (prompt + completion) token per
+    model, so a prediction scales with the prompt. Short factual questions go to the
+    fastest adequate model; structured tasks and open chat go to the strongest model
+    that is expected to meet the request's SLO. Decisions are appended to a JSONL log
+    in batches, rotated past `log_max_bytes`. Disabled (the default), it always
+    prefers the strongest model and logs nothing.
+    """
+
+    def __init__(self, log_path: Optional[str] = None, **cfg: Any):
+        self.cfg = {**DEFAULTS, **{k: v for k, v in cfg.items() if v is not None}}
+        self.enabled = bool(self.cfg["enabled"])
+        self.log_path = log_path
+        self._stats: Dict[str, _Stats] = {}
+        self._lock = threading.Lock()
+        self._pending: List[str] = []
+        self._log_lock = threading.Lock()
+
+    # --- learning ---
+    def observe(self, name: str, ok: bool, ms: float, prompt_tokens: int = 0, completion_tokens: int = 0) -> None:
+        if not name or name == "none":
+            return
+        with self._lock:
+            st = self._stats.setdefault(name, _Stats(int(self.cfg["window"])))
+            st.results.append(bool(ok))
+            if ok and ms > 0:
+                per_tok = ms / max(1, prompt_tokens + completion_tokens)
+                a = float(self.cfg["ewma_alpha"])
+                st.ms_per_tok = per_tok if st.ms_per_tok is None else (a * per_tok + (1 - a) * st.ms_per_tok)
+                st.n += 1
+
+    def load_history(self, runs_path: str, max_lines: int = 2000) -> int:
+        """Replay the tail of runs.jsonl (records carry `model` for /api/chat, `provider` for /llm/run)."""
+        if not os.path.exists(runs_path):
+            return 0
+        with open(runs_path, "r", encoding="utf-8") as f:
+            lines = deque(f, maxlen=max_lines)
+        n = 0
+        for line in lines:
+            try:
+                rec = json.loads(line)
+            except ValueError:
+                continue
+            name = rec.get("model") or rec.get("provider")
+            if not name or name == "none" or rec.get("stopped") or rec.get("coalesced"):
+                # Cut-short generations, and requests served by another one's generation: not latency samples
+                continue
+            self.observe(name, bool(rec.get("ok")), float(rec.get("ms") or 0),
+                         int(rec.get("usage_prompt_tokens") or 0), int(rec.get("usage_completion_tokens") or 0))
+            n += 1
+        return n
+
+    # --- deciding ---
+    def predict_ms(self, name: str, prompt_tokens: int) -> Optional[float]:
+        st = self._stats.get(name)
+        if st is None or st.ms_per_tok is None:
+            return None
+        return st.ms_per_tok * (prompt_tokens + int(self.cfg["expected_completion_tokens"]))
+
+    def choose(self, available: Iterable[str], task: str = "chat", out_format: str = "text", question: str = "",
+               prompt_tokens: int = 0, slo_ms: Optional[float] = None) -> Tuple[List[str], Dict[str, Any]]:
+        """Return (candidates in preference order, decision record)."""
+        strength = self.cfg["strength"]
+        names = list(available)
+        if not self.enabled:
+            order = sorted(names, key=lambda n: -strength.get(n, 0))
+            return order, {"chosen": (order[0] if order else None), "reason": "static"}
+        cls = task_class(task, out_format, question, int(self.cfg["short_question_words"]))
+        cand = {n: {"strength": strength.get(n, 0), "pred_ms": self.predict_ms(n, prompt_tokens),
+                    "success": round(self._stats[n].success(), 3) if n in self._stats else None} for n in names}
+        adequate = [n for n in names if (cand[n]["success"] is None or cand[n]["success"] >= self.cfg["min_success"])] or names
+
+        def fits(n: str) -> bool:
+            p = cand[n]["pred_ms"]
+            return slo_ms is None or p is None or p <= slo_ms
+
+        def speed_key(n: str) -> Tuple[float, int]:
+            # Unknown latency: assume weaker models are faster
+            p = cand[n]["pred_ms"]
+            return (p if p is not None else float(cand[n]["strength"]) * 1e9, cand[n]["strength"])
+
+        if cls == "short_chat":
+            first = sorted(adequate, key=speed_key)
+            reason = "fastest_adequate"
+        else:
+            within = [n for n in adequate if fits(n)]
+            if within:
+                first = sorted(within, key=lambda n: (-cand[n]["strength"], speed_key(n)))
+                reason = "strongest_within_slo" if slo_ms is not None else "strongest"
+            else:
+                first = sorted(adequate, key=speed_key)
+                reason = "slo_unreachable_fastest"
+        order = first + [n for n in sorted(names, key=lambda n: -cand[n]["strength"]) if n not in first]
+        decision = {"at": round(time.time(), 3), "task": task, "class": cls, "prompt_tokens": prompt_tokens,
+                    "slo_ms": slo_ms, "chosen": (order[0] if order else None), "reason": reason, "candidates": cand}
+        self._log(decision)
+        return order, decision
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {n: {"ms_per_tok": (round(s.ms_per_tok, 3) if s.ms_per_tok is not None else None), "n": s.n,
+                    "success": round(s.success(), 3)} for n, s in self._stats.items()}
+
+    def _log(self, decision: Dict[str, Any]) -> None:
+        if not self.log_path:
+            return
+        with self._log_lock:
+            self._pending.append(json.dumps(decision, ensure_ascii=False) + "\n")
+            full = len(self._pending) >= int(self.cfg["log_flush_every"])
+        if full:
+            self.flush()
+
+    def flush(self) -> None:
+        """Write the buffered decisions, rotating the log first when it has grown past `log_max_bytes`."""
+        with self._log_lock:
+            lines, self._pending = self._pending, []
+            if not lines or not self.log_path:
+                return
+            try:
+                os.makedirs(os.path.dirname(self.log_path), exist_ok=True)
+                if os.path.exists(self.log_path) and os.path.getsize(self.log_path) >= int(self.cfg["log_max_bytes"]):
+                    os.replace(self.log_path, self.log_path + ".1")
+                with open(self.log_path, "a", encoding="utf-8") as f:
+                    f.writelines(lines)
+            except OSError:
+                pass
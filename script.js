@@ -1,3 +1,52 @@
+/* ============================================================
+    Course & chat sessions — Professeur Nour
+    Le texte du cours est envoyé une fois (POST /courses) et les appels
+    suivants ne transmettent que son course_id (hash du contenu).
+    L'id de session permet au serveur de borner l'historique du chat.
+    ============================================================ */
+(function(){
+   const ids = new Map(); // `${base}|${text}` -> Promise<course_id|null>
+   window.nourSessionId = function(){
+      let id = sessionStorage.getItem('nour-session');
+      if (!id){
+         id = (crypto.randomUUID ? crypto.randomUUID() : `${Date.now()}-${Math.random().toString(16).slice(2)}`);
+         sessionStorage.setItem('nour-session', id);
+      }
+      return id;
+   };
+   // Page servie par l'API (http) → même origine ; ouverte en file:// → serveur local
+   window.nourApiBase = function(){
+      return location.protocol.startsWith('http') ? location.origin : 'http://localhost:8000';
+   };
+   // GET /api/discovery, partagé quelques secondes entre tous les appelants (healthCheck, internalReady…)
+   const discoveries = new Map(); // base -> { at, promise }
+   window.nourDiscover = function(base){
+      base = base || window.nourApiBase();
+      const hit = discoveries.get(base);
+      if (hit && Date.now() - hit.at < 5000) return hit.promise;
+      const ctl = new AbortController(); const timer = setTimeout(()=>ctl.abort(), 3000);
+      const promise = fetch(`${base}/api/discovery`, { signal: ctl.signal })
+         .then(r => r.ok ? r.json() : null)
+         .catch(() => null)
+         .finally(() => clearTimeout(timer));
+      discoveries.set(base, { at: Date.now(), promise });
+      return promise;
+   };
+   window.nourEnsureCourse = function(base, text){
+      const key = `${base}|${text}`;
+      if (!ids.has(key)){
+         if (ids.size > 8) ids.delete(ids.keys().next().value);
+         const p = fetch(`${base}/courses`, { method:'POST', headers:{'Content-Type':'application/json'}, body: JSON.stringify({ text }) })
+            .then(r => r.ok ? r.json() : null)
+            .then(j => (j && j.course_id) || null)
+            .catch(() => null)
+            .then(id => { if (!id) ids.delete(key); return id; });
+         ids.set(key, p);
+      }
+      return ids.get(key);
+   };
+})();
+
 /* ============================================================
     ProviderManager + Chat fix — Professeur Nour
     Pourquoi : #aiProvider et #apiKey doivent vraiment piloter le chat.
@@ -54,11 +103,9 @@
    }
 
    async function getHealth(){
-      const tries = [`${API_BASE}/health`, `${API_BASE}/api/health`, `${API_BASE}/v1/health`];
-      for (const u of tries){
-         try { const j = await fetchJSON(u, {}, 3000); if (j && (j.status==='ok' || j.ok===true)) return j; } catch {}
-      }
-      return null;
+      // Un seul appel de découverte (état du LLM + routes) au lieu de sonder plusieurs URLs
+      const j = await window.nourDiscover(API_BASE);
+      return (j && j.status==='ok') ? j : null;
    }
    async function healthCheck(){
       const j = await getHealth();
@@ -75,13 +122,17 @@
          name:'IA Interne',
          async chat({messages, context}) {
             // Appel strict à l’API interne; tente plusieurs URLs locales
-            const prompt = messages.map(m=>`${m.role}: ${m.content}`).join('\n');
-            const payload = { prompt, provider: 'internal' };
-            if (context && context.trim()) payload.context = context.slice(0, 8000);
+            // Historique borné côté serveur : on envoie les messages + l'id de session
+            const payload = { messages, session_id: window.nourSessionId(), provider: 'internal' };
+            if (context && context.trim()){
+               // Cours envoyé une seule fois au serveur, puis référencé par son id
+               const courseId = await window.nourEnsureCourse(API_BASE, context);
+               if (courseId) payload.course_id = courseId; else payload.context = context.slice(0, 8000);
+            }
             const urls = [
+              `${API_BASE}/api/chat`,
               'http://127.0.0.1:8000/api/chat',
-              'http://localhost:8000/api/chat',
-              `${API_BASE}/api/chat`
+              'http://localhost:8000/api/chat'
             ];
             for (const url of urls){
                try{
@@ -150,11 +201,14 @@
       const provider = Providers[providerKey] || Providers.internal;
 
       // construction de messages standard
+      // IA interne : le cours complet est envoyé une fois (course_id), jamais recopié dans les messages
+      const internal = provider === Providers.internal;
       let messages = [];
-      const context = (passages && passages.length) ? passages.map(p=>p.text||'').join('\n---\n').slice(0,8000) : '';
+      const full = (passages && passages.length) ? passages.map(p=>p.text||'').join('\n---\n') : '';
+      let context = internal ? full : full.slice(0,8000);
       if (task === 'grounded-chat') {
          messages = [{role:'system', content:'Tu es Professeur Nour, pédagogue, concis et bienveillant. Réponds en français.'}];
-         if (context) messages.push({role:'system', content:`Passages: ${context}`});
+         if (context && !internal) messages.push({role:'system', content:`Passages: ${context}`});
          messages.push({role:'user', content: question || prompt});
       } else if (task === 'sheets-3views') {
          const txt = sections.map(s=>`# ${s.title}\n${(s.body||'').slice(0,1200)}`).join('\n\n');
@@ -163,10 +217,11 @@
             {role:'user', content: txt }
          ];
       } else if (task === 'make-mcq') {
-         const ctx = (passages?.map(p=>p.text).join('\n') || ($('#textInput')?.value||'')).slice(0,3500);
+         const ctx = passages?.map(p=>p.text).join('\n') || ($('#textInput')?.value||'');
+         if (internal) context = ctx;
          messages = [
             {role:'system', content:'Génère des QCM FR : 1 seule bonne réponse, 3 distracteurs plausibles, justification brève. Retourne une liste.'},
-            {role:'user', content:`Contexte:\n${ctx}\n\nSujets:${(topics||[]).join(', ')}\nNombre:${count}`}
+            {role:'user', content:`${internal ? '' : `Contexte:\n${ctx.slice(0,3500)}\n\n`}Sujets:${(topics||[]).join(', ')}\nNombre:${count}`}
          ];
       } else {
          messages = [{role:'user', content: prompt || question }];
@@ -272,7 +327,7 @@
       async function query(){
          const q = input.value.trim(); if (!q) return;
          add('user', q); input.value='';
-         const res = await __llm_generate({ task:'grounded-chat', question:q, passages: [{text: ($('#textInput')?.value||'').slice(0,3000)}] });
+         const res = await __llm_generate({ task:'grounded-chat', question:q, passages: [{text: $('#textInput')?.value||''}] });
    const msg = res.answer && String(res.answer).trim() ? res.answer : 'Aucune réponse du fournisseur sélectionné. Vérifiez l’indicateur d’état ou validez votre clé API.';
       add('assistant', msg);
       }
@@ -614,7 +669,7 @@ document.addEventListener('DOMContentLoaded', () => {
       async function query(){
          const q = input.value.trim(); if (!q) return;
          add('user', q); input.value='';
-         const res = await __llm_generate({ task:'grounded-chat', question:q, passages: [{text: ($('#textInput')?.value||'').slice(0,3000)}] });
+         const res = await __llm_generate({ task:'grounded-chat', question:q, passages: [{text: $('#textInput')?.value||''}] });
    const msg = res.answer && String(res.answer).trim() ? res.answer : 'Aucune réponse du fournisseur sélectionné. Vérifiez l’indicateur d’état ou validez votre clé API.';
       add('assistant', msg);
       }
@@ -884,11 +939,9 @@ document.addEventListener('DOMContentLoaded', () => {
    }
 
    async function getHealth(){
-      const tries = [`${API_BASE}/health`, `${API_BASE}/api/health`, `${API_BASE}/v1/health`];
-      for (const u of tries){
-         try { const j = await fetchJSON(u, {}, 3000); if (j && (j.status==='ok' || j.ok===true)) return j; } catch {}
-      }
-      return null;
+      // Un seul appel de découverte (état du LLM + routes) au lieu de sonder plusieurs URLs
+      const j = await window.nourDiscover(API_BASE);
+      return (j && j.status==='ok') ? j : null;
    }
    async function healthCheck(){
       const j = await getHealth();
@@ -905,13 +958,17 @@ document.addEventListener('DOMContentLoaded', () => {
          name:'IA Interne',
          async chat({messages, context}) {
             // Appel strict à l’API interne; tente plusieurs URLs locales
-            const prompt = messages.map(m=>`${m.role}: ${m.content}`).join('\n');
-            const payload = { prompt, provider: 'internal' };
-            if (context && context.trim()) payload.context = context.slice(0, 8000);
+            // Historique borné côté serveur : on envoie les messages + l'id de session
+            const payload = { messages, session_id: window.nourSessionId(), provider: 'internal' };
+            if (context && context.trim()){
+               // Cours envoyé une seule fois au serveur, puis référencé par son id
+               const courseId = await window.nourEnsureCourse(API_BASE, context);
+               if (courseId) payload.course_id = courseId; else payload.context = context.slice(0, 8000);
+            }
             const urls = [
+              `${API_BASE}/api/chat`,
               'http://127.0.0.1:8000/api/chat',
-              'http://localhost:8000/api/chat',
-              `${API_BASE}/api/chat`
+              'http://localhost:8000/api/chat'
             ];
             for (const url of urls){
                try{
@@ -980,11 +1037,14 @@ document.addEventListener('DOMContentLoaded', () => {
       const provider = Providers[providerKey] || Providers.internal;
 
       // construction de messages standard
+      // IA interne : le cours complet est envoyé une fois (course_id), jamais recopié dans les messages
+      const internal = provider === Providers.internal;
       let messages = [];
-      const context = (passages && passages.length) ? passages.map(p=>p.text||'').join('\n---\n').slice(0,8000) : '';
+      const full = (passages && passages.length) ? passages.map(p=>p.text||'').join('\n---\n') : '';
+      let context = internal ? full : full.slice(0,8000);
       if (task === 'grounded-chat') {
          messages = [{role:'system', content:'Tu es Professeur Nour, pédagogue, concis et bienveillant. Réponds en français.'}];
-         if (context) messages.push({role:'system', content:`Passages: ${context}`});
+         if (context && !internal) messages.push({role:'system', content:`Passages: ${context}`});
          messages.push({role:'user', content: question || prompt});
       } else if (task === 'sheets-3views') {
          const txt = sections.map(s=>`# ${s.title}\n${(s.body||'').slice(0,1200)}`).join('\n\n');
@@ -993,10 +1053,11 @@ document.addEventListener('DOMContentLoaded', () => {
             {role:'user', content: txt }
          ];
       } else if (task === 'make-mcq') {
-         const ctx = (passages?.map(p=>p.text).join('\n') || ($('#textInput')?.value||'')).slice(0,3500);
+         const ctx = passages?.map(p=>p.text).join('\n') || ($('#textInput')?.value||'');
+         if (internal) context = ctx;
          messages = [
             {role:'system', content:'Génère des QCM FR : 1 seule bonne réponse, 3 distracteurs plausibles, justification brève. Retourne une liste.'},
-            {role:'user', content:`Contexte:\n${ctx}\n\nSujets:${(topics||[]).join(', ')}\nNombre:${count}`}
+            {role:'user', content:`${internal ? '' : `Contexte:\n${ctx.slice(0,3500)}\n\n`}Sujets:${(topics||[]).join(', ')}\nNombre:${count}`}
          ];
       } else {
          messages = [{role:'user', content: prompt || question }];
@@ -1082,7 +1143,7 @@ document.addEventListener('DOMContentLoaded', () => {
       async function query(){
          const q = input.value.trim(); if (!q) return;
          add('user', q); input.value='';
-         const res = await __llm_generate({ task:'grounded-chat', question:q, passages: [{text: ($('#textInput')?.value||'').slice(0,3000)}] });
+         const res = await __llm_generate({ task:'grounded-chat', question:q, passages: [{text: $('#textInput')?.value||''}] });
    const msg = res.answer && String(res.answer).trim() ? res.answer : 'Aucune réponse du fournisseur sélectionné. Vérifiez l’indicateur d’état ou validez votre clé API.';
       add('assistant', msg);
       }
@@ -1352,11 +1413,9 @@ document.addEventListener('DOMContentLoaded', () => {
    }
 
    async function getHealth(){
-      const tries = [`${API_BASE}/health`, `${API_BASE}/api/health`, `${API_BASE}/v1/health`];
-      for (const u of tries){
-         try { const j = await fetchJSON(u, {}, 3000); if (j && (j.status==='ok' || j.ok===true)) return j; } catch {}
-      }
-      return null;
+      // Un seul appel de découverte (état du LLM + routes) au lieu de sonder plusieurs URLs
+      const j = await window.nourDiscover(API_BASE);
+      return (j && j.status==='ok') ? j : null;
    }
    async function healthCheck(){
       const j = await getHealth();
@@ -1373,13 +1432,17 @@ document.addEventListener('DOMContentLoaded', () => {
          name:'IA Interne',
          async chat({messages, context}) {
             // Appel strict à l’API interne; tente plusieurs URLs locales
-            const prompt = messages.map(m=>`${m.role}: ${m.content}`).join('\n');
-            const payload = { prompt, provider: 'internal' };
-            if (context && context.trim()) payload.context = context.slice(0, 8000);
+            // Historique borné côté serveur : on envoie les messages + l'id de session
+            const payload = { messages, session_id: window.nourSessionId(), provider: 'internal' };
+            if (context && context.trim()){
+               // Cours envoyé une seule fois au serveur, puis référencé par son id
+               const courseId = await window.nourEnsureCourse(API_BASE, context);
+               if (courseId) payload.course_id = courseId; else payload.context = context.slice(0, 8000);
+            }
             const urls = [
+              `${API_BASE}/api/chat`,
               'http://127.0.0.1:8000/api/chat',
-              'http://localhost:8000/api/chat',
-              `${API_BASE}/api/chat`
+              'http://localhost:8000/api/chat'
             ];
             for (const url of urls){
                try{
@@ -1448,11 +1511,14 @@ document.addEventListener('DOMContentLoaded', () => {
       const provider = Providers[providerKey] || Providers.internal;
 
       // construction de messages standard
+      // IA interne : le cours complet est envoyé une fois (course_id), jamais recopié dans les messages
+      const internal = provider === Providers.internal;
       let messages = [];
-      const context = (passages && passages.length) ? passages.map(p=>p.text||'').join('\n---\n').slice(0,8000) : '';
+      const full = (passages && passages.length) ? passages.map(p=>p.text||'').join('\n---\n') : '';
+      let context = internal ? full : full.slice(0,8000);
       if (task === 'grounded-chat') {
          messages = [{role:'system', content:'Tu es Professeur Nour, pédagogue, concis et bienveillant. Réponds en français.'}];
-         if (context) messages.push({role:'system', content:`Passages: ${context}`});
+         if (context && !internal) messages.push({role:'system', content:`Passages: ${context}`});
          messages.push({role:'user', content: question || prompt});
       } else if (task === 'sheets-3views') {
          `<div class="chat-message ${msg.role}-message">${msg.content}</div>`
@@ -1646,16 +1712,18 @@ document.addEventListener('DOMContentLoaded', () => {
 
    // Grounded chat util: call /api/chat with context from #textInput
    window.nourGroundedChat = async function(prompt){
-      const context = (dom.textInput?.value || '').slice(0, 8000);
+      const text = dom.textInput?.value || '';
+      const courseId = text.trim() ? await window.nourEnsureCourse(window.nourApiBase(), text) : null;
+      const body = courseId ? { prompt, course_id: courseId } : { prompt, context: text.slice(0, 8000) };
       try{
          const urls = [
+            `${window.nourApiBase()}/api/chat`,
             'http://127.0.0.1:8000/api/chat',
-            'http://localhost:8000/api/chat',
-            `${location.protocol.startsWith('http')? location.origin : 'http://localhost:8000'}/api/chat`
+            'http://localhost:8000/api/chat'
          ];
          for (const u of urls){
             try{
-               const r = await fetch(u, { method:'POST', headers:{'Content-Type':'application/json'}, body: JSON.stringify({ prompt, context }) });
+               const r = await fetch(u, { method:'POST', headers:{'Content-Type':'application/json'}, body: JSON.stringify(body) });
                if(r.ok){ const j = await r.json(); if(j.reply) return j.reply; }
             }catch(_){ }
          }
@@ -2174,7 +2242,7 @@ document.addEventListener('DOMContentLoaded', () => {
                temperature: 0.2, top_p: 0.9, max_tokens: 600,
                api_key: provider==='openai' ? (apiKey || null) : null
             };
-            const res = await fetch('http://localhost:8000/llm/run', { method:'POST', headers:{'Content-Type':'application/json'}, body: JSON.stringify(body) });
+            const res = await fetch(`${window.nourApiBase()}/llm/run`, { method:'POST', headers:{'Content-Type':'application/json'}, body: JSON.stringify(body) });
             const data = await res.json().catch(()=>({}));
             if (data && data.status==='ok') return data.output || '';
             return null;
@@ -2384,8 +2452,7 @@ document.addEventListener('DOMContentLoaded', () => {
    // Probe backend health for LLM config hints (non-blocking)
    (async ()=>{
       try{
-         const r = await fetch('http://localhost:8000/health');
-         const h = await r.json().catch(()=>({}));
+         const h = (await window.nourDiscover()) || {};
          const issues = h?.llm?.issues || [];
          if(Array.isArray(issues) && issues.length){
             const map = {
@@ -2601,7 +2668,7 @@ document.addEventListener('DOMContentLoaded', () => {
             const llm = await window.__llm_generate({
                task:'make-mcq',
                prompt: 'Tu es Professeur Nour. Génère des MCQ FR de qualité (1 seule bonne réponse, 3 distracteurs plausibles, justification courte). Réponds JSON.',
-               passages: [{ id:'local', text: text.slice(0, 3500) }],
+               passages: [{ id:'local', text }],
                topics: [title],
                count: opts.mcq
             });
@@ -3617,11 +3684,9 @@ document.addEventListener('DOMContentLoaded', () => {
    }
 
    async function getHealth(){
-      const tries = [`${API_BASE}/health`, `${API_BASE}/api/health`, `${API_BASE}/v1/health`];
-      for (const u of tries){
-         try { const j = await fetchJSON(u, {}, 3000); if (j && (j.status==='ok' || j.ok===true)) return j; } catch {}
-      }
-      return null;
+      // Un seul appel de découverte (état du LLM + routes) au lieu de sonder plusieurs URLs
+      const j = await window.nourDiscover(API_BASE);
+      return (j && j.status==='ok') ? j : null;
    }
    async function healthCheck(){
       const j = await getHealth();
@@ -3638,13 +3703,17 @@ document.addEventListener('DOMContentLoaded', () => {
          name:'IA Interne',
          async chat({messages, context}) {
             // Appel strict à l’API interne; tente plusieurs URLs locales
-            const prompt = messages.map(m=>`${m.role}: ${m.content}`).join('\n');
-            const payload = { prompt, provider: 'internal' };
-            if (context && context.trim()) payload.context = context.slice(0, 8000);
+            // Historique borné côté serveur : on envoie les messages + l'id de session
+            const payload = { messages, session_id: window.nourSessionId(), provider: 'internal' };
+            if (context && context.trim()){
+               // Cours envoyé une seule fois au serveur, puis référencé par son id
+               const courseId = await window.nourEnsureCourse(API_BASE, context);
+               if (courseId) payload.course_id = courseId; else payload.context = context.slice(0, 8000);
+            }
             const urls = [
+              `${API_BASE}/api/chat`,
               'http://127.0.0.1:8000/api/chat',
-              'http://localhost:8000/api/chat',
-              `${API_BASE}/api/chat`
+              'http://localhost:8000/api/chat'
             ];
             for (const url of urls){
                try{
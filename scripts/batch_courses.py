@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""Generate study sheets and MCQs for every course file of a folder, on several cores.
+
+Each worker process loads the model once; results go to the sheets store served by
+/sheets/<id> (one entry per course, id = content hash), and a manifest of content
+hashes lets an interrupted or repeated run skip the courses already done.
+Examples:
+  python3 scripts/batch_courses.py ~/cours --workers 4 --threads 2
+  python3 scripts/batch_courses.py ~/cours --model models/Qwen2-1_5B/qwen2-1_5b-instruct-fr-q4_k_m.gguf:qwen2
+  python3 scripts/batch_courses.py ~/cours --fake          # offline dry run (FakeLLMProvider)
+"""
+import argparse
+import json
+import os
+import sys
+
+_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+sys.path.insert(0, _ROOT)
+import course_batch  # noqa: E402
+
+_STORE = os.path.join(_ROOT, "server", "db", "sheets")
+
+
+def _model_spec(arg):
+    if arg:
+        path, mtype = arg.rsplit(":", 1) if ":" in arg else (arg, "llama")
+    elif os.getenv("QWEN_DIR") and os.getenv("QWEN_FILE"):
+        path, mtype = os.path.join(os.path.expanduser(os.environ["QWEN_DIR"]), os.environ["QWEN_FILE"]), "qwen2"
+    else:
+        raise SystemExit("❌ Aucun modèle (voir --model, QWEN_DIR/QWEN_FILE ou --fake).")
+    path = os.path.expanduser(path)
+    if not os.path.exists(path):
+        raise SystemExit(f"❌ Fichier modèle introuvable: {path}")
+    return {"path": os.path.dirname(path), "file": os.path.basename(path), "model_type": mtype}
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("folder", help="dossier de cours (.txt, .md), parcouru récursivement")
+    ap.add_argument("--model", help="CHEMIN.gguf[:model_type] (défaut: QWEN_DIR/QWEN_FILE)")
+    ap.add_argument("--fake", action="store_true", help="modèle factice hors ligne (test du pipeline)")
+    cpus = os.cpu_count() or 1
+    ap.add_argument("--workers", type=int, default=max(1, cpus // 2), help="processus (un modèle chacun)")
+    ap.add_argument("--threads", type=int, default=0, help="threads ggml par processus (défaut: cœurs / workers)")
+    ap.add_argument("--store", default=_STORE, help="dossier des fiches (celui que sert /sheets)")
+    ap.add_argument("--manifest", default=os.path.join(_ROOT, "server", "db", "batch", "manifest.json"))
+    ap.add_argument("--mcq-n", type=int, default=5, help="QCM par section")
+    ap.add_argument("--section-words", type=int, default=1200)
+    ap.add_argument("--max-tokens", type=int, default=1200)
+    ap.add_argument("--attempts", type=int, default=2, help="générations par étape si la sortie est invalide")
+    ap.add_argument("--json", action="store_true", help="rapport JSON sur stdout")
+    args = ap.parse_args()
+
+    paths = course_batch.find_courses(os.path.expanduser(args.folder))
+    if not paths:
+        raise SystemExit(f"❌ Aucun cours (.txt, .md) dans {args.folder}")
+    spec = {"fake": True, "token_ms": 1.0, "max_new_tokens": 64} if args.fake else _model_spec(args.model)
+    threads = args.threads or max(1, cpus // max(1, args.workers))
+
+    def show(res):
+        mark = {"ok": "✅", "partial": "⚠️"}.get(res["status"], "❌")
+        print(f"{mark} {res['file']}: {len(res['sheets'])} fiches, {len(res['mcq']['items'])} QCM, "
+              f"{res['tokens']} tokens, {res['seconds']} s", file=sys.stderr)
+        for e in res["errors"][:3]:
+            print(f"   {e}", file=sys.stderr)
+
+    report = course_batch.run(paths, args.store, args.manifest, spec, workers=args.workers, threads=threads,
+                              on_result=show, mcq_n=args.mcq_n, section_words=args.section_words,
+                              max_tokens=args.max_tokens, attempts=args.attempts)
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False))
+    else:
+        print(f"{report['files']} cours traités ({report['skipped']} déjà faits, {report['errors']} en erreur) "
+              f"en {report['seconds']} s — {report['files_per_min']} cours/min, {report['tokens_per_s']} tokens/s "
+              f"({args.workers} workers × {threads} threads)")
+    return 1 if report["errors"] else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""Aggregate tokens/sec of the multi-worker model pool, for 1..N workers.
+
+Example:
+  python3 scripts/bench_pool.py --dir models/Qwen2-1_5B --file qwen2-1_5b-instruct-fr-q4_k_m.gguf \
+      --model-type qwen2 --max-workers 4 --requests 16 --tokens 64
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import wait
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir)))
+from model_pool import ModelPool  # noqa: E402
+
+PROMPT = (
+    "Tu es Professeur Nour. Explique en quelques phrases le principe d'autonomie de l'opération de paiement.\n\n"
+    "Réponse:"
+)
+
+
+def run(spec, workers: int, requests: int, tokens: int) -> dict:
+    pool = ModelPool({"bench": spec}, workers=workers).start()
+    try:
+        if not pool.wait_ready(timeout=600):
+            raise SystemExit("❌ aucun worker prêt")
+        # Warm-up: one request per worker so page cache and thread pools are hot
+        wait([pool.submit(PROMPT, max_new_tokens=8) for _ in range(workers)])
+        t0 = time.perf_counter()
+        futs = [pool.submit(PROMPT, max_new_tokens=tokens, temperature=0.7, seed=i) for i in range(requests)]
+        wait(futs)
+        dt = time.perf_counter() - t0
+        done = [f.result() for f in futs if f.exception() is None]
+        toks = sum(u.get("completion_tokens", 0) for _t, u in done)
+        return {"workers": workers, "ok": len(done), "seconds": dt, "tokens": toks, "tok_s": toks / dt if dt else 0.0}
+    finally:
+        pool.close()
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--dir", required=True, help="dossier du modèle GGUF")
+    ap.add_argument("--file", required=True, help="nom du fichier GGUF")
+    ap.add_argument("--model-type", default="llama")
+    ap.add_argument("--max-workers", type=int, default=max(1, (os.cpu_count() or 2) // 2))
+    ap.add_argument("--requests", type=int, default=16)
+    ap.add_argument("--tokens", type=int, default=64)
+    args = ap.parse_args()
+    spec = {"path": os.path.expanduser(args.dir), "file": args.file, "model_type": args.model_type}
+    rows = []
+    for n in range(1, args.max_workers + 1):
+        rows.append(run(spec, n, args.requests, args.tokens))
+        r = rows[-1]
+        print(f"workers={r['workers']:<3} ok={r['ok']:<4} tokens={r['tokens']:<6} {r['seconds']:7.2f}s  {r['tok_s']:8.1f} tok/s"
+              f"  x{r['tok_s'] / rows[0]['tok_s'] if rows[0]['tok_s'] else 0:.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""Calibrate ctransformers threads/batch_size for this host and save the profile.
+
+Without --model, calibrates the models the server would load (TinyLlama and QWEN_DIR/QWEN_FILE).
+Examples:
+  python3 scripts/calibrate.py
+  python3 scripts/calibrate.py --model models/Qwen2-1_5B/qwen2-1_5b-instruct-fr-q4_k_m.gguf:qwen2 --threads 2,4,8
+"""
+import argparse
+import os
+import sys
+
+_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+sys.path.insert(0, _ROOT)
+import calibration  # noqa: E402
+
+
+def _default_models():
+    out = []
+    for d in ("models", "model"):
+        p = os.path.join(_ROOT, d, "TinyLlama-1.1B-Chat-v1.0", "tinyllama-1.1b-chat-v1.0.Q4_K_M.gguf")
+        if os.path.exists(p):
+            out.append((p, "llama"))
+            break
+    if os.getenv("QWEN_DIR") and os.getenv("QWEN_FILE"):
+        out.append((os.path.join(os.path.expanduser(os.environ["QWEN_DIR"]), os.environ["QWEN_FILE"]), "qwen2"))
+    return out
+
+
+def _ints(s):
+    return [int(x) for x in s.split(",") if x.strip()] if s else None
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--model", action="append", default=[], help="CHEMIN.gguf[:model_type] (répétable)")
+    ap.add_argument("--threads", help="liste, ex: 1,2,4,8 (défaut: selon le nombre de cœurs)")
+    ap.add_argument("--batch", help="liste, ex: 8,32,128,512")
+    ap.add_argument("--prompt-tokens", type=int, default=256)
+    ap.add_argument("--decode-tokens", type=int, default=32)
+    ap.add_argument("--dry-run", action="store_true", help="afficher le rapport sans enregistrer le profil")
+    args = ap.parse_args()
+    models = [(m.rsplit(":", 1)[0], m.rsplit(":", 1)[1]) if ":" in m else (m, "llama") for m in args.model] or _default_models()
+    if not models:
+        raise SystemExit("❌ Aucun modèle à calibrer (voir --model ou QWEN_DIR/QWEN_FILE).")
+    from ctransformers import AutoModelForCausalLM
+    for path, mtype in models:
+        print(f"⚙️ Calibration de {path} …")
+        llm = AutoModelForCausalLM.from_pretrained(os.path.dirname(path), model_file=os.path.basename(path), model_type=mtype)
+        result = calibration.calibrate(llm, _ints(args.threads), _ints(args.batch), args.prompt_tokens, args.decode_tokens)
+        print(calibration.report(os.path.basename(path), result))
+        if not args.dry_run:
+            print(f"✅ Profil enregistré: {calibration.save_profile(path, None, result)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+from __future__ import annotations
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import re, threading, time, unicodedata, zlib
+import numpy as np
+
+Embedder = Callable[[str], np.ndarray]
+
+_WORD_RE = re.compile(r"\w+")
+# Question forms and function words: "c'est quoi X", "définis X" and "qu'est-ce que X" should embed like "X"
+_STOPWORDS = frozenset("""
+a au aux avec c ce ces cette ceci cela ça d de des du elle en est et etre il ils j je l la le les leur lui m ma me
+mes moi mon n ne ni nous on ou par pas pour qu que quel quelle quelles quels qui quoi sa se ses si son sont sur t
+ta te tes toi ton tu un une vos votre vous y
+explique expliquer expliquez definis definir definissez definition signifie designe designent veut dire sens
+notion concept
+peux peut pouvez stp svp merci bonjour
+""".split())
+
+# Negation is dropped with the function words above but flips the question: kept as its own feature
+_NEGATION_RE = re.compile(r"\b(?:ne|ni|pas|jamais|sans|aucune?|rien)\b|\bn['’]")
+
+_WEIGHTS = {"w:": 3.0, "n:": 8.0, "x:": 8.0}
+
+
+def fold(text: str) -> str:
+    """Lowercase without accents."""
+    t = unicodedata.normalize("NFKD", (text or "").lower())
+    return "".join(ch for ch in t if not unicodedata.combining(ch))
+
+
+def _stem(word: str) -> str:
+    # Plural → singular is enough for question paraphrases
+    return word[:-1] if len(word) > 4 and word[-1] in "sx" else word
+
+
+def content_words(text: str) -> List[str]:
+    """Folded, singular words of `text` without function words and question forms."""
+    return [_stem(w) for w in _WORD_RE.findall(fold(text)) if w not in _STOPWORDS]
+
+
+def negated(text: str) -> bool:
+    """Whether `text` contains a negation ("n'est pas", "jamais", "sans", ...)."""
+    return _NEGATION_RE.search(fold(text)) is not None
+
+
+class HashingEmbedder:
+    """Small CPU embedder: content words and their character n-grams hashed into a fixed-size vector.
+
+    No model download and deterministic across processes (crc32, not hash()).
+    Character n-grams make inflections and typos ("définitions", "defintion")
+    land close to each other; cosine similarity is a dot product.
+    """
+
+    def __init__(self, dim: int = 1024, ngrams: Tuple[int, ...] = (3, 4)):
+        self.dim, self.ngrams = int(dim), tuple(ngrams)
+
+    def features(self, text: str) -> List[str]:
+        words = content_words(text)
+        # Numbers (articles, years, dates) must match exactly: no n-grams, and a heavy weight
+        feats = [f"n:{w}" if w.isdigit() else f"w:{w}" for w in words]
+        if negated(text):
+            feats.append("x:neg")
+        for w in words:
+            if w.isdigit():
+                continue
+            padded = f"<{w}>"
+            for n in self.ngrams:
+                feats.extend(padded[i:i + n] for i in range(len(padded) - n + 1))
+        return feats
+
+    def __call__(self, text: str) -> np.ndarray:
+        v = np.zeros(self.dim, dtype=np.float32)
+        for f in self.features(text):
+            h = zlib.crc32(f.encode("utf-8"))
+            # A whole-word match counts more than any single shared n-gram
+            v[h % self.dim] += _WEIGHTS.get(f[:2], 1.0) * (1.0 if h & 0x80000000 else -1.0)
+        norm = float(np.linalg.norm(v))
+        return v / norm if norm else v
+
+
+class _Bucket:
+    __slots__ = ("vectors", "entries")
+
+    def __init__(self, dim: int):
+        self.vectors = np.zeros((0, dim), dtype=np.float32)
+        self.entries: List[Dict[str, Any]] = []
+
+
+class SemanticCache:
+    """Grounded answers per course, found again for paraphrased questions.
+
+    Entries are grouped by course content hash: an edited course gets a new hash,
+    so answers about the old text are never served for it (and age out of the
+    LRU). A lookup is one matrix-vector product over the course's questions;
+    above `threshold` cosine similarity the stored answer is returned, never
+    across a negation ("... est valable" vs "... n'est pas valable").
+    """
+
+    def __init__(self, embed: Optional[Embedder] = None, threshold: float = 0.85,
+                 max_per_course: int = 256, max_courses: int = 64):
+        self.embed = embed or HashingEmbedder()
+        self.threshold = float(threshold)
+        self.max_per_course, self.max_courses = max_per_course, max_courses
+        self._courses: "OrderedDict[str, _Bucket]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.lookups = self.hits = 0
+        self.saved_ms = 0.0
+        self.lookup_ms = 0.0
+
+    def lookup(self, course_hash: str, question: str) -> Optional[Dict[str, Any]]:
+        """The cached entry ({question, answer, gen_ms, ..., score}) closest to `question`, if above threshold."""
+        t0 = time.perf_counter()
+        q = self.embed(question)
+        hit = None
+        with self._lock:
+            self.lookups += 1
+            b = self._courses.get(course_hash)
+            if b is not None and b.entries:
+                self._courses.move_to_end(course_hash)
+                sims = b.vectors @ q
+                neg = negated(question)
+                sims[[e["negated"] != neg for e in b.entries]] = -1.0
+                i = int(np.argmax(sims))
+                if float(sims[i]) >= self.threshold:
+                    hit = {**b.entries[i], "score": round(float(sims[i]), 4)}
+                    b.entries[i]["hits"] += 1
+            ms = (time.perf_counter() - t0) * 1000
+            self.lookup_ms += ms
+            if hit is not None:
+                self.hits += 1
+                self.saved_ms += max(0.0, hit["gen_ms"] - ms)
+        return hit
+
+    def store(self, course_hash: str, question: str, answer: str, gen_ms: float, **meta: Any) -> None:
+        v = self.embed(question)
+        if not v.any():
+            return  # nothing but stopwords: would match any other empty question
+        with self._lock:
+            b = self._courses.get(course_hash)
+            if b is None:
+                b = self._courses[course_hash] = _Bucket(v.shape[0])
+                while len(self._courses) > self.max_courses:
+                    self._courses.popitem(last=False)
+            self._courses.move_to_end(course_hash)
+            if len(b.entries) >= self.max_per_course:
+                # Drop the least-hit entry
+                j = min(range(len(b.entries)), key=lambda k: b.entries[k]["hits"])
+                b.vectors = np.delete(b.vectors, j, axis=0)
+                del b.entries[j]
+            b.vectors = np.vstack([b.vectors, v[None, :]])
+            b.entries.append({"question": question, "answer": answer, "gen_ms": float(gen_ms), "hits": 0,
+                              "negated": negated(question), **meta})
+
+    def invalidate(self, course_hash: str) -> bool:
+        with self._lock:
+            return self._courses.pop(course_hash, None) is not None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"courses": len(self._courses), "entries": sum(len(b.entries) for b in self._courses.values()),
+                    "threshold": self.threshold, "lookups": self.lookups, "hits": self.hits,
+                    "hit_rate": round(self.hits / self.lookups, 4) if self.lookups else 0.0,
+                    "saved_ms": round(self.saved_ms, 1),
+                    "avg_lookup_ms": round(self.lookup_ms / self.lookups, 3) if self.lookups else 0.0}
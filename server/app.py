@@ -1,10 +1,10 @@
 from fastapi import FastAPI, Response, Request
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
-from typing import List, Dict, Any, Optional, Tuple
-import re, unicodedata
-import os, json, uuid, sys
-from collections import Counter
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import re
+import os, json, uuid, sys, threading
 
 # Ensure project root is importable even if 'server' isn't a regular package
 _HERE = os.path.dirname(__file__)
@@ -12,6 +12,9 @@ _ROOT = os.path.abspath(os.path.join(_HERE, os.pardir))
 if _ROOT not in sys.path:
     sys.path.insert(0, _ROOT)
 
+import tracing
+from cancellation import GenerationBudget, budgeted
+
 app = FastAPI(title="Coach Local API")
 app.add_middleware(
     CORSMiddleware,
@@ -27,7 +30,32 @@ _TINY_CFG = {"max_new_tokens": 256, "temperature": 0.7, "top_p": 0.85, "repetiti
 # Default internal model preference (env: INTERNAL_MODEL = tinyllama | qwen2)
 INTERNAL_DEFAULT = (os.getenv('INTERNAL_MODEL', 'tinyllama') or 'tinyllama').lower()
 tinyllama_model = None  # type: ignore
-_TINY_GEN_KEYS = {"max_new_tokens", "temperature", "top_p", "repetition_penalty"}
+# Multi-process serving (env: MODEL_WORKERS = number of model-worker processes, 0 = in-process)
+_POOL_WORKERS = int(os.getenv('MODEL_WORKERS', '0') or 0)
+_POOL_SPECS: Dict[str, Dict[str, Any]] = {}
+model_pool = None  # type: ignore
+_TINY_GEN_KEYS = {"max_new_tokens", "temperature", "top_p", "repetition_penalty", "threads", "batch_size"}
+# Per-host threads/batch_size profile written by scripts/calibrate.py (env CALIBRATE_ON_STARTUP=1|force)
+_CALIBRATE_ON_STARTUP = (os.getenv('CALIBRATE_ON_STARTUP') or '').lower()
+try:
+    import calibration as _calibration
+except Exception:
+    _calibration = None  # type: ignore
+
+def _apply_calibration(name: str, model_obj: Any, cfg: Dict[str, Any], model_dir: str, model_file: str) -> None:
+    """Merge the host profile into a model's call-time settings, calibrating first if asked to."""
+    if _calibration is None:
+        return
+    prof = _calibration.load_profile(model_dir, model_file)
+    if model_obj is not None and (_CALIBRATE_ON_STARTUP == 'force' or (_CALIBRATE_ON_STARTUP in ('1', 'true', 'yes') and not prof)):
+        try:
+            result = _calibration.calibrate(model_obj)
+            print(_calibration.report(name, result))
+            _calibration.save_profile(model_dir, model_file, result)
+            prof = _calibration.load_profile(model_dir, model_file)
+        except Exception as _ce:
+            print(f"❌ Calibration {name} impossible :", _ce)
+    cfg.update(prof)
 try:
     from ctransformers import AutoModelForCausalLM as _CTC
     tiny_file_abs = os.path.join(_TINY_PATH, _TINY_FILE)
@@ -35,10 +63,15 @@ try:
     if not os.path.exists(tiny_file_abs) and os.path.exists(os.path.join(_ALT_TINY_PATH, _TINY_FILE)):
         use_path = _ALT_TINY_PATH
         tiny_file_abs = os.path.join(use_path, _TINY_FILE)
-    if os.path.exists(tiny_file_abs):
+    if os.path.exists(tiny_file_abs) and _POOL_WORKERS:
+        # Multi-worker mode: weights are loaded by the model workers, not by this process
+        _POOL_SPECS['tinyllama'] = {"path": use_path, "file": _TINY_FILE, "model_type": 'llama'}
+    elif os.path.exists(tiny_file_abs):
         # Pass no config object here to avoid version-specific API issues; apply generation params at call time
         tinyllama_model = _CTC.from_pretrained(use_path, model_file=_TINY_FILE, model_type='llama')  # type: ignore[arg-type]
         print(f"✅ TinyLlama chargé avec succès depuis {tiny_file_abs}")
+    if os.path.exists(tiny_file_abs):
+        _apply_calibration('tinyllama', tinyllama_model, _TINY_CFG, use_path, _TINY_FILE)
     else:
         print(f"❌ TinyLlama non chargé (introuvable): {tiny_file_abs}")
 except Exception as _e:
@@ -80,11 +113,16 @@ try:
             break
     if _QWEN_FILE_ENV and _QWEN_DIR_ENV:
         chosen_dir, chosen_file = os.path.expanduser(_QWEN_DIR_ENV), _QWEN_FILE_ENV
-    if chosen_dir and chosen_file:
+    if chosen_dir and chosen_file and _POOL_WORKERS:
+        _POOL_SPECS['qwen2'] = {"path": chosen_dir, "file": chosen_file, "model_type": 'qwen2'}
+        _apply_calibration('qwen2', None, _QWEN_CFG, chosen_dir, chosen_file)
+        qwen_info.update({"path": chosen_dir, "file": chosen_file})
+    elif chosen_dir and chosen_file:
         try:
             qwen_model = _CTC2.from_pretrained(chosen_dir, model_file=chosen_file, model_type='qwen2')  # type: ignore[arg-type]
             qwen_info.update({"path": chosen_dir, "file": chosen_file})
             print(f"✅ Qwen chargé avec succès depuis {os.path.join(chosen_dir, chosen_file)}")
+            _apply_calibration('qwen2', qwen_model, _QWEN_CFG, chosen_dir, chosen_file)
         except Exception as _qe:
             print("❌ Erreur chargement Qwen2 :", _qe)
             qwen_model = None
@@ -96,6 +134,26 @@ except Exception as _qerr:
     # Do not fail app if qwen isn't available
     print("ℹ️ Qwen2 non initialisé (optionnel) :", _qerr)
 
+if _POOL_SPECS:
+    from model_pool import ModelPool, PooledModel
+    model_pool = ModelPool(_POOL_SPECS, workers=_POOL_WORKERS, threads=(int(os.getenv('MODEL_THREADS', '0')) or None))
+    # Proxies keep the rest of the module unaware of where generation runs
+    if 'tinyllama' in _POOL_SPECS:
+        tinyllama_model = PooledModel(model_pool, 'tinyllama')
+    if 'qwen2' in _POOL_SPECS:
+        qwen_model = PooledModel(model_pool, 'qwen2')
+
+@app.on_event("startup")
+def _start_model_pool():
+    if model_pool is not None:
+        model_pool.start()
+        print(f"✅ {_POOL_WORKERS} workers modèle démarrés ({', '.join(sorted(_POOL_SPECS))})")
+
+@app.on_event("shutdown")
+def _stop_model_pool():
+    if model_pool is not None:
+        model_pool.close()
+
 def _llm_health() -> Dict[str, Any]:
     # Inspect config to ensure local model configuration is usable
     info: Dict[str, Any] = {"ready": False, "backend": None, "issues": []}
@@ -108,6 +166,9 @@ def _llm_health() -> Dict[str, Any]:
         # expose discovery details for qwen
         if qwen_info.get("path") and qwen_info.get("file"):
             info["qwen"] = {"path": qwen_info.get("path"), "file": qwen_info.get("file")}
+        if model_pool is not None:
+            info["workers"] = model_pool.stats()
+        info["routing"] = dict(ROUTER.snapshot(), enabled=ROUTER.enabled)
         info["ready"] = True
         return info
     try:
@@ -138,6 +199,9 @@ def _llm_health() -> Dict[str, Any]:
             model = (hf.get('model') or '').strip()
             if not model:
                 info['issues'].append('missing_model')
+            if _HF_PROVIDER is not None:
+                # CPU mode of the loaded model: int8/fp32, threads, load and warm-up times
+                info['hf'] = _HF_PROVIDER[1].info
             info['ready'] = len(info['issues']) == 0
         else:
             info['issues'].append('unknown_backend')
@@ -147,10 +211,12 @@ def _llm_health() -> Dict[str, Any]:
 
 @app.get("/health")
 def health():
-    return {"status": "ok", "llm": _llm_health()}
+    return {"status": "ok", "llm": _llm_health(), "conversations": CONVERSATIONS.stats(),
+            "answer_cache": ANSWERS.stats(), "definitions": DEFINITIONS.stats(), "jobs": JOBS.counts(),
+            "model_swaps": SWAPS.status(), "coalescing": FLIGHTS.stats()}
 
 # --- Lightweight answer post-processing (first complete sentence + dedup) ---
-_SENT_END_RE = re.compile(r"([\.\!\?…]+)(?=\s|$)")
+from chunking import SENT_END_RE as _SENT_END_RE, chunk_text
 
 def _strip_markers(s: str) -> str:
     s = s.strip()
@@ -197,14 +263,78 @@ def _ensure_text(x: Any) -> str:
     except Exception:
         return str(x)
 
+# --- Per-request spans (Server-Timing) and on-demand profiling ---
+# SERVER_TIMING=0 turns span collection off entirely; X-Trace: 1 keeps a JSON trace under /admin/traces
+_SERVER_TIMING = os.getenv('SERVER_TIMING', '1') != '0'
+_TRACES = tracing.TraceBuffer()
+_SAMPLER = tracing.StackSampler()
+_ADMIN_TOKEN = os.getenv('ADMIN_TOKEN') or ''
+
+def _is_admin(request: Request) -> bool:
+    import hmac
+    # Admin routes are disabled unless ADMIN_TOKEN is set
+    given = request.headers.get('X-Admin-Token') or ''
+    return bool(_ADMIN_TOKEN) and hmac.compare_digest(given, _ADMIN_TOKEN)
+
+def _forbidden() -> JSONResponse:
+    return JSONResponse({"error": "forbidden"}, status_code=403)
+
 # Simple request logging middleware
 @app.middleware("http")
 async def log_requests(request: Request, call_next):
     # Minimal perf-friendly logging (path + method)
     _ = (request.url.path, request.method)
-    response = await call_next(request)
+    if not _SERVER_TIMING and not _SAMPLER.remaining:
+        return await call_next(request)
+    import time
+    profiled = _SAMPLER.begin()
+    trace, token = tracing.begin() if _SERVER_TIMING else (None, None)
+    try:
+        response = await call_next(request)
+    finally:
+        if token is not None:
+            tracing.end(token)
+        if profiled:
+            _SAMPLER.end()
+    if trace is not None:
+        response.headers['Server-Timing'] = trace.server_timing(time.perf_counter())
+        if request.headers.get('X-Trace') == '1':
+            _TRACES.add(trace, request.url.path, request.method, response.status_code)
+            response.headers['X-Trace-Id'] = trace.id
     return response
 
+@app.post("/admin/profile")
+async def admin_profile_start(request: Request):
+    """Arm the stack sampler for the next N requests (body: {"requests": N})."""
+    if not _is_admin(request):
+        return _forbidden()
+    try:
+        body = await request.json()
+    except Exception:
+        body = {}
+    _SAMPLER.arm(int(body.get('requests') or 10))
+    return {"status": "armed", **_SAMPLER.status()}
+
+@app.get("/admin/profile")
+def admin_profile_result(request: Request):
+    """Download collapsed stacks (flamegraph.pl / speedscope format) of the profiled requests."""
+    if not _is_admin(request):
+        return _forbidden()
+    return Response(_SAMPLER.folded(), media_type='text/plain',
+                    headers={"Content-Disposition": "attachment; filename=profile.folded", "X-Profile-Status": json.dumps(_SAMPLER.status())})
+
+@app.get("/admin/traces")
+def admin_traces(request: Request, n: int = 20):
+    if not _is_admin(request):
+        return _forbidden()
+    return {"traces": _TRACES.recent(n)}
+
+@app.get("/admin/traces/{tid}")
+def admin_trace(tid: str, request: Request):
+    if not _is_admin(request):
+        return _forbidden()
+    return _TRACES.get(tid) or JSONResponse({"error": "not_found"}, status_code=404)
+
 class ExtractIn(BaseModel):
     urls: Optional[List[str]] = None
     prompt: Optional[str] = None
@@ -212,134 +342,181 @@ class ExtractIn(BaseModel):
     text: Optional[str] = None
     content: Optional[str] = None
 
-def _norm(s: str) -> str:
-    return unicodedata.normalize("NFKD", s).encode("ascii","ignore").decode().lower()
+from extraction import extract_data, extract_many
+from validation import iter_ndjson
 
 @app.post("/v1/extract")
 def extract(inp: ExtractIn):
-    text = (inp.text or inp.content or "").strip()
-    if not text:
-        return {"data": {"notions_cles": [], "definitions": [], "questions": []}}
-
-    tokens = re.findall(r"[A-Za-zÀ-ÿ]{3,}", text)
-    stop = set("le la les de des du un une et ou a au aux en dans pour par avec sans sur sous entre d l que qui quoi dont est sont ete été etre être ce cet cette ces il elle nous vous on ne pas".split())
-    toks = [_norm(t) for t in tokens if _norm(t) not in stop]
-    cnt = Counter(toks)
-    notions = [w for w,_ in cnt.most_common(12)]
-
-    lines = [l.strip() for l in text.splitlines() if l.strip()]
-    defs = []
-    for l in lines:
-        if re.search(r"(définition|se définit|est|consiste en)", l, re.I):
-            defs.append(l[:220])
-            if len(defs) >= 8:
-                break
+    return {"data": extract_data(inp.text or inp.content or "")}
+
+# Large batches are spread over worker processes (spawned on first use); small ones run inline
+from concurrent.futures import ProcessPoolExecutor
+from fastapi.responses import StreamingResponse
+import heapq, time
+import multiprocessing as _mp
+
+_EXTRACT_WORKERS = int(os.getenv('EXTRACT_WORKERS', '0') or 0) or (os.cpu_count() or 1)
+_EXTRACT_POOL_MIN_CHARS = int(os.getenv('EXTRACT_POOL_MIN_CHARS', '1000000') or 1000000)
+_EXTRACT_POOL: Optional[ProcessPoolExecutor] = None
+_EXTRACT_POOL_LOCK = threading.Lock()
 
-    questions = [f"Expliquez la notion: « {w} »." for w in notions[:6]]
-    return {"data": {"notions_cles": notions, "definitions": defs, "questions": questions}}
+def _extract_pool() -> ProcessPoolExecutor:
+    global _EXTRACT_POOL
+    with _EXTRACT_POOL_LOCK:
+        if _EXTRACT_POOL is None:
+            _EXTRACT_POOL = ProcessPoolExecutor(max_workers=_EXTRACT_WORKERS, mp_context=_mp.get_context("spawn"))
+        return _EXTRACT_POOL
+
+@app.on_event("shutdown")
+def _stop_extract_pool():
+    if _EXTRACT_POOL is not None:
+        _EXTRACT_POOL.shutdown(cancel_futures=True)
+
+def _extract_docs(items: List[Any]) -> Tuple[List[Tuple[int, Any, str]], List[Dict[str, Any]]]:
+    docs, errors = [], []
+    for i, it in enumerate(items):
+        if isinstance(it, str):
+            docs.append((i, None, it))
+        elif isinstance(it, dict) and isinstance(it.get('text') or it.get('content') or '', str):
+            docs.append((i, it.get('id'), it.get('text') or it.get('content') or ''))
+        else:
+            errors.append({"index": i, "id": it.get('id') if isinstance(it, dict) else None,
+                           "error": getattr(it, 'error', None) or "expected a string or {\"id\", \"text\"}"})
+    return docs, errors
+
+@app.post("/v1/extract/batch")
+async def extract_batch(request: Request):
+    """/v1/extract over many documents: a JSON array, {"documents": [...]} or NDJSON (one document per line).
+
+    Documents are strings or {"id", "text"}; results stream back as NDJSON in input order,
+    one {"index", "id", "data"} line per document, then a {"done": true, ...} summary line.
+    """
+    body = (await request.body()).decode('utf-8', errors='replace')
+    ctype = (request.headers.get('content-type') or '').lower()
+    items: Any
+    if 'ndjson' in ctype or 'jsonl' in ctype:
+        items = list(iter_ndjson(body))
+    else:
+        try:
+            items = json.loads(body) if body.strip() else []
+        except ValueError:
+            items = list(iter_ndjson(body))
+        if isinstance(items, dict):
+            items = items.get('documents')
+    if not isinstance(items, list):
+        return JSONResponse({"error": "expected a JSON array, {\"documents\": [...]} or NDJSON"}, status_code=400)
+    docs, errors = _extract_docs(items)
+    chars = sum(len(d[2]) for d in docs)
+    pool = _extract_pool() if chars >= _EXTRACT_POOL_MIN_CHARS and _EXTRACT_WORKERS > 1 else None
+
+    def lines():
+        t0 = time.perf_counter()
+        # Starlette iterates this in a worker thread, so waiting on the pool does not block the loop
+        for res in heapq.merge(extract_many(docs, pool), errors, key=lambda r: r["index"]):
+            yield json.dumps(res, ensure_ascii=False) + "\n"
+        yield json.dumps({"done": True, "count": len(items), "errors": len(errors), "chars": chars,
+                          "workers": _EXTRACT_WORKERS if pool else 1,
+                          "seconds": round(time.perf_counter() - t0, 3)}) + "\n"
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
 
 # === Validation utilities (JSON schema) ===
-from jsonschema import validate as _validate, ValidationError
-
-def _extra_validate_mcq(payload: Dict[str, Any]) -> list:
-    errs = []
-    items = payload.get('items') or []
-    if not isinstance(items, list) or not items:
-        errs.append('items empty')
-        return errs
-    for it in items:
-        opts = it.get('options') or []
-        if len(opts) != 4:
-            errs.append(f"{it.get('id')}: options must be 4")
-        if len(set(opts)) != len(opts):
-            errs.append(f"{it.get('id')}: duplicate options")
-        ai = it.get('answer_index')
-        if not isinstance(ai, int) or ai < 0 or ai > 3:
-            errs.append(f"{it.get('id')}: answer_index out of range")
-        if isinstance(ai, int) and 0 <= ai < len(opts):
-            if isinstance(opts[ai], str) and re.search(r"toutes", opts[ai], re.I):
-                errs.append(f"{it.get('id')}: invalid 'Toutes les réponses'")
-        q = (it.get('question') or '').strip().lower()
-        ans = ''
-        if isinstance(ai, int) and 0 <= ai < len(opts):
-            ans = (opts[ai] or '').strip().lower()
-        # Leakage only if answer is substantive (>=4 chars or contains space)
-        if ans and q and (len(ans) >= 4 or ' ' in ans):
-            frag = ans[: min(12, len(ans))]
-            if frag and frag in q:
-                errs.append(f"{it.get('id')}: answer leakage in question")
-        if it.get('difficulty') not in ("easy","medium","hard"):
-            errs.append(f"{it.get('id')}: invalid difficulty")
-        if it.get('bloom') not in ("rappel","compréhension","application","analyse"):
-            errs.append(f"{it.get('id')}: invalid bloom")
-    return errs
-
-def _extra_validate_sheet(payload: Dict[str, Any]) -> list:
-    errs = []
-    sheets = payload.get('sheets') or []
-    if not isinstance(sheets, list) or not sheets:
-        errs.append('sheets empty')
-        return errs
-    for s in sheets:
-        title = s.get('title')
-        if not isinstance(title, str) or not title.strip():
-            errs.append('missing title')
-        sv = s.get('short_version') or {}
-        mv = s.get('medium_version') or {}
-        lv = s.get('long_version') or {}
-        if sv.get('type') != 'bullet_points':
-            errs.append(f"{title or '?'}: short_version.type must be bullet_points")
-        if not isinstance(sv.get('content'), list) or not (1 <= len(sv['content']) <= 5):
-            errs.append(f"{title or '?'}: short_version.content 1..5 bullets")
-        if mv.get('type') != 'paragraphs':
-            errs.append(f"{title or '?'}: medium_version.type must be paragraphs")
-        if not isinstance(mv.get('content'), list) or not (1 <= len(mv['content']) <= 2):
-            errs.append(f"{title or '?'}: medium_version.content 1..2 paragraphs")
-        if lv.get('type') != 'developed' or not isinstance(lv.get('content'), str):
-            errs.append(f"{title or '?'}: long_version.type must be developed with string content")
-        if isinstance(lv.get('content'), str) and len(lv['content']) < 100:
-            errs.append(f"{title or '?'}: long_version too short (<100 chars)")
-        if not isinstance(s.get('citations'), list):
-            errs.append(f"{title or '?'}: citations missing")
-    return errs
+from validation import KINDS as _SCHEMA_KINDS, compile_all as _compile_schemas, iter_ndjson, validate as _validate_kind, validate_many
+
+# Validators are compiled once here and rebuilt only when a schema file changes
+_compile_schemas()
 
 @app.post("/validate/{kind}")
 def validate_payload(kind: str, payload: Dict[str, Any]):
     """Validate payloads against known schemas: kind in { 'mcq', 'sheet' }"""
-    here = os.path.dirname(__file__)
-    root = os.path.abspath(os.path.join(here, os.pardir))
-    if kind not in {"mcq","sheet"}:
+    return _validate_kind(kind, payload)
+
+@app.post("/validate/{kind}/batch")
+async def validate_batch(kind: str, request: Request):
+    """Validate many payloads in one request: a JSON array, {"payloads": [...]}, or NDJSON (one payload per line)."""
+    if kind not in _SCHEMA_KINDS:
         return {"ok": False, "errors": ["unknown schema kind"]}
-    schema_path = os.path.join(root, "schemas", f"{kind}.schema.json")
-    if not os.path.exists(schema_path):
-        return {"ok": False, "errors": ["schema not found"]}
-    with open(schema_path, 'r', encoding='utf-8') as f:
-        schema = json.load(f)
+    body = (await request.body()).decode('utf-8', errors='replace')
+    ctype = (request.headers.get('content-type') or '').lower()
+    if 'ndjson' in ctype or 'jsonl' in ctype:
+        return validate_many(kind, iter_ndjson(body))
     try:
-        _validate(instance=payload, schema=schema)
-        # extra rules
-        extra_errors: list = []
-        if kind == 'mcq':
-            extra_errors = _extra_validate_mcq(payload)
-        elif kind == 'sheet':
-            extra_errors = _extra_validate_sheet(payload)
-        if extra_errors:
-            return {"ok": False, "errors": extra_errors}
-        return {"ok": True, "errors": []}
-    except ValidationError as e:
-        return {"ok": False, "errors": [str(e)]}
-
-# === Serve sample LLM outputs (MCQ + Sheets) ===
+        payloads = json.loads(body) if body.strip() else []
+    except ValueError:
+        # One JSON document per line sent without the NDJSON content type
+        return validate_many(kind, iter_ndjson(body))
+    if isinstance(payloads, dict):
+        payloads = payloads.get('payloads')
+    if not isinstance(payloads, list):
+        return JSONResponse({"ok": False, "errors": ["expected a JSON array, {\"payloads\": [...]} or NDJSON"]}, status_code=400)
+    return validate_many(kind, payloads)
+
+# === Front end: coach.html and its assets, precompressed and cache-busted ===
+from static_assets import AssetBundle, FileCache
+
+_FRONTEND: Optional[AssetBundle] = None
+_FRONTEND_LOCK = threading.Lock()
+_FILES = FileCache()
+_IMMUTABLE = "public, max-age=31536000, immutable"
+
+def _frontend() -> AssetBundle:
+    # Built on first use (hashing + gzip/brotli of ~300 KB), then served from memory
+    global _FRONTEND
+    with _FRONTEND_LOCK:
+        if _FRONTEND is None:
+            _FRONTEND = AssetBundle(_ROOT)
+        return _FRONTEND
+
+def _asset_response(request: Request, asset: Any, cache_control: str) -> Response:
+    body, encoding = asset.negotiate(request.headers.get('accept-encoding') or '')
+    etag = asset.etag(encoding)
+    headers = {"ETag": etag, "Cache-Control": cache_control, "Vary": "Accept-Encoding"}
+    inm = request.headers.get('if-none-match') or ''
+    if inm.strip() == '*' or etag in [t.strip().removeprefix('W/') for t in inm.split(',')]:
+        return Response(status_code=304, headers=headers)
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    return Response(body, media_type=asset.media_type, headers=headers)
+
+@app.get("/")
+@app.get("/coach.html")
+def frontend_page(request: Request):
+    # The page itself is revalidated on every load; everything it references is immutable
+    return _asset_response(request, _frontend().page, "no-cache")
+
+@app.get("/static/{name:path}")
+def frontend_asset(name: str, request: Request):
+    asset = _frontend().assets.get(name)
+    if asset is None:
+        return Response("Not found", status_code=404)
+    return _asset_response(request, asset, _IMMUTABLE)
+
+# Original paths stay reachable for URLs that scripts build at runtime ("prof-mascotte-2.png")
+@app.get("/{name}.png", include_in_schema=False)
+@app.get("/{name}.css", include_in_schema=False)
+@app.get("/{name}.js", include_in_schema=False)
+@app.get("/assets/{name}.png", include_in_schema=False)
+@app.get("/public/validators/{name}.js", include_in_schema=False)
+def frontend_plain_asset(name: str, request: Request):
+    asset = _frontend().plain.get(request.url.path.lstrip('/'))
+    if asset is None:
+        return Response("Not found", status_code=404)
+    return _asset_response(request, asset, "no-cache")
+
 @app.get("/samples")
-def get_samples():
-    here = os.path.dirname(__file__)
-    root = os.path.abspath(os.path.join(here, os.pardir))
-    sample_path = os.path.join(root, "assets", "samples", "llm_samples.json")
-    if not os.path.exists(sample_path):
+def get_samples(request: Request):
+    # Read once, kept in memory (re-read when the file changes) and revalidated by ETag
+    asset = _FILES.get(os.path.join(_ROOT, "assets", "samples", "llm_samples.json"))
+    if asset is None:
         return {"status": "error", "error": "samples_not_found"}
-    with open(sample_path, "r", encoding="utf-8") as f:
-        data = json.load(f)
-    return data
+    return _asset_response(request, asset, "no-cache")
+
+@app.get("/api/discovery")
+def discovery():
+    """Everything the front end needs at startup in one round trip (replaces probing several health URLs)."""
+    return {"status": "ok", "service": "coach-local-api", "llm": _llm_health(),
+            "endpoints": {"chat": "/api/chat", "courses": "/courses", "sheets": "/sheets", "llm_run": "/llm/run",
+                          "validate": "/validate/{kind}", "samples": "/samples", "health": "/health"},
+            "assets": _frontend().manifest() if _FRONTEND is not None else None}
 
 # === Provider fallback scaffold (no external calls here, just shape) ===
 class LLMRequest(BaseModel):
@@ -353,46 +530,118 @@ class LLMRequest(BaseModel):
     top_p: float = 0.9
     max_tokens: int = 800
     api_key: Optional[str] = None
+    slo_ms: Optional[int] = None  # latency target used by the model router
+    course_id: Optional[str] = None  # uploaded course (POST /courses) to ground the prompt on
+    deadline_ms: Optional[int] = None  # generation stops (partial output, stopped='timeout') past this budget
+
+def _inject_course(req: LLMRequest) -> None:
+    """Fill {{retrieved_passages_json}} (or prepend passages) from an uploaded course."""
+    course = COURSES.get(req.course_id or '')
+    if course is None:
+        raise ValueError(f"course_not_found: {req.course_id}")
+    with tracing.span("course"):
+        hits = course.retrieve(req.prompt[:500], k=8)
+        pj = json.dumps([{"id": c["id"], "text": c["text"]} for c in hits], ensure_ascii=False)
+    if "{{retrieved_passages_json}}" in req.prompt:
+        req.prompt = req.prompt.replace("{{retrieved_passages_json}}", pj)
+    else:
+        req.prompt = f"Passages: {pj}\n\n{req.prompt}"
 
-def _run_local(req: LLMRequest) -> Tuple[str, str, Dict[str,int]]:
-    """Return (provider, text, usage) using local backends if available."""
+def _run_local(req: LLMRequest, budget: Optional[GenerationBudget] = None) -> Tuple[str, str, Dict[str,int]]:
+    """Return (provider, text, usage) using local backends if available; a budget makes generation stoppable."""
     prov = (req.provider or 'auto')
     usage = {"prompt_tokens": len(req.prompt.split()), "completion_tokens": 0}
     text = ""
-    if prov in ('ctransformers','auto'):
+    if prov == 'fake':
+        # Deterministic offline backend (benchmarks/tests); never part of 'auto'
+        from fake_provider import FakeLLMProvider  # type: ignore
         try:
-            from ctransformers_provider import CTransformersProvider  # type: ignore
-            # Load defaults from config when request fields are missing
-            try:
-                from config_loader import AppConfig  # type: ignore
-                appcfg = AppConfig.load().data
-                ctc = (appcfg.get('ctransformers') or {})
-            except Exception:
-                ctc = {}
-            model = (req.model or ctc.get('model') or '').strip()
-            model_file = req.model_file if req.model_file is not None else ctc.get('model_file')
-            model_type = (req.model_type or ctc.get('model_type') or 'auto')
-            cfg = {"temperature": req.temperature, **(ctc.get('config') or {})}
-            p = CTransformersProvider(model=model, model_file=model_file, model_type=model_type, config=cfg)
-            text = p.generate(req.prompt, max_new_tokens=req.max_tokens, temperature=req.temperature)
-            return ('ctransformers', text, usage)
+            from config_loader import AppConfig  # type: ignore
+            fcfg = (AppConfig.load().data.get('fake') or {})
+        except Exception:
+            fcfg = {}
+        p = FakeLLMProvider(**fcfg)
+        with tracing.span("generate"):
+            if budget is not None:
+                text = ''.join(budgeted(p.stream(req.prompt, max_tokens=req.max_tokens, temperature=req.temperature), budget))
+            else:
+                text = p.generate(req.prompt, max_tokens=req.max_tokens, temperature=req.temperature)
+        return ('fake', text, usage)
+    if prov == 'auto':
+        # Latency/success-aware order instead of a fixed ctransformers → hf chain
+        order, _decision = ROUTER.choose(list(_LOCAL_RUNNERS), task=req.task, question=req.prompt,
+                                         prompt_tokens=usage["prompt_tokens"], slo_ms=req.slo_ms)
+    else:
+        order = [prov] if prov in _LOCAL_RUNNERS else []
+    for name in order:
+        import time
+        t0 = time.time()
+        try:
+            text = _LOCAL_RUNNERS[name](req, budget)
+            if budget is None or not budget.stopped:
+                ROUTER.observe(name, True, (time.time()-t0)*1000, usage["prompt_tokens"], len(_ensure_text(text).split()))
+            return (name, text, usage)
         except Exception as e:
+            ROUTER.observe(name, False, (time.time()-t0)*1000)
+            if prov != 'auto':
+                raise
             # surface actionable message when model misconfigured
             err = str(e)
-            if 'missing_model' in err or 'model_path_or_repo_id' in err or 'missing' in err:
+            if name == 'ctransformers' and ('missing_model' in err or 'model_path_or_repo_id' in err or 'missing' in err):
                 raise
-            if prov != 'auto':
-                raise
-    if prov in ('hf','auto'):
+    return ('none', text, usage)
+
+def _run_ctransformers(req: LLMRequest, budget: Optional[GenerationBudget] = None) -> str:
+    from ctransformers_provider import CTransformersProvider  # type: ignore
+    # Load defaults from config when request fields are missing
+    with tracing.span("config"):
         try:
-            from hf_provider import HFProvider  # type: ignore
-            p = HFProvider(model=req.model or 'gpt2')
-            text = p.generate(req.prompt, max_tokens=req.max_tokens, temperature=req.temperature)
-            return ('hf', text, usage)
+            from config_loader import AppConfig  # type: ignore
+            appcfg = AppConfig.load().data
+            ctc = (appcfg.get('ctransformers') or {})
         except Exception:
-            if prov != 'auto':
-                raise
-    return ('none', text, usage)
+            ctc = {}
+    model = (req.model or ctc.get('model') or '').strip()
+    model_file = req.model_file if req.model_file is not None else ctc.get('model_file')
+    model_type = (req.model_type or ctc.get('model_type') or 'auto')
+    cfg = {"temperature": req.temperature, **(ctc.get('config') or {})}
+    with tracing.span("model_load"):
+        p = CTransformersProvider(model=model, model_file=model_file, model_type=model_type, config=cfg)
+    with tracing.span("generate"):
+        if budget is not None:
+            return ''.join(budgeted(p.stream(req.prompt, max_new_tokens=req.max_tokens, temperature=req.temperature), budget))
+        return p.generate(req.prompt, max_new_tokens=req.max_tokens, temperature=req.temperature)
+
+# The loaded (quantized, warmed-up) HF model is kept between requests; another model replaces it
+_HF_PROVIDER: Optional[Tuple[Tuple[str, str], Any]] = None
+_HF_LOCK = threading.Lock()
+
+def _hf_provider(model: str) -> Any:
+    global _HF_PROVIDER
+    from hf_provider import HFProvider  # type: ignore
+    try:
+        from config_loader import AppConfig  # type: ignore
+        hf = (AppConfig.load().data.get('huggingface') or {})
+    except Exception:
+        hf = {}
+    key = (model, json.dumps([hf.get('device'), hf.get('cpu')], sort_keys=True, default=str))
+    with _HF_LOCK:
+        if _HF_PROVIDER is None or _HF_PROVIDER[0] != key:
+            _HF_PROVIDER = None  # release the previous weights before loading new ones
+            _HF_PROVIDER = (key, HFProvider(model=model, device=hf.get('device'), cpu=hf.get('cpu')))
+        return _HF_PROVIDER[1]
+
+def _run_hf(req: LLMRequest, budget: Optional[GenerationBudget] = None) -> str:
+    with tracing.span("model_load"):
+        p = _hf_provider(req.model or 'gpt2')
+    with tracing.span("generate"):
+        if budget is not None:
+            return ''.join(budgeted(p.stream(req.prompt, max_tokens=req.max_tokens, temperature=req.temperature,
+                                             should_stop=budget.exhausted), budget))
+        return p.generate(req.prompt, max_tokens=req.max_tokens, temperature=req.temperature)
+
+# Local backends tried by provider 'auto', in the order chosen by ROUTER
+_LOCAL_RUNNERS = {'ctransformers': _run_ctransformers, 'hf': _run_hf}
 
 async def _run_openai(req: LLMRequest) -> Tuple[str, str, Dict[str,int]]:
     import httpx, asyncio
@@ -416,41 +665,176 @@ async def _run_openai(req: LLMRequest) -> Tuple[str, str, Dict[str,int]]:
         usage = data.get('usage', {}) or {"prompt_tokens": 0, "completion_tokens": 0}
         return ('openai', text, usage)
 
-def _log_run(task: str, provider: str, ok: bool, ms: int, usage: Dict[str,int]):
-    runs_dir = os.path.join(os.path.dirname(__file__), 'db', 'runs')
-    os.makedirs(runs_dir, exist_ok=True)
-    path = os.path.join(runs_dir, 'runs.jsonl')
-    rec = {"task": task, "provider": provider, "ok": ok, "ms": ms, **{f"usage_{k}": v for k,v in (usage or {}).items()}}
+RUNS_DIR = os.path.join(os.path.dirname(__file__), 'db', 'runs')
+
+# Model routing policy; learns from the same records _log_run appends to runs.jsonl
+from routing import ModelRouter
+try:
+    from config_loader import AppConfig as _AppConfig  # type: ignore
+    _ROUTING_CFG = (_AppConfig.load(os.path.join(_ROOT, 'config.yml')).data.get('routing') or {})
+except Exception:
+    _ROUTING_CFG = {}
+if os.getenv('MODEL_ROUTING'):
+    _ROUTING_CFG = {**_ROUTING_CFG, "enabled": os.getenv('MODEL_ROUTING') == '1'}
+ROUTER = ModelRouter(log_path=os.path.join(RUNS_DIR, 'routing.jsonl'), **_ROUTING_CFG)
+ROUTER.load_history(os.path.join(RUNS_DIR, 'runs.jsonl'))
+
+@app.on_event("shutdown")
+def _flush_routing_log():
+    ROUTER.flush()
+
+def _log_run(task: str, provider: str, ok: bool, ms: int, usage: Dict[str,int], **extra: Any):
+    os.makedirs(RUNS_DIR, exist_ok=True)
+    path = os.path.join(RUNS_DIR, 'runs.jsonl')
+    rec = {"task": task, "provider": provider, "ok": ok, "ms": ms, **{f"usage_{k}": v for k,v in (usage or {}).items()}, **extra}
     with open(path, 'a', encoding='utf-8') as f:
         f.write(json.dumps(rec, ensure_ascii=False) + "\n")
 
+def _json_from_prompt(prompt: str, field: str) -> Optional[Dict[str, Any]]:
+    """The last JSON object of `prompt` with a top-level `field` (a rendered prompt may still hold the template's example)."""
+    at = prompt.rfind(f'"{field}"')
+    start = prompt.rfind('{', 0, at + 1) if at != -1 else -1
+    while start != -1:
+        try:
+            obj, _end = json.JSONDecoder().raw_decode(prompt, start)
+            if isinstance(obj, dict) and field in obj:
+                return obj
+        except ValueError:
+            pass
+        start = prompt.rfind('{', 0, start)
+    return None
+
+def _native_task(req: LLMRequest) -> Optional[Dict[str, Any]]:
+    """Answer tasks that need no generation (srs-plan, grade-mcq) from the JSON embedded in the prompt."""
+    if req.task == 'srs-plan':
+        obj = _json_from_prompt(req.prompt, 'items_stats')
+        try:
+            srs_in = SrsPlanIn(**obj) if obj else None
+        except (ValueError, TypeError):
+            return None
+        if srs_in is not None and any(str(it.get('id') or '').strip() for it in srs_in.items_stats):
+            return _srs_plan(srs_in)
+    elif req.task == 'grade-mcq':
+        obj = _json_from_prompt(req.prompt, 'user_answer_index') or {}
+        item = obj.get('item')
+        if isinstance(item, dict) and isinstance(item.get('answer_index'), int):
+            try:
+                graded = _grade_mcq(MCQ_KEYS.compile({"items": [item]}), [[obj.get('user_answer_index')]])
+            except InvalidIndex:
+                return None  # let the model answer an item it cannot grade natively
+            it = graded["attempts"][0]["items"][0]
+            return {k: it[k] for k in ("status", "correct", "explanation_short", "next_hint", "citations")}
+    return None
+
 @app.post("/llm/run")
-async def llm_run(req: LLMRequest):
-    import time
+async def llm_run(req: LLMRequest, request: Request):
+    import time, asyncio
     t0 = time.time()
     provider = req.provider or 'auto'
+    budget = GenerationBudget(deadline_ms=req.deadline_ms, poll_s=_DISCONNECT_POLL_S)
     text, used_provider, usage = '', 'none', {"prompt_tokens": len(req.prompt.split()), "completion_tokens": 0}
+    leader = True
     try:
+        if req.course_id:
+            _inject_course(req)
+        # Deterministic answers instead of a multi-second generation
+        native = _native_task(req) if req.task in ('srs-plan', 'grade-mcq') else None
+        if native is not None:
+            used_provider, text = 'native', json.dumps(native, ensure_ascii=False)
+            ok = True
+            return {"provider": used_provider, "status": "ok", "usage": usage, "output": text}
         if provider in ('openai',):
             used_provider, text, usage = await _run_openai(req)
+        elif FLIGHTS.enabled and budget.deadline is None:
+            # Identical concurrent runs share one local generation
+            flight, leader = FLIGHTS.join(coalesce_key("llm_run", provider, req.task, req.model, req.model_file, req.model_type,
+                                                       req.temperature, req.top_p, req.max_tokens, req.prompt))
+            if leader:
+                flight.start(lambda: _run_local(req, flight.budget))
+            shared = await flight.wait(request.is_disconnected)
+            if shared is None:
+                budget.stopped = 'cancelled'
+            else:
+                used_provider, text, usage = shared[0], shared[1], dict(shared[2])
+                budget.stopped = flight.budget.stopped
+            if used_provider == 'none' and provider in ('auto',) and req.api_key:
+                used_provider, text, usage = await _run_openai(req)
         else:
-            used_provider, text, usage = _run_local(req)
+            # Off the event loop, so a client that goes away stops the generation at its next token
+            used_provider, text, usage = await budget.wait(asyncio.to_thread(_run_local, req, budget), request.is_disconnected)
             if used_provider == 'none' and provider in ('auto',):
                 # fallback to OpenAI only if api_key provided
                 if req.api_key:
                     used_provider, text, usage = await _run_openai(req)
         ok = True
+        if budget.stopped:
+            return {"provider": used_provider, "status": "ok", "usage": usage, "output": text, "stopped": budget.stopped}
+        if not leader:
+            return {"provider": used_provider, "status": "ok", "usage": usage, "output": text, "coalesced": True}
         return {"provider": used_provider, "status": "ok", "usage": usage, "output": text}
     except Exception as e:
         ok = False
         return {"provider": used_provider, "status": "error", "error": str(e), "usage": usage, "output": ""}
     finally:
         ms = int((time.time()-t0)*1000)
-        _log_run(req.task, used_provider, ok, ms, usage)
+        extra: Dict[str, Any] = {"stopped": budget.stopped} if budget.stopped else ({"coalesced": True} if not leader else {})
+        with tracing.span("log"):
+            _log_run(req.task, used_provider, ok, ms, usage, **extra)
+
+# === Conversation memory: last turns verbatim + rolling summary, per session_id ===
+from conversation import ConversationStore, approx_tokens
+
+def _history_tokens(text: str) -> int:
+    """Tokens of `text` for the default chat model (its own tokenizer when loaded in process)."""
+    with _leased_model(lambda: qwen_model or tinyllama_model) as model_obj:
+        tokenize = getattr(model_obj, 'tokenize', None)
+        if tokenize is not None:
+            try:
+                return len(tokenize(text))
+            except Exception:
+                pass
+    return approx_tokens(text)
+
+def _model_summary(previous: str, turns: List[Tuple[str, str]], max_words: int) -> str:
+    """Summarizer backed by the smallest loaded model (CHAT_SUMMARY=model); runs in the store's thread."""
+    lines = "\n".join(f"{r}: {c}" for r, c in turns)
+    prompt = (f"Mets à jour le résumé de cette conversation d'étude en {max_words} mots maximum, en français. "
+              f"Garde les notions, questions et réponses importantes.\n\nRésumé actuel :\n{previous or '(vide)'}\n\n"
+              f"Nouveaux échanges :\n{lines}\n\nRésumé mis à jour :\n")
+    with _leased_model(lambda: tinyllama_model or qwen_model) as model_obj:
+        if model_obj is None:
+            from conversation import extractive_summary
+            return extractive_summary(previous, turns, max_words)
+        # Under the model lock too: chat requests may be generating on the same instance
+        text, _n = _chat_generate(model_obj, prompt, {"max_new_tokens": min(256, max_words * 2)}, GenerationBudget())
+    return text
+
+CONVERSATIONS = ConversationStore(
+    summarizer=(_model_summary if os.getenv('CHAT_SUMMARY', 'extractive') == 'model' else None),
+    keep_turns=int(os.getenv('CHAT_KEEP_TURNS', '6')),
+    max_tokens=int(os.getenv('CHAT_HISTORY_TOKENS', '1024')),
+    summary_tokens=int(os.getenv('CHAT_SUMMARY_TOKENS', '256')),
+    count=_history_tokens,
+)
+
+@app.on_event("shutdown")
+def _stop_conversations():
+    CONVERSATIONS.close()
+
+def _session_prompt(session_id: str, messages: Any, prompt: str) -> str:
+    """Record the new turn(s) of a session and return its bounded history as the prompt."""
+    msgs = messages if isinstance(messages, list) and messages else [{"role": "user", "content": prompt}]
+    conv = CONVERSATIONS.ingest(session_id, msgs)
+    return CONVERSATIONS.render(conv)
+
+@app.delete("/conversations/{session_id}")
+def drop_conversation(session_id: str):
+    return {"dropped": CONVERSATIONS.drop(session_id)}
 
 # === Minimal chat/generate endpoints for front-end compatibility ===
 class ChatIn(BaseModel):
     messages: List[Dict[str, str]]
+    session_id: Optional[str] = None
     provider: Optional[str] = None
     model: Optional[str] = None
     model_file: Optional[str] = None
@@ -467,8 +851,11 @@ class GenerateIn(BaseModel):
 
 @app.post("/chat")
 async def chat(inp: ChatIn, request: Request):
-    # Compose prompt from chat messages
-    prompt = "\n".join([f"{m.get('role','user')}: {m.get('content','')}" for m in (inp.messages or [])])
+    # Compose prompt from chat messages (bounded history when the client sends a session_id)
+    if inp.session_id:
+        prompt = _session_prompt(inp.session_id, inp.messages, '')
+    else:
+        prompt = "\n".join([f"{m.get('role','user')}: {m.get('content','')}" for m in (inp.messages or [])])
     # allow Authorization header for API key
     auth = request.headers.get('Authorization') or ''
     api_key = inp.api_key or (auth.split('Bearer ',-1)[-1] if 'Bearer ' in auth else '')
@@ -480,6 +867,8 @@ async def chat(inp: ChatIn, request: Request):
         # Lightweight post-processing for chat outputs only
         text = _postprocess_answer(_ensure_text(text))
         ok = True
+        if inp.session_id and text:
+            CONVERSATIONS.add(inp.session_id, 'assistant', text)
         return {"status": "ok", "provider": used_provider, "output": text, "usage": usage}
     except Exception as e:
         return {"status": "error", "error": str(e), "provider": 'none', "output": ""}
@@ -497,71 +886,380 @@ async def generate(inp: GenerateIn, request: Request):
     except Exception as e:
         return {"status": "error", "error": str(e), "provider": 'none', "output": ""}
 
+# How often a running generation checks whether its client is still connected
+_DISCONNECT_POLL_S = float(os.getenv('DISCONNECT_POLL_MS', '100')) / 1000
+# In-process models are not safe to call from two threads at once (chat requests, background jobs)
+_MODEL_LOCKS: Dict[int, threading.Lock] = {}
+_MODEL_LOCKS_GUARD = threading.Lock()
+
+def _model_lock(model_obj: Any) -> threading.Lock:
+    with _MODEL_LOCKS_GUARD:
+        return _MODEL_LOCKS.setdefault(id(model_obj), threading.Lock())
+
+# Generations running on each in-process model instance (a swapped-out model is freed once idle)
+from contextlib import contextmanager
+from hot_swap import Leases, ModelSwapper, SwapBusy
+MODEL_LEASES = Leases()
+
+@contextmanager
+def _leased_model(select: Callable[[], Any]):
+    """The model picked by `select`, leased from the moment it is read until the block ends."""
+    (model_obj,) = MODEL_LEASES.acquire(lambda: (select(),))
+    try:
+        yield model_obj
+    finally:
+        if model_obj is not None:
+            MODEL_LEASES.release(model_obj)
+
+def _acquire_model(lock: threading.Lock, budget: Optional[GenerationBudget]) -> bool:
+    """Wait for a model's lock while the budget lasts; False once it is cancelled or past its deadline."""
+    if budget is None:
+        return lock.acquire()
+    while True:
+        rem = budget.remaining_s()
+        if lock.acquire(timeout=budget.poll_s if rem is None else min(budget.poll_s, rem)):
+            return True
+        if budget.exhausted():
+            return False
+
+def _generate_local(model_obj: Any, prompt: str, gen_kwargs: Dict[str, Any],
+                    budget: Optional[GenerationBudget] = None,
+                    on_token: Optional[Callable[[str], None]] = None) -> Tuple[str, int]:
+    """Stream from an in-process model so time to first token (prompt eval) and decode are traced apart.
+
+    With a budget, generation stops at the next token once it is cancelled or past its deadline,
+    and a request queued behind another generation gives up waiting at the same point.
+    """
+    import time
+    lock = _model_lock(model_obj)
+    with MODEL_LEASES.hold(model_obj):
+        if not _acquire_model(lock, budget):
+            return '', 0
+        try:
+            t0 = time.perf_counter()
+            first = None
+            parts: List[str] = []
+            if budget is not None and budget.exhausted():
+                return '', 0
+            for tok in budgeted(model_obj(prompt, stream=True, **gen_kwargs), budget):
+                if first is None:
+                    first = time.perf_counter()
+                    tracing.record("prompt_eval", t0, first)
+                parts.append(tok)
+                if on_token is not None:
+                    on_token(tok)
+            tracing.record("decode", first or t0)
+        finally:
+            lock.release()
+    return ''.join(parts), len(parts)
+
+def _chat_generate(model_obj: Any, prompt: str, gen_kwargs: Dict[str, Any], budget: GenerationBudget,
+                   on_token: Optional[Callable[[str], None]] = None) -> Tuple[str, int]:
+    """(text, completion tokens) from an in-process model or a model worker; blocking, run off the event loop."""
+    if hasattr(model_obj, 'submit'):
+        with tracing.span("generate"):
+            fut = model_obj.submit(prompt, **gen_kwargs, **budget.worker_params())
+            budget.on_cancel(lambda: model_obj.cancel(fut))
+            raw, wusage = fut.result()
+        budget.stopped = budget.stopped or wusage.get("stopped")
+        text = _ensure_text(raw)
+        if on_token is not None and text:
+            on_token(text)
+        return text, wusage.get("completion_tokens", 0)
+    return _generate_local(model_obj, prompt, gen_kwargs, budget, on_token)
+
+def _leased_generate(model_obj: Any, prompt: str, gen_kwargs: Dict[str, Any], budget: GenerationBudget,
+                     on_token: Optional[Callable[[str], None]] = None) -> Tuple[str, int]:
+    """_chat_generate, then drop the lease /api/chat took when it picked `model_obj`."""
+    try:
+        return _chat_generate(model_obj, prompt, gen_kwargs, budget, on_token)
+    finally:
+        MODEL_LEASES.release(model_obj)
+
+# === Single-flight: identical concurrent generations (same model, params, prompt) run once ===
+from coalescing import Flight, SingleFlight, coalesce_key
+FLIGHTS = SingleFlight(max_followers=int(os.getenv('COALESCE_MAX_FOLLOWERS', '32')), poll_s=_DISCONNECT_POLL_S,
+                       enabled=os.getenv('COALESCE', '1') != '0')
+
+def _chat_stream(flight: Optional[Flight], model_obj: Any, model_name: str, full_prompt: str, gen_kwargs: Dict[str, Any],
+                 budget: GenerationBudget, usage: Dict[str, int], task: str, session_id: str,
+                 coalesced: bool, t0: float) -> Response:
+    """/api/chat with "stream": true: the raw tokens as they are generated, shared by coalesced requests."""
+    from fastapi.responses import StreamingResponse
+    import time
+    if flight is None:
+        # Deadline set or coalescing off: a flight of its own, bound to this request's budget
+        flight = Flight("", budget=budget)
+        flight.start(lambda: (*_leased_generate(model_obj, full_prompt, gen_kwargs, flight.budget, flight.push),
+                              flight.budget.stopped))
+
+    def body():
+        ok, stopped = False, None
+        try:
+            # Closing this iterator (client gone) detaches; the generation stops when nobody is left
+            yield from flight.stream()
+            text, usage["completion_tokens"], stopped = flight.result()
+            ok = True
+            if session_id and text and stopped != 'cancelled':
+                CONVERSATIONS.add(session_id, 'assistant', _postprocess_answer(text))
+        except GeneratorExit:
+            stopped = 'cancelled'
+            raise
+        except Exception:
+            pass
+        finally:
+            ms = int((time.time()-t0)*1000)
+            extra: Dict[str, Any] = {"stopped": stopped} if stopped else ({"coalesced": True} if coalesced else {})
+            _log_run(f"api_chat:{task}", 'internal', ok, ms, usage, model=model_name, stream=True, **extra)
+            if ok and not extra:
+                ROUTER.observe(model_name, ok, ms, usage["prompt_tokens"], usage["completion_tokens"])
+    return StreamingResponse(body(), media_type="text/plain; charset=utf-8",
+                             headers={"X-Model": model_name, "X-Coalesced": "1" if coalesced else "0"})
+
+# === Model hot swap: load a new GGUF version in the background, switch once warmed up ===
+_SWAP_TYPES = {"qwen2": "qwen2", "tinyllama": "llama"}
+
+def _load_gguf(spec: Dict[str, Any]) -> Any:
+    from ctransformers import AutoModelForCausalLM as _CTC3
+    path = os.path.expanduser(str(spec["path"]))
+    if spec.get("file") and not os.path.exists(os.path.join(path, spec["file"])):
+        raise FileNotFoundError(os.path.join(path, spec["file"]))
+    return _CTC3.from_pretrained(path, model_file=spec.get("file"), model_type=spec["model_type"])  # type: ignore[arg-type]
+
+def _current_model(name: str) -> Any:
+    return qwen_model if name == 'qwen2' else tinyllama_model
+
+def _install_model(name: str, model_obj: Any, spec: Dict[str, Any]) -> None:
+    # One global assignment: requests that already picked the old instance finish on it
+    global qwen_model, tinyllama_model
+    cfg = _QWEN_CFG if name == 'qwen2' else _TINY_CFG
+    if spec.get("file"):
+        _apply_calibration(name, None, cfg, os.path.expanduser(str(spec["path"])), spec["file"])
+    if name == 'qwen2':
+        qwen_model = model_obj
+        qwen_info.update({"path": spec.get("path"), "file": spec.get("file")})
+    else:
+        tinyllama_model = model_obj
+
+def _release_model(model_obj: Any) -> None:
+    with _MODEL_LOCKS_GUARD:
+        _MODEL_LOCKS.pop(id(model_obj), None)
+
+SWAPS = ModelSwapper(_load_gguf, _current_model, _install_model, MODEL_LEASES, release=_release_model,
+                     drain_timeout_s=float(os.getenv('SWAP_DRAIN_TIMEOUT_S', '300')))
+
+class SwapIn(BaseModel):
+    path: str
+    file: Optional[str] = None
+    model_type: Optional[str] = None
+
+@app.post("/admin/models/{name}/swap")
+def admin_swap_model(name: str, body: SwapIn, request: Request):
+    """Load another version of qwen2/tinyllama (GGUF dir + file) and switch traffic to it once it answers."""
+    if not _is_admin(request):
+        return _forbidden()
+    if name not in _SWAP_TYPES:
+        return JSONResponse({"error": "unknown_model", "models": sorted(_SWAP_TYPES)}, status_code=404)
+    if model_pool is not None:
+        return JSONResponse({"error": "not_supported_with_model_workers"}, status_code=409)
+    spec = {"path": body.path, "file": body.file, "model_type": body.model_type or _SWAP_TYPES[name]}
+    try:
+        return JSONResponse({"swap": SWAPS.start(name, spec)}, status_code=202)
+    except SwapBusy as e:
+        return JSONResponse({"error": "swap_in_progress", "detail": str(e)}, status_code=409)
+
+@app.get("/admin/models/swaps")
+def admin_swaps(request: Request):
+    if not _is_admin(request):
+        return _forbidden()
+    return SWAPS.status()
+
 # --- Minimal API chat endpoint that strictly uses the internal TinyLlama ---
 @app.post("/api/chat")
 async def api_chat(request: Request):
-    try:
-        data = await request.json()
-    except Exception:
-        data = {}
-    # Accept either a direct prompt or a messages[] list
-    prompt = (data.get("prompt") or "").strip()
-    if not prompt and isinstance(data.get("messages"), list):
+    import time
+    t0 = time.time()
+    with tracing.span("parse"):
         try:
-            msgs = data.get("messages") or []
-            prompt = "\n".join([f"{m.get('role','user')}: {m.get('content','')}" for m in msgs])
+            data = await request.json()
         except Exception:
-            prompt = ""
-    course_context = (data.get("context") or "").strip()
+            data = {}
+        # Accept either a direct prompt or a messages[] list
+        prompt = (data.get("prompt") or "").strip()
+        if not prompt and isinstance(data.get("messages"), list):
+            try:
+                msgs = data.get("messages") or []
+                prompt = "\n".join([f"{m.get('role','user')}: {m.get('content','')}" for m in msgs])
+            except Exception:
+                prompt = ""
+        course_context = (data.get("context") or "").strip()
+        course_id = str(data.get("course_id") or "").strip()
+        # Retrieval query: the question itself, not the whole flattened conversation
+        question = prompt
+        if not data.get("prompt") and isinstance(data.get("messages"), list):
+            users = [m.get('content', '') for m in (data.get("messages") or []) if isinstance(m, dict) and m.get('role', 'user') == 'user']
+            question = (users[-1] if users else prompt).strip()
+        session_id = str(data.get("session_id") or "").strip()
+        # A question that does not follow earlier turns can be answered from the semantic cache
+        standalone = sum(1 for m in (data.get("messages") or []) if isinstance(m, dict) and m.get('role', 'user') == 'user') <= 1
+        # Optional budgets: the generation stops at this deadline (from request arrival) or token count
+        try:
+            deadline_ms = float(data["deadline_ms"]) if data.get("deadline_ms") else None
+            max_tokens = int(data["max_tokens"]) if data.get("max_tokens") else None
+            slo_ms = float(data["slo_ms"]) if data.get("slo_ms") else None
+        except (TypeError, ValueError):
+            return {"error": "invalid_budget"}
+        budget = GenerationBudget(deadline_ms=deadline_ms, poll_s=_DISCONNECT_POLL_S)
+        stream = bool(data.get("stream"))
+    if session_id:
+        prev = CONVERSATIONS.get(session_id, create=False)
+        standalone = standalone and (prev is None or prev.seen == 0)
+        with tracing.span("history"):
+            prompt = _session_prompt(session_id, data.get("messages"), question)
+    if course_id:
+        with tracing.span("course"):
+            course = COURSES.get(course_id)
+            if course is None:
+                return {"error": "course_not_found", "course_id": course_id}
+            # Only the passages relevant to this question, instead of a truncated copy of the course
+            course_context = course.context_for(question, max_words=_COURSE_CONTEXT_WORDS)
     # Strict grounding: refuse to answer without explicit course context
     if not course_context:
         return {"reply": "Je n’ai pas trouvé cela dans le cours.", "model": ("qwen2" if qwen_model is not None else ("tinyllama" if tinyllama_model is not None else None))}
     task = str(data.get("task") or "chat").lower()
     out_format = str(data.get("format") or "text").lower()
-    # Apply a concise French instruction to stabilize output
-    system = (
-        "Tu es Professeur Nour, un coach d’étude bienveillant. Réponds en français clair, structuré et concis (phrases simples). "
-        "Tu t'appuies UNIQUEMENT sur le cours fourni dans le contexte. Si l'information n'est pas dans le cours, réponds: \"Je n’ai pas trouvé cela dans le cours.\" "
-        "Si la question est floue, demande une précision. N'invente rien (surtout pas d'articles)."
-    )
-    context_block = (f"\n\n=== CONTEXTE DU COURS ===\n{course_context}" if course_context else "")
-    header = f"{system}{context_block}\n\n=== QUESTION DE L'ÉTUDIANT ===\n{prompt}\n\n"
-    if out_format == 'json' or 'mcq' in task:
-        full_prompt = f"{header}=== RÉPONSE ATTENDUE (JSON STRICT) ===\n"
-    else:
-        full_prompt = f"{header}=== RÉPONSE DU PROFESSEUR NOUR ===\n"
+    with tracing.span("prompt"):
+        # Apply a concise French instruction to stabilize output
+        system = (
+            "Tu es Professeur Nour, un coach d’étude bienveillant. Réponds en français clair, structuré et concis (phrases simples). "
+            "Tu t'appuies UNIQUEMENT sur le cours fourni dans le contexte. Si l'information n'est pas dans le cours, réponds: \"Je n’ai pas trouvé cela dans le cours.\" "
+            "Si la question est floue, demande une précision. N'invente rien (surtout pas d'articles)."
+        )
+        context_block = (f"\n\n=== CONTEXTE DU COURS ===\n{course_context}" if course_context else "")
+        header = f"{system}{context_block}\n\n=== QUESTION DE L'ÉTUDIANT ===\n{prompt}\n\n"
+        if out_format == 'json' or 'mcq' in task:
+            full_prompt = f"{header}=== RÉPONSE ATTENDUE (JSON STRICT) ===\n"
+        else:
+            full_prompt = f"{header}=== RÉPONSE DU PROFESSEUR NOUR ===\n"
     provider = str(data.get("provider") or "internal").lower()
-    # Allow explicit local model selection via body.model: "qwen2" or "tinyllama"
-    # Prefer Qwen2 by default when available
-    preferred_model = str(data.get("model") or ("qwen2" if qwen_model is not None else INTERNAL_DEFAULT) or "tinyllama").lower()
     if provider in {"internal", "ctransformers", "local"}:
-        # Choose model respecting explicit selection when provided
-        model_obj = None
-        gen_kwargs: Dict[str, Any] = {}
-        if preferred_model.startswith("qwen") and qwen_model is not None:
-            model_obj = qwen_model
-            gen_kwargs = {k: v for k, v in _QWEN_CFG.items() if k in _TINY_GEN_KEYS}
-        elif preferred_model.startswith("tiny") and tinyllama_model is not None:
-            model_obj = tinyllama_model
-            gen_kwargs = {k: v for k, v in _TINY_CFG.items() if k in _TINY_GEN_KEYS}
-        else:
-            # Fallback preference: Qwen if available, else TinyLlama
-            if qwen_model is not None:
-                model_obj = qwen_model
-                gen_kwargs = {k: v for k, v in _QWEN_CFG.items() if k in _TINY_GEN_KEYS}
-            elif tinyllama_model is not None:
-                model_obj = tinyllama_model
-                gen_kwargs = {k: v for k, v in _TINY_CFG.items() if k in _TINY_GEN_KEYS}
+        cache_key = None
+        if standalone and task == 'chat' and out_format == 'text':
+            # Course content hash: indexes and answers about another version of the text never match
+            text_key = course_id or course_id_for(course_context)
+            if _DEFINITION_FAST_PATH:
+                with tracing.span("definitions"):
+                    src = course if course_id else None
+                    idx = DEFINITIONS.index(text_key, src.text if src else course_context, src.chunks if src else None)
+                    found = DEFINITIONS.answer(idx, question)
+                if found is not None:
+                    # The course defines the term word for word: cite it instead of generating
+                    if session_id:
+                        CONVERSATIONS.add(session_id, 'assistant', found["answer"])
+                    _log_run(f"api_chat:{task}", 'extractive', True, int((time.time()-t0)*1000),
+                             {"prompt_tokens": 0, "completion_tokens": 0}, confidence=found["confidence"])
+                    return {"reply": found["answer"], "model": "extractive", "confidence": found["confidence"],
+                            "citations": [found["citation"]]}
+        if _ANSWER_CACHE and standalone and task == 'chat' and out_format == 'text':
+            with tracing.span("answer_cache"):
+                cache_key = text_key
+                hit = ANSWERS.lookup(cache_key, question)
+            if hit is not None:
+                if session_id:
+                    CONVERSATIONS.add(session_id, 'assistant', hit["answer"])
+                _log_run(f"api_chat:{task}", 'cache', True, int((time.time()-t0)*1000),
+                         {"prompt_tokens": 0, "completion_tokens": 0}, model=hit["model"], similarity=hit["score"])
+                return {"reply": hit["answer"], "model": hit["model"], "cached": True, "similarity": hit["score"]}
+        with tracing.span("select"):
+            # Read and lease the loaded models in one step, so a hot swap cannot count the chosen one idle
+            # before its generation starts; the generation (_leased_generate) releases it
+            leased = MODEL_LEASES.acquire(lambda: (qwen_model, tinyllama_model))
+            loaded = {n: m for n, m in zip(("qwen2", "tinyllama"), leased) if m is not None}
+            model_obj = None
+            try:
+                # Explicit selection (body.model or INTERNAL_MODEL env) wins; otherwise the router decides
+                # (Qwen2 first unless routing is turned on)
+                explicit = str(data.get("model") or os.getenv('INTERNAL_MODEL') or "").lower()
+                if explicit.startswith("qwen") and "qwen2" in loaded:
+                    model_name = "qwen2"
+                elif explicit.startswith("tiny") and "tinyllama" in loaded:
+                    model_name = "tinyllama"
+                elif loaded:
+                    order, _decision = ROUTER.choose(list(loaded), task=task, out_format=out_format, question=question,
+                                                     prompt_tokens=len(full_prompt.split()), slo_ms=slo_ms)
+                    model_name = order[0]
+                else:
+                    model_name = None
+                model_obj = loaded.get(model_name) if model_name else None
+            finally:
+                for m in loaded.values():
+                    if m is not model_obj:
+                        MODEL_LEASES.release(m)
+            cfg = _QWEN_CFG if model_name == "qwen2" else _TINY_CFG
+            gen_kwargs: Dict[str, Any] = {k: v for k, v in cfg.items() if k in _TINY_GEN_KEYS}
+            if max_tokens:
+                # A budget can only lower the configured generation length
+                gen_kwargs["max_new_tokens"] = max(1, min(max_tokens, int(gen_kwargs.get("max_new_tokens") or max_tokens)))
         if model_obj is None:
             return {"error": "⚠️ IA interne indisponible"}
+        usage = {"prompt_tokens": len(full_prompt.split()), "completion_tokens": 0}
+        # Without a deadline, identical concurrent requests (a projected quiz) share one generation
+        flight, leader = None, True
+        if FLIGHTS.enabled and budget.deadline is None:
+            flight, leader = FLIGHTS.join(coalesce_key("api_chat", model_name, gen_kwargs, full_prompt))
+            if leader:
+                flight.start(lambda: (*_leased_generate(model_obj, full_prompt, gen_kwargs, flight.budget, flight.push),
+                                      flight.budget.stopped))
+            else:
+                MODEL_LEASES.release(model_obj)  # served by the leader's generation
+        if stream:
+            return _chat_stream(flight, model_obj, model_name, full_prompt, gen_kwargs, budget, usage, task, session_id,
+                                coalesced=not leader, t0=t0)
+        ok = False
+        t_gen = time.time()
         try:
-            raw = model_obj(full_prompt, **gen_kwargs)
-            text = _ensure_text(raw)
-            # Skip post-processing if expecting JSON/MCQ to avoid corrupting the structure
-            reply = text if (out_format == 'json' or 'mcq' in task) else _postprocess_answer(text)
-            return {"reply": reply, "model": ("qwen2" if model_obj is qwen_model else "tinyllama")}
+            # Generation runs off the event loop, which watches for the client going away meanwhile
+            import asyncio
+            if flight is not None:
+                shared = await flight.wait(request.is_disconnected)
+                if shared is None:
+                    budget.stopped = 'cancelled'
+                else:
+                    text, usage["completion_tokens"], budget.stopped = shared
+            else:
+                text, usage["completion_tokens"] = await budget.wait(
+                    asyncio.to_thread(_leased_generate, model_obj, full_prompt, gen_kwargs, budget), request.is_disconnected)
+            if budget.stopped == 'cancelled':
+                # Nobody is waiting for this reply: keep it out of the conversation and the cache
+                ok = True
+                return {"error": "cancelled"}
+            with tracing.span("postprocess"):
+                # Skip post-processing if expecting JSON/MCQ to avoid corrupting the structure
+                reply = text if (out_format == 'json' or 'mcq' in task) else _postprocess_answer(text)
+            ok = True
+            if session_id and reply:
+                CONVERSATIONS.add(session_id, 'assistant', reply)
+            if budget.stopped:
+                return {"reply": reply, "model": model_name, "stopped": budget.stopped}
+            if not leader:
+                return {"reply": reply, "model": model_name, "coalesced": True}
+            if cache_key and reply:
+                ANSWERS.store(cache_key, question, reply, (time.time()-t_gen)*1000, model=model_name)
+            return {"reply": reply, "model": model_name}
         except Exception as e:
             return {"error": f"⚠️ IA interne indisponible: {e}"}
+        finally:
+            with tracing.span("log"):
+                ms = int((time.time()-t0)*1000)
+                if budget.stopped:
+                    # A cut-short generation says nothing about the model's latency or reliability
+                    _log_run(f"api_chat:{task}", 'internal', ok, ms, usage, model=model_name, stopped=budget.stopped)
+                elif not leader:
+                    # Served by another request's generation: not a latency sample either
+                    _log_run(f"api_chat:{task}", 'internal', ok, ms, usage, model=model_name, coalesced=True)
+                else:
+                    ROUTER.observe(model_name, ok, ms, usage["prompt_tokens"], usage["completion_tokens"])
+                    _log_run(f"api_chat:{task}", 'internal', ok, ms, usage, model=model_name)
     # Pas de fallback OpenAI sur cette route
     return {"error": "⚠️ IA interne indisponible"}
 
@@ -592,18 +1290,7 @@ async def firecrawl_chat(inp: FCChatIn, request: Request):
     # No API key: return a helpful message instead of empty
     return {"status":"ok","answer":"Firecrawl n'est pas configuré localement. Ajoutez une clé (ou utilisez OpenAI) pour des réponses générées."}
 
-# === RAG helpers (chunking + overlap + naive rerank) ===
-def _split_tokens(text: str, size: int=550, overlap: int=100) -> List[str]:
-    words = text.split()
-    chunks = []
-    i = 0
-    while i < len(words):
-        chunk = words[i:i+size]
-        if not chunk: break
-        chunks.append(' '.join(chunk))
-        i += size - overlap
-    return chunks
-
+# === RAG helpers (sentence-aware chunking + naive rerank) ===
 def _score(query: str, passage: str) -> float:
     q = set(re.findall(r"\w+", query.lower()))
     p = set(re.findall(r"\w+", passage.lower()))
@@ -620,19 +1307,304 @@ def rag_retrieve(body: Dict[str, Any]):
     text = (body.get('text') or '').strip()
     query = (body.get('query') or '').strip()
     k = int(body.get('k') or 8)
+    course_id = (body.get('course_id') or '').strip()
+    if course_id:
+        # Uploaded course: chunks and term index are already built
+        course = COURSES.get(course_id)
+        if course is None:
+            return {"passages": [], "error": "course_not_found"}
+        return {"passages": course.retrieve(query or course.text[:300], k=k)}
     size = int(body.get('chunk_size') or 550)
     overlap = int(body.get('overlap') or 100)
     if not text:
         return {"passages": []}
-    chunks = _split_tokens(text, size=size, overlap=overlap)
-    corpus = [{"id": f"p{i}", "text": c} for i,c in enumerate(chunks)]
+    # Whole sentences with character offsets (start/end) for citations
+    corpus = chunk_text(text, max_tokens=size, overlap=overlap)
     hits = _retrieve(query or text[:300], corpus, k=k)
     return {"passages": hits}
 
+# === Course sessions: upload once, then reference by content-hash course_id ===
+from course_store import CourseStore
+COURSES_DIR = os.path.join(os.path.dirname(__file__), 'db', 'courses')
+COURSES = CourseStore(COURSES_DIR)
+# Word budget of course passages placed in a /api/chat prompt
+_COURSE_CONTEXT_WORDS = int(os.getenv('COURSE_CONTEXT_WORDS', '1200'))
+# Answers reused for paraphrased questions on the same course text (ANSWER_CACHE=0 to disable)
+from course_store import course_id_for
+from semantic_cache import SemanticCache
+_ANSWER_CACHE = os.getenv('ANSWER_CACHE', '1') != '0'
+ANSWERS = SemanticCache(threshold=float(os.getenv('ANSWER_CACHE_THRESHOLD', '0.85')))
+# "Qu'est-ce que X ?" answered with the course's own definition sentence (DEFINITION_FAST_PATH=0 to disable)
+from definitions import DefinitionAnswerer
+_DEFINITION_FAST_PATH = os.getenv('DEFINITION_FAST_PATH', '1') != '0'
+DEFINITIONS = DefinitionAnswerer(threshold=float(os.getenv('DEFINITION_THRESHOLD', '0.7')))
+
+class CourseIn(BaseModel):
+    text: str
+    title: Optional[str] = None
+
+@app.post("/courses")
+def upload_course(inp: CourseIn):
+    if not (inp.text or '').strip():
+        return {"error": "empty_course"}
+    course = COURSES.put(inp.text, inp.title)
+    meta = course.meta()
+    if _PREGENERATE:
+        # MCQs and sheets are generated in the background; a re-upload reuses the existing jobs
+        if not JOBS.has_jobs(course.id):
+            _enqueue_course_jobs(course)
+        meta["jobs"] = f"/courses/{course.id}/jobs"
+    return meta
+
+@app.get("/courses/{course_id}")
+def get_course(course_id: str):
+    course = COURSES.get(course_id)
+    if course is None:
+        return JSONResponse({"error": "not_found"}, status_code=404)
+    return course.meta()
+
+# === Spaced repetition: native scheduler for the srs-plan task ===
+import srs as _srs
+SRS_DIR = os.path.join(os.path.dirname(__file__), 'db', 'srs')
+# Decks kept in memory (least recently used first); the others are loaded again from disk
+from collections import OrderedDict
+_SRS_DECKS: "OrderedDict[str, Any]" = OrderedDict()
+_SRS_IN_USE: Dict[str, int] = {}
+_SRS_LOCK = threading.Lock()
+_SRS_MAX_DECKS = int(os.getenv('SRS_MAX_DECKS', '1000'))
+
+@contextmanager
+def _srs_deck(deck: str):
+    """Per-student card state, kept in memory and saved under server/db/srs/<deck>.json.
+
+    Yields None for an invalid deck name. One store per deck, and a deck is never
+    evicted while a request uses it, so concurrent updates land in the same store.
+    """
+    if not re.fullmatch(r"[A-Za-z0-9_-]{1,64}", deck or ""):
+        yield None
+        return
+    with _SRS_LOCK:
+        st = _SRS_DECKS.get(deck)
+        if st is None:
+            st = _SRS_DECKS[deck] = _srs.SrsStore.load(os.path.join(SRS_DIR, f"{deck}.json"))
+        _SRS_DECKS.move_to_end(deck)
+        _SRS_IN_USE[deck] = _SRS_IN_USE.get(deck, 0) + 1
+        # Idle decks are already saved (after every plan)
+        for name in [n for n in _SRS_DECKS if n not in _SRS_IN_USE][:max(0, len(_SRS_DECKS) - _SRS_MAX_DECKS)]:
+            del _SRS_DECKS[name]
+    try:
+        yield st
+    finally:
+        with _SRS_LOCK:
+            n = _SRS_IN_USE[deck] - 1
+            if n:
+                _SRS_IN_USE[deck] = n
+            else:
+                del _SRS_IN_USE[deck]
+
+class SrsPlanIn(BaseModel):
+    items_stats: List[Dict[str, Any]] = []
+    deck: Optional[str] = None
+    now: Optional[str] = None
+    days: int = 10
+    max_per_day: Optional[int] = None
+
+def _srs_plan(inp: SrsPlanIn) -> Dict[str, Any]:
+    if not inp.deck:
+        return _srs.plan(inp.items_stats, now=_srs.parse_time(inp.now), days=inp.days, max_per_day=inp.max_per_day)
+    with _srs_deck(inp.deck) as store:
+        if store is None:
+            return {"status": "error", "error": "invalid_deck"}
+        out = _srs.plan(inp.items_stats, now=_srs.parse_time(inp.now), days=inp.days, max_per_day=inp.max_per_day, store=store)
+        with store.lock:
+            store.save(os.path.join(SRS_DIR, f"{inp.deck}.json"))
+    return out
+
+@app.post("/srs/plan")
+def srs_plan(inp: SrsPlanIn):
+    with tracing.span("srs"):
+        return _srs_plan(inp)
+
+@app.get("/srs/due/{deck}")
+def srs_due(deck: str, limit: int = 50):
+    import time
+    with _srs_deck(deck) as store:
+        if store is None:
+            return JSONResponse({"error": "invalid_deck"}, status_code=400)
+        with store.lock:
+            return {"deck": deck, "due": store.due_now(time.time(), limit=limit), "cards": len(store)}
+
+# === MCQ grading: answer keys compiled once, whole attempts graded with array operations ===
+from mcq_grading import HintJobs, InvalidIndex, KeyCache, grade as _grade_mcq
+MCQ_KEYS = KeyCache()
+
+def _hint_generate(prompt: str) -> str:
+    with _leased_model(lambda: tinyllama_model or qwen_model) as model_obj:
+        if model_obj is None:
+            raise RuntimeError("IA interne indisponible")
+        # Same model lock as chat requests: hints run on their own thread
+        text, _n = _chat_generate(model_obj, prompt, {"max_new_tokens": 64}, GenerationBudget())
+    return _postprocess_answer(text)
+
+MCQ_HINTS = HintJobs(_hint_generate)
+
+@app.on_event("shutdown")
+def _stop_mcq_hints():
+    MCQ_HINTS.close()
+
+class GradeIn(BaseModel):
+    mcq: Optional[Dict[str, Any]] = None
+    quiz_id: Optional[str] = None
+    answers: Optional[Any] = None
+    attempts: Optional[List[Any]] = None
+    details: bool = True
+    hints: bool = False
+
+@app.post("/mcq/grade")
+def mcq_grade(inp: GradeIn):
+    with tracing.span("grade"):
+        try:
+            key = MCQ_KEYS.compile(inp.mcq) if inp.mcq else MCQ_KEYS.get(inp.quiz_id or '')
+            if key is None:
+                return {"status": "error", "error": "quiz_not_found"}
+            attempts = inp.attempts if inp.attempts is not None else [inp.answers or []]
+            out = _grade_mcq(key, attempts, details=inp.details)
+        except InvalidIndex as e:
+            return JSONResponse({"status": "error", "error": "invalid_index", "detail": str(e)}, status_code=400)
+    if inp.hints and inp.details and len(attempts) == 1:
+        # Personalised hints are optional and never delay the grade: poll /mcq/hints/<job>
+        out["hint_job"] = MCQ_HINTS.submit(key, out["attempts"][0])
+    return out
+
+@app.get("/mcq/hints/{job_id}")
+def mcq_hints(job_id: str):
+    job = MCQ_HINTS.get(job_id)
+    if job is None:
+        return JSONResponse({"error": "not_found"}, status_code=404)
+    return job
+
+# === Background pre-generation: extract → sheets, and MCQs, per course section (persistent job queue) ===
+from jobs import JobError, JobQueue
+from pregeneration import course_sections, extract_prompt, first_json, mcq_prompt, sheet_cards, sheet_prompt
+JOBS_DIR = os.path.join(os.path.dirname(__file__), 'db', 'jobs')
+# Opt-in: with an in-process model a job holds the model lock for a whole generation, ahead of chat requests
+_PREGENERATE = os.getenv('PREGENERATE', '0') == '1'
+_JOB_WORKERS = int(os.getenv('JOB_WORKERS', '1') or 0)
+# Words of course text per section job, MCQs asked per section, generation budget per job
+_JOB_SECTION_WORDS = int(os.getenv('JOB_SECTION_WORDS', '1200'))
+_JOB_MCQ_N = int(os.getenv('JOB_MCQ_N', '5'))
+_JOB_MAX_TOKENS = int(os.getenv('JOB_MAX_TOKENS', '1200'))
+
+def _job_generate(prompt: str, field: str) -> Dict[str, Any]:
+    picked: List[str] = []
+
+    def select() -> Any:
+        # Structured output: prefer the stronger loaded model (named as read: it may be swapped out meanwhile)
+        name, obj = ("qwen2", qwen_model) if qwen_model is not None else ("tinyllama", tinyllama_model)
+        picked.append(name)
+        return obj
+    with _leased_model(select) as model_obj:
+        if model_obj is None:
+            raise JobError("IA interne indisponible")
+        cfg = _QWEN_CFG if picked[0] == "qwen2" else _TINY_CFG
+        gen_kwargs: Dict[str, Any] = {**{k: v for k, v in cfg.items() if k in _TINY_GEN_KEYS}, "max_new_tokens": _JOB_MAX_TOKENS}
+        if hasattr(model_obj, 'submit'):
+            raw, _usage = model_obj.submit(prompt, **gen_kwargs).result()
+            text = _ensure_text(raw)
+        else:
+            text, _n = _generate_local(model_obj, prompt, gen_kwargs)
+    obj = first_json(text, field)
+    if obj is None:
+        raise JobError(f"no JSON object with '{field}' in model output")
+    return obj
+
+def _job_validate(kind: str, out: Dict[str, Any]) -> Dict[str, Any]:
+    if out.get('status') == 'insufficient_context':
+        return out
+    res = _validate_kind(kind, out)
+    if not res["ok"]:
+        raise JobError(f"invalid {kind}: " + "; ".join(str(e)[:200] for e in res["errors"][:5]))
+    return out
+
+def _job_extract(job: Dict[str, Any], queue: JobQueue) -> Dict[str, Any]:
+    p = job["payload"]
+    out = _job_generate(extract_prompt(p.get("passages") or [], p.get("section_title") or ""), 'themes')
+    if out.get('status') != 'insufficient_context' and not (isinstance(out.get('themes'), list) and out['themes']):
+        raise JobError("invalid extract: themes empty")
+    return out
+
+def _job_mcq(job: Dict[str, Any], queue: JobQueue) -> Dict[str, Any]:
+    p = job["payload"]
+    return _job_validate('mcq', _job_generate(mcq_prompt(p.get("passages") or [], p.get("n") or _JOB_MCQ_N), 'items'))
+
+def _job_sheet(job: Dict[str, Any], queue: JobQueue) -> Dict[str, Any]:
+    extract = queue.dependency_result(job)
+    if extract is None:
+        raise JobError("extract result missing")
+    if extract.get('status') == 'insufficient_context':
+        return {"status": "insufficient_context", "sheets": []}
+    out = _job_validate('sheet', _job_generate(sheet_prompt(extract.get('themes') or []), 'sheets'))
+    if out.get('sheets'):
+        # Also published as a study-sheet page, like POST /sheets
+        p = job["payload"]
+        title = " — ".join(t for t in (p.get('course_title'), p.get('section_title')) if t) or "Fiches"
+        out["published"] = _save_sheets({"title": title, "sheets": sheet_cards(out['sheets'])})
+    return out
+
+JOBS = JobQueue(JOBS_DIR, handlers={'extract': _job_extract, 'mcq': _job_mcq, 'sheet': _job_sheet},
+                max_attempts=int(os.getenv('JOB_MAX_ATTEMPTS', '3')), backoff_s=float(os.getenv('JOB_BACKOFF_S', '2')))
+
+def _enqueue_course_jobs(course: Any) -> None:
+    for i, (title, passages) in enumerate(course_sections(course.chunks, _JOB_SECTION_WORDS)):
+        base = {"course_title": course.title, "section_title": title}
+        ext = JOBS.enqueue(course.id, 'extract', {**base, "passages": passages}, section=i)
+        JOBS.enqueue(course.id, 'sheet', base, section=i, depends_on=ext)
+        JOBS.enqueue(course.id, 'mcq', {**base, "passages": passages, "n": _JOB_MCQ_N}, section=i)
+
+@app.on_event("startup")
+def _start_jobs():
+    if _JOB_WORKERS > 0:
+        if JOBS.recovered:
+            print(f"↻ {JOBS.recovered} job(s) interrompu(s) remis en file")
+        JOBS.start(_JOB_WORKERS)
+
+@app.on_event("shutdown")
+def _stop_jobs():
+    JOBS.stop()
+
+@app.get("/courses/{course_id}/jobs")
+def course_jobs(course_id: str):
+    jobs = JOBS.for_course(course_id)
+    counts: Dict[str, int] = {}
+    for j in jobs:
+        counts[j["status"]] = counts.get(j["status"], 0) + 1
+    return {"course_id": course_id, "counts": counts, "jobs": jobs}
+
+@app.get("/jobs/{job_id}")
+def job_status(job_id: str):
+    job = JOBS.get(job_id)
+    if job is None:
+        return JSONResponse({"error": "not_found"}, status_code=404)
+    return job
+
+@app.get("/jobs/{job_id}/result")
+def job_result(job_id: str):
+    job = JOBS.get(job_id)
+    if job is None:
+        return JSONResponse({"error": "not_found"}, status_code=404)
+    if job["status"] != 'done':
+        return JSONResponse({"error": "not_ready", "status": job["status"], "job_error": job["error"]}, status_code=409)
+    return JOBS.result(job_id) or JSONResponse({"error": "result_missing"}, status_code=410)
+
 # === Publish & Serve Study Sheets ===
 STORAGE_DIR = os.path.join(os.path.dirname(__file__), 'db', 'sheets')
 os.makedirs(STORAGE_DIR, exist_ok=True)
 
+from sheet_store import SheetStore
+SHEETS = SheetStore(STORAGE_DIR)
+# Browsers reuse a page this long, then revalidate it with If-None-Match (a 304 while unchanged)
+_SHEETS_CACHE_CONTROL = f"public, max-age={int(os.getenv('SHEETS_MAX_AGE', '60'))}"
+
 class SheetCard(BaseModel):
     title: str
     summary: Optional[str] = None
@@ -642,58 +1614,47 @@ class SheetPayload(BaseModel):
     title: Optional[str] = "Fiches"
     sheets: List[SheetCard]
 
+def _save_sheets(data: Dict[str, Any]) -> Dict[str, str]:
+    # Publishing the same sheets twice returns the first id
+    sid, _created = SHEETS.put(data)
+    return {"id": sid, "url": f"/sheets/{sid}", "api": f"/api/sheets/{sid}"}
+
+def _conditional(request: Request, body: bytes, body_gz: bytes, etag: str, media_type: str) -> Response:
+    """304 when the client already has this version, else the body (pre-gzipped when accepted)."""
+    gz = 'gzip' in (request.headers.get('accept-encoding') or '').lower()
+    # Each encoding is its own representation, hence its own strong validator
+    etag_gz = etag[:-1] + '-gz"'
+    headers = {"ETag": etag_gz if gz else etag, "Cache-Control": _SHEETS_CACHE_CONTROL, "Vary": "Accept-Encoding"}
+    inm = request.headers.get('if-none-match') or ''
+    tags = [t.strip().removeprefix('W/') for t in inm.split(',')]
+    if inm.strip() == '*' or etag in tags or etag_gz in tags:
+        return Response(status_code=304, headers=headers)
+    if gz:
+        return Response(body_gz, media_type=media_type, headers={**headers, "Content-Encoding": "gzip"})
+    return Response(body, media_type=media_type, headers=headers)
+
 @app.post("/sheets")
 def publish_sheets(payload: SheetPayload):
-    sid = uuid.uuid4().hex[:10]
-    data = payload.dict()
-    path = os.path.join(STORAGE_DIR, f"{sid}.json")
-    with open(path, 'w', encoding='utf-8') as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
-    return {"id": sid, "url": f"/sheets/{sid}", "api": f"/api/sheets/{sid}"}
+    return _save_sheets(payload.dict())
+
+@app.get("/api/sheets")
+def list_sheets(limit: int = 50, offset: int = 0):
+    return SHEETS.list(limit=max(1, min(limit, 500)), offset=max(0, offset))
+
+@app.get("/api/sheets/search")
+def search_sheets(q: str = "", limit: int = 20):
+    return {"q": q, "items": SHEETS.search(q, limit=max(1, min(limit, 100)))}
 
 @app.get("/api/sheets/{sid}")
-def get_sheets_json(sid: str):
-    path = os.path.join(STORAGE_DIR, f"{sid}.json")
-    if not os.path.exists(path):
+def get_sheets_json(sid: str, request: Request):
+    r = SHEETS.rendered(sid)
+    if r is None:
         return {"error": "not_found"}
-    with open(path, 'r', encoding='utf-8') as f:
-        return json.load(f)
+    return _conditional(request, r.body, r.body_gz, r.etag, 'application/json')
 
 @app.get("/sheets/{sid}")
-def get_sheets_html(sid: str):
-    path = os.path.join(STORAGE_DIR, f"{sid}.json")
-    if not os.path.exists(path):
+def get_sheets_html(sid: str, request: Request):
+    r = SHEETS.rendered(sid)
+    if r is None:
         return Response("<h1>404</h1><p>Fiches introuvables.</p>", media_type='text/html', status_code=404)
-    with open(path, 'r', encoding='utf-8') as f:
-        data = json.load(f)
-    title = (data.get('title') or 'Fiches')
-    cards = data.get('sheets') or []
-    # Minimal embedded CSS for portability
-    css = """
-    body{font-family:Inter,Segoe UI,system-ui,-apple-system,Arial,sans-serif;background:#f6f7fb;color:#1f2937;margin:0}
-    .container{max-width:900px;margin:20px auto;padding:16px}
-    h1{font-size:22px}
-    .card{background:#fff;border:1px solid #e5e7f2;border-radius:14px;box-shadow:0 6px 20px rgba(20,30,58,.08);padding:14px 16px;margin:12px 0}
-    .card h3{margin:0 0 8px 0}
-    .meta{opacity:.7;margin-top:6px}
-    """
-    html_cards = []
-    for c in cards:
-        h = f"""
-        <article class=card>
-          <h3>{(c.get('title') or '').replace('<','&lt;')}</h3>
-          <p>{(c.get('summary') or '').replace('\n','<br>').replace('<','&lt;')}</p>
-          {f"<details><summary>Voir plus</summary><div>{(c.get('full') or '').replace('<','&lt;').replace('\n','<br>')}</div></details>" if c.get('full') else ''}
-        </article>
-        """
-        html_cards.append(h)
-    doc = f"""
-    <!doctype html><html lang=fr><head><meta charset=utf-8><meta name=viewport content="width=device-width,initial-scale=1">
-    <title>{title}</title><style>{css}</style></head><body>
-      <div class=container>
-        <h1>{title}</h1>
-        {''.join(html_cards)}
-      </div>
-    </body></html>
-    """
-    return Response(doc, media_type='text/html')
\ No newline at end of file
+    return _conditional(request, r.html, r.html_gz, r.etag, 'text/html; charset=utf-8')
\ No newline at end of file
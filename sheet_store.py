@@ -0,0 +1,250 @@
+from __future__ import annotations
+from collections import OrderedDict
+from html import escape
+from typing import Any, Dict, List, Optional, Tuple
+import os, re, json, gzip, time, hashlib, sqlite3, threading
+
+# Bump when the page markup changes: cached pages of an older version are rendered again
+RENDER_VERSION = 1
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sheets (
+    id TEXT PRIMARY KEY,
+    hash TEXT NOT NULL,
+    title TEXT NOT NULL,
+    cards INTEGER NOT NULL,
+    body TEXT NOT NULL,
+    body_gz BLOB NOT NULL,
+    html BLOB NOT NULL,
+    html_gz BLOB NOT NULL,
+    render_version INTEGER NOT NULL,
+    created REAL NOT NULL,
+    updated REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS sheets_hash ON sheets (hash);
+CREATE INDEX IF NOT EXISTS sheets_updated ON sheets (updated);
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+"""
+_FTS_SCHEMA = ("CREATE VIRTUAL TABLE IF NOT EXISTS sheets_fts USING fts5("
+               "id UNINDEXED, title, text, tokenize='unicode61 remove_diacritics 2')")
+
+_CSS = """
+    body{font-family:Inter,Segoe UI,system-ui,-apple-system,Arial,sans-serif;background:#f6f7fb;color:#1f2937;margin:0}
+    .container{max-width:900px;margin:20px auto;padding:16px}
+    h1{font-size:22px}
+    .card{background:#fff;border:1px solid #e5e7f2;border-radius:14px;box-shadow:0 6px 20px rgba(20,30,58,.08);padding:14px 16px;margin:12px 0}
+    .card h3{margin:0 0 8px 0}
+    .meta{opacity:.7;margin-top:6px}
+    """
+
+
+def _multiline(text: str) -> str:
+    return escape(text).replace('\n', '<br>')
+
+
+def render_html(data: Dict[str, Any]) -> str:
+    """The /sheets/<id> page: one card per sheet, full text folded under "Voir plus"."""
+    title = escape(data.get('title') or 'Fiches')
+    cards = []
+    for c in data.get('sheets') or []:
+        full = f"<details><summary>Voir plus</summary><div>{_multiline(c.get('full') or '')}</div></details>" if c.get('full') else ''
+        cards.append(f"""
+        <article class=card>
+          <h3>{escape(c.get('title') or '')}</h3>
+          <p>{_multiline(c.get('summary') or '')}</p>
+          {full}
+        </article>
+        """)
+    return f"""
+    <!doctype html><html lang=fr><head><meta charset=utf-8><meta name=viewport content="width=device-width,initial-scale=1">
+    <title>{title}</title><style>{_CSS}</style></head><body>
+      <div class=container>
+        <h1>{title}</h1>
+        {''.join(cards)}
+      </div>
+    </body></html>
+    """
+
+
+def content_hash(data: Dict[str, Any]) -> str:
+    return hashlib.sha256(json.dumps(data, ensure_ascii=False, sort_keys=True, separators=(',', ':')).encode('utf-8')).hexdigest()
+
+
+def _gz(raw: bytes) -> bytes:
+    return gzip.compress(raw, compresslevel=9, mtime=0)
+
+
+def _search_text(data: Dict[str, Any]) -> str:
+    parts = []
+    for c in data.get('sheets') or []:
+        parts.extend(str(c.get(k) or '') for k in ('title', 'summary', 'full'))
+    return '\n'.join(parts)
+
+
+class Rendered:
+    """What a view needs: identity (ETag) plus the JSON and HTML bodies, plain and gzipped."""
+    __slots__ = ("id", "hash", "etag", "body", "body_gz", "html", "html_gz")
+
+    def __init__(self, sid: str, h: str, body: bytes, body_gz: bytes, html: bytes, html_gz: bytes):
+        self.id, self.hash, self.etag = sid, h, f'"{h[:20]}-{RENDER_VERSION}"'
+        self.body, self.body_gz, self.html, self.html_gz = body, body_gz, html, html_gz
+
+
+class SheetStore:
+    """Published study sheets in SQLite, one row per id, deduplicated by content hash.
+
+    Publishing renders the HTML page once and stores it gzipped next to the JSON,
+    so a view is one primary-key lookup (or an in-memory hit for popular links,
+    served only while the row's hash is unchanged: another process, such as the
+    batch CLI, may have republished it).
+    Titles and card text are indexed with FTS5 when SQLite has it. The JSON files
+    of the former one-file-per-sheet layout found in `root` are imported once.
+    """
+
+    def __init__(self, root: str, hot: int = 256):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+        self._db = sqlite3.connect(os.path.join(root, "sheets.sqlite3"), check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(_SCHEMA)
+        try:
+            self._db.execute(_FTS_SCHEMA)
+            self.fts = True
+        except sqlite3.OperationalError:
+            self.fts = False
+        self._lock = threading.Lock()
+        self._hot: "OrderedDict[str, Rendered]" = OrderedDict()
+        self.hot_size = hot
+        self.imported = self._import_json_files()
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+    # One connection shared by the request threads: every statement runs under the lock
+    def _query(self, sql: str, args: tuple = ()) -> List[tuple]:
+        with self._lock:
+            return self._db.execute(sql, args).fetchall()
+
+    def _import_json_files(self) -> int:
+        if self._query("SELECT 1 FROM meta WHERE key='imported_json'"):
+            return 0
+        n = 0
+        for name in sorted(os.listdir(self.root)):
+            if not name.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(self.root, name), "r", encoding="utf-8") as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                continue
+            if isinstance(data, dict):
+                self.put(data, sid=name[:-5])
+                n += 1
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('imported_json', ?)", (str(n),))
+        return n
+
+    # --- writing ---
+    def put(self, data: Dict[str, Any], sid: Optional[str] = None) -> Tuple[str, bool]:
+        """Store sheets; returns (id, created). Without an explicit id, identical content reuses its id."""
+        h = content_hash(data)
+        if sid is None:
+            same = self._query("SELECT id FROM sheets WHERE hash=? LIMIT 1", (h,))
+            if same:
+                return same[0][0], False
+            sid = h[:10]
+        body = json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        html = render_html(data).encode('utf-8')
+        now = time.time()
+        title = str(data.get('title') or 'Fiches')
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                self._db.execute(
+                    "INSERT INTO sheets (id, hash, title, cards, body, body_gz, html, html_gz, render_version, created, updated) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?) ON CONFLICT(id) DO UPDATE SET hash=excluded.hash, "
+                    "title=excluded.title, cards=excluded.cards, body=excluded.body, body_gz=excluded.body_gz, "
+                    "html=excluded.html, html_gz=excluded.html_gz, render_version=excluded.render_version, "
+                    "updated=excluded.updated",
+                    (sid, h, title, len(data.get('sheets') or []), body.decode('utf-8'), _gz(body), html, _gz(html),
+                     RENDER_VERSION, now, now))
+                if self.fts:
+                    self._db.execute("DELETE FROM sheets_fts WHERE id=?", (sid,))
+                    self._db.execute("INSERT INTO sheets_fts (id, title, text) VALUES (?, ?, ?)",
+                                     (sid, title, _search_text(data)))
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+            self._hot.pop(sid, None)
+        return sid, True
+
+    # --- reading ---
+    def exists(self, sid: str) -> bool:
+        return sid in self._hot or bool(self._query("SELECT 1 FROM sheets WHERE id=?", (sid,)))
+
+    def get(self, sid: str) -> Optional[Dict[str, Any]]:
+        r = self.rendered(sid)
+        return json.loads(r.body) if r is not None else None
+
+    def _current_hash(self, sid: str) -> Optional[str]:
+        # Caller holds the lock
+        row = self._db.execute("SELECT hash FROM sheets WHERE id=?", (sid,)).fetchone()
+        return row[0] if row else None
+
+    def rendered(self, sid: str) -> Optional[Rendered]:
+        with self._lock:
+            r = self._hot.get(sid)
+            if r is not None:
+                if r.hash == self._current_hash(sid):
+                    self._hot.move_to_end(sid)
+                    return r
+                del self._hot[sid]
+        rows = self._query("SELECT hash, body, body_gz, html, html_gz, render_version FROM sheets WHERE id=?", (sid,))
+        if not rows:
+            return None
+        h, body, body_gz, html, html_gz, version = rows[0]
+        if version != RENDER_VERSION:
+            html = render_html(json.loads(body)).encode('utf-8')
+            html_gz = _gz(html)
+            with self._lock:
+                self._db.execute("UPDATE sheets SET html=?, html_gz=?, render_version=? WHERE id=? AND hash=?",
+                                 (html, html_gz, RENDER_VERSION, sid, h))
+        r = Rendered(sid, h, body.encode('utf-8'), body_gz, html, html_gz)
+        with self._lock:
+            # A put() since the read above: keep its version out of the hot set
+            if self._current_hash(sid) == h:
+                self._hot[sid] = r
+                while len(self._hot) > self.hot_size:
+                    self._hot.popitem(last=False)
+        return r
+
+    def list(self, limit: int = 50, offset: int = 0) -> Dict[str, Any]:
+        rows = self._query("SELECT id, title, cards, created, updated FROM sheets ORDER BY updated DESC LIMIT ? OFFSET ?",
+                           (int(limit), int(offset)))
+        total = self._query("SELECT COUNT(*) FROM sheets")[0][0]
+        return {"total": total, "items": [self._summary(r) for r in rows]}
+
+    def search(self, q: str, limit: int = 20) -> List[Dict[str, Any]]:
+        """Sheets whose title or cards contain every word of `q` (accents and case ignored, prefix match)."""
+        words = re.findall(r"\w+", q or "")
+        if not words:
+            return []
+        if self.fts:
+            match = " ".join(f'"{w}"*' for w in words)
+            rows = self._query("SELECT s.id, s.title, s.cards, s.created, s.updated FROM sheets_fts f "
+                               "JOIN sheets s ON s.id = f.id WHERE sheets_fts MATCH ? ORDER BY f.rank LIMIT ?",
+                               (match, int(limit)))
+        else:
+            where = " AND ".join("(title LIKE ? OR body LIKE ?)" for _ in words)
+            args = [a for w in words for a in (f"%{w}%", f"%{w}%")]
+            rows = self._query(f"SELECT id, title, cards, created, updated FROM sheets WHERE {where} "
+                               "ORDER BY updated DESC LIMIT ?", (*args, int(limit)))
+        return [self._summary(r) for r in rows]
+
+    @staticmethod
+    def _summary(row: tuple) -> Dict[str, Any]:
+        sid, title, cards, created, updated = row
+        return {"id": sid, "title": title, "cards": cards, "created": created, "updated": updated,
+                "url": f"/sheets/{sid}", "api": f"/api/sheets/{sid}"}
@@ -0,0 +1,222 @@
+from __future__ import annotations
+from array import array
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from functools import lru_cache
+import heapq, json, os, threading
+
+DAY = 86400.0
+# Target probability of recall when a card comes due (FSRS: interval == stability at 90%)
+RETENTION = 0.9
+_DIFF = {"easy": 0, "medium": 1, "hard": 2}
+# Stability (days) after a first correct answer, and its growth factor on each later one (SM-2 ease)
+INITIAL_STABILITY = (4.0, 2.5, 1.0)
+EASE = (2.8, 2.3, 1.7)
+# A lapse keeps this share of the stability (never below MIN_STABILITY)
+LAPSE_FACTOR = 0.2
+MIN_STABILITY = 0.5
+
+
+def parse_time(value: Any) -> Optional[float]:
+    """ISO 8601 (with 'Z' or offset; naive = UTC) or epoch seconds → epoch seconds."""
+    if value is None or value == "":
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    return _parse_iso(str(value).strip())
+
+
+@lru_cache(maxsize=4096)
+def _parse_iso(s: str) -> Optional[float]:
+    # Cached: a deck's last_seen values repeat a lot (same session, same day)
+    if s.endswith("Z"):
+        s = s[:-1] + "+00:00"
+    try:
+        dt = datetime.fromisoformat(s)
+    except ValueError:
+        return None
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.timestamp()
+
+
+@lru_cache(maxsize=8192)
+def format_time(ts: float) -> str:
+    return datetime.fromtimestamp(ts, timezone.utc).isoformat(timespec="seconds").replace("+00:00", "Z")
+
+
+def retrievability(elapsed_days: float, stability: float) -> float:
+    """FSRS power forgetting curve: 0.9 after `stability` days."""
+    return (1.0 + max(0.0, elapsed_days) / (9.0 * stability)) ** -1
+
+
+class SrsStore:
+    """Per-card scheduling state in parallel typed arrays, plus a lazy due-queue heap.
+
+    One row per card id: stability (days), difficulty code, due and last review
+    (epoch seconds), review and lapse counts. Reviews are applied only when newer
+    than the stored one, so posting the same `items_stats` twice is a no-op.
+    """
+
+    def __init__(self) -> None:
+        self.ids: List[str] = []
+        self.index: Dict[str, int] = {}
+        self.stability = array("d")
+        self.difficulty = array("b")
+        self.due = array("d")
+        self.last = array("d")
+        self.reps = array("H")
+        self.lapses = array("H")
+        self._heap: List[Tuple[float, int]] = []
+        self.lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def _row(self, cid: str, diff: int, now: float) -> int:
+        i = self.index.get(cid)
+        if i is None:
+            i = self.index[cid] = len(self.ids)
+            self.ids.append(cid)
+            self.stability.append(0.0)
+            self.difficulty.append(diff)
+            self.due.append(now)
+            self.last.append(0.0)
+            self.reps.append(0)
+            self.lapses.append(0)
+        return i
+
+    def review(self, cid: str, difficulty: str, correct: Optional[bool], seen: Optional[float], now: float) -> int:
+        """Apply one review (or register an unseen card) and return the card's row."""
+        diff = _DIFF.get(str(difficulty or "").lower(), 1)
+        i = self._row(cid, diff, now)
+        self.difficulty[i] = diff
+        if correct is not None and seen is not None and seen > self.last[i]:
+            s = self.stability[i]
+            if correct:
+                s = INITIAL_STABILITY[diff] if s <= 0 else s * EASE[diff]
+            else:
+                s = max(MIN_STABILITY, (s or INITIAL_STABILITY[diff]) * LAPSE_FACTOR)
+                self.lapses[i] = min(65535, self.lapses[i] + 1)
+            self.stability[i] = s
+            self.reps[i] = min(65535, self.reps[i] + 1)
+            self.last[i] = seen
+            self.due[i] = seen + s * DAY
+            heapq.heappush(self._heap, (self.due[i], i))
+        elif self.reps[i] == 0:
+            heapq.heappush(self._heap, (self.due[i], i))
+        return i
+
+    def priority(self, i: int, now: float) -> float:
+        """0..1: 1 once the card is due (recall probability down to RETENTION), more with lapses."""
+        if self.reps[i] == 0:
+            return 1.0
+        r = retrievability((now - self.last[i]) / DAY, self.stability[i])
+        p = (1.0 - r) / (1.0 - RETENTION) * (1.0 + 0.1 * min(self.lapses[i], 5))
+        return round(min(1.0, p), 3)
+
+    def due_now(self, now: float, limit: Optional[int] = None) -> List[str]:
+        """Ids due at `now`, earliest first (stale heap entries are skipped)."""
+        out, seen = [], set()
+        while self._heap and self._heap[0][0] <= now and (limit is None or len(out) < limit):
+            due, i = heapq.heappop(self._heap)
+            if due != self.due[i] or i in seen:
+                continue
+            seen.add(i)
+            out.append(self.ids[i])
+        # Popped cards stay due until reviewed again
+        for cid in out:
+            j = self.index[cid]
+            heapq.heappush(self._heap, (self.due[j], j))
+        return out
+
+    # --- persistence ---
+    def to_dict(self) -> Dict[str, Any]:
+        return {"ids": self.ids, "stability": self.stability.tolist(), "difficulty": self.difficulty.tolist(),
+                "due": self.due.tolist(), "last": self.last.tolist(), "reps": self.reps.tolist(),
+                "lapses": self.lapses.tolist()}
+
+    @classmethod
+    def from_dict(cls, d: Dict[str, Any]) -> "SrsStore":
+        st = cls()
+        st.ids = list(d.get("ids") or [])
+        st.index = {cid: i for i, cid in enumerate(st.ids)}
+        st.stability, st.difficulty = array("d", d["stability"]), array("b", d["difficulty"])
+        st.due, st.last = array("d", d["due"]), array("d", d["last"])
+        st.reps, st.lapses = array("H", d["reps"]), array("H", d["lapses"])
+        st._heap = [(st.due[i], i) for i in range(len(st.ids))]
+        heapq.heapify(st._heap)
+        return st
+
+    def save(self, path: str) -> None:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp = f"{path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str) -> "SrsStore":
+        if not os.path.exists(path):
+            return cls()
+        with open(path, "r", encoding="utf-8") as f:
+            return cls.from_dict(json.load(f))
+
+
+def plan(items_stats: Iterable[Dict[str, Any]], now: Optional[float] = None, days: int = 10,
+         max_per_day: Optional[int] = None, store: Optional[SrsStore] = None) -> Dict[str, Any]:
+    """Review schedule in the `srs-plan` prompt's shape: {"status", "schedule": [{id, next_review, priority}]}.
+
+    Every valid item appears once, ordered by review time. With `max_per_day`, each
+    day of the `days` horizon keeps its highest-priority due cards and the rest
+    move to the next day (past the horizon, cards keep their own date).
+    """
+    now = float(now if now is not None else datetime.now(timezone.utc).timestamp())
+    st = store if store is not None else SrsStore()
+    rows: Dict[int, None] = {}
+    skipped = 0
+    with st.lock:
+        for it in items_stats:
+            cid = str((it or {}).get("id") or "").strip() if isinstance(it, dict) else ""
+            if not cid:
+                skipped += 1
+                continue
+            res = str(it.get("last_result") or "").lower()
+            correct = True if res == "correct" else (False if res in ("incorrect", "partial", "wrong") else None)
+            rows[st.review(cid, it.get("difficulty") or "medium", correct, parse_time(it.get("last_seen")), now)] = None
+        # Due queue: (day offset, -priority, row); overdue cards are due today
+        day0 = now - (now % DAY)
+        queue: List[Tuple[int, float, int]] = []
+        for i in rows:
+            when = max(st.due[i], now)
+            queue.append((int((when - day0) // DAY), -st.priority(i, now), i))
+        heapq.heapify(queue)
+        out: List[Tuple[float, float, str]] = []
+
+        def place(i: int, day: int, neg_p: float) -> None:
+            when = max(st.due[i], now)
+            if (when - day0) // DAY < day:
+                when = day0 + day * DAY + (when % DAY)
+            out.append((when, neg_p, st.ids[i]))
+
+        if max_per_day:
+            # Day by day within the horizon: the `max_per_day` highest-priority cards among those due
+            backlog: List[Tuple[float, int]] = []
+            for day in range(days):
+                while queue and queue[0][0] <= day:
+                    _d, neg_p, i = heapq.heappop(queue)
+                    heapq.heappush(backlog, (neg_p, i))
+                for _n in range(min(max_per_day, len(backlog))):
+                    neg_p, i = heapq.heappop(backlog)
+                    place(i, day, neg_p)
+            for neg_p, i in backlog:
+                place(i, days, neg_p)
+        for day, neg_p, i in queue:
+            place(i, day, neg_p)
+    out.sort()
+    res: Dict[str, Any] = {"status": "ok", "schedule": [
+        {"id": cid, "next_review": format_time(when), "priority": -neg_p} for when, neg_p, cid in out
+    ]}
+    if skipped:
+        res["skipped"] = skipped
+    return res
@@ -0,0 +1,133 @@
+from __future__ import annotations
+from typing import Dict, Iterable, Optional, Tuple
+import os, re, glob, gzip, hashlib, mimetypes, threading
+
+try:  # optional: brotli variants are skipped without it (pip install brotli)
+    import brotli  # type: ignore
+except ImportError:  # pragma: no cover - depends on the environment
+    brotli = None
+
+_COMPRESSIBLE = ("text/", "application/javascript", "application/json", "image/svg+xml")
+# Relative references of the entry page and of stylesheets (not URLs, data: URIs or anchors)
+_REF_RE = re.compile(r'''(?P<attr>\b(?:src|href))=(?P<q>["'])(?P<ref>(?!https?:|data:|//|#|mailto:)[^"'?#]+)(?P=q)''')
+_CSS_URL_RE = re.compile(r'''url\((?P<q>["']?)(?P<ref>(?!https?:|data:|//|#)[^"')?#]+)(?P=q)\)''')
+
+
+def _media_type(path: str) -> str:
+    mt = mimetypes.guess_type(path)[0] or "application/octet-stream"
+    return f"{mt}; charset=utf-8" if mt.startswith("text/") or mt in ("application/javascript", "application/json") else mt
+
+
+class Asset:
+    """One static file in memory with its precompressed variants and a validator per variant."""
+    __slots__ = ("url", "media_type", "raw", "gz", "br", "digest", "mtime")
+
+    def __init__(self, url: str, raw: bytes, media_type: str, mtime: float = 0.0):
+        self.url, self.raw, self.media_type, self.mtime = url, raw, media_type, mtime
+        self.digest = hashlib.sha256(raw).hexdigest()
+        self.gz = self.br = None
+        if media_type.startswith(_COMPRESSIBLE) and len(raw) > 256:
+            gz = gzip.compress(raw, compresslevel=9, mtime=0)
+            self.gz = gz if len(gz) < len(raw) else None
+            if brotli is not None:
+                br = brotli.compress(raw, quality=11)
+                self.br = br if len(br) < len(raw) else None
+
+    def etag(self, encoding: Optional[str] = None) -> str:
+        return f'"{self.digest[:16]}{"-" + encoding if encoding else ""}"'
+
+    def negotiate(self, accept_encoding: str) -> Tuple[bytes, Optional[str]]:
+        """Smallest variant the client accepts: (body, content-encoding or None)."""
+        accepted = set()
+        for part in (accept_encoding or "").lower().split(","):
+            name, _sep, params = part.strip().partition(";")
+            if name and not re.search(r"q=0(?:\.0*)?\s*$", params):
+                accepted.add(name.strip())
+        if self.br is not None and "br" in accepted:
+            return self.br, "br"
+        if self.gz is not None and ("gzip" in accepted or "*" in accepted):
+            return self.gz, "gzip"
+        return self.raw, None
+
+
+def hashed_name(rel: str, digest: str) -> str:
+    stem, ext = os.path.splitext(rel)
+    return f"{stem}.{digest[:10]}{ext}"
+
+
+class AssetBundle:
+    """The front end (entry page + what it references) built once into content-hashed URLs.
+
+    `assets` maps hashed paths (served under `prefix` with a year-long immutable
+    Cache-Control) to files; the entry page and stylesheets are rewritten to
+    point at them, so any edit changes the URL instead of needing a cache purge.
+    `plain` keeps the original paths for references built at runtime by scripts.
+    """
+
+    def __init__(self, root: str, entry: str = "coach.html", prefix: str = "/static/",
+                 extra: Iterable[str] = ("*.png", "assets/*.png", "public/**/*.js")):
+        self.root, self.entry, self.prefix = root, entry, prefix
+        self.assets: Dict[str, Asset] = {}
+        self.plain: Dict[str, Asset] = {}
+        self._urls: Dict[str, str] = {}  # original relative path -> hashed URL
+        with open(os.path.join(root, entry), "r", encoding="utf-8") as f:
+            html = f.read()
+        refs = [m.group("ref") for m in _REF_RE.finditer(html)]
+        for pattern in extra:
+            refs.extend(os.path.relpath(p, root).replace(os.sep, "/")
+                        for p in glob.glob(os.path.join(root, pattern), recursive=True))
+        files = [r for r in dict.fromkeys(self._norm(r) for r in refs) if r and os.path.isfile(os.path.join(root, r))]
+        # Stylesheets last: their url(...) references must already have hashed URLs
+        for rel in sorted(files, key=lambda r: r.endswith(".css")):
+            self._add(rel)
+        self.page = Asset("/", self._rewrite(html, _REF_RE, ""), _media_type(entry))
+
+    @staticmethod
+    def _norm(ref: str) -> str:
+        if not ref or ref.startswith("/"):
+            return ""
+        rel = os.path.normpath(ref).replace(os.sep, "/")
+        return "" if rel.startswith("..") else rel
+
+    def _rewrite(self, text: str, pattern: "re.Pattern[str]", base: str) -> bytes:
+        def sub(m: "re.Match[str]") -> str:
+            url = self._urls.get(self._norm(os.path.join(base, m.group("ref"))))
+            return m.group(0) if url is None else m.group(0).replace(m.group("ref"), url)
+        return pattern.sub(sub, text).encode("utf-8")
+
+    def _add(self, rel: str) -> None:
+        path = os.path.join(self.root, rel)
+        with open(path, "rb") as f:
+            raw = f.read()
+        if rel.endswith(".css"):
+            raw = self._rewrite(raw.decode("utf-8"), _CSS_URL_RE, os.path.dirname(rel))
+        name = hashed_name(rel, hashlib.sha256(raw).hexdigest())
+        asset = Asset(self.prefix + name, raw, _media_type(rel), os.path.getmtime(path))
+        self.assets[name] = asset
+        self.plain[rel] = asset
+        self._urls[rel] = asset.url
+
+    def manifest(self) -> Dict[str, str]:
+        return dict(self._urls)
+
+
+class FileCache:
+    """Files kept in memory as Assets, read again only when their mtime changes."""
+
+    def __init__(self) -> None:
+        self._items: Dict[str, Asset] = {}
+        self._lock = threading.Lock()
+
+    def get(self, path: str) -> Optional[Asset]:
+        try:
+            mtime = os.stat(path).st_mtime
+        except OSError:
+            return None
+        a = self._items.get(path)
+        if a is None or a.mtime != mtime:
+            with open(path, "rb") as f:
+                a = Asset(path, f.read(), _media_type(path), mtime)
+            with self._lock:
+                self._items[path] = a
+        return a
+
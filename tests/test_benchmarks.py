@@ -0,0 +1,47 @@
+from fake_provider import FakeLLMProvider
+from benchmarks.endpoints import compare, run_suite
+
+
+def test_fake_provider_is_deterministic():
+    p = FakeLLMProvider(max_new_tokens=5)
+    assert p.generate("a b c") == p("a b c") == "".join(p.stream("x y"))
+    assert len(p.generate("q", max_new_tokens=3).split()) == 3
+
+
+def test_suite_runs_offline_and_flags_regressions():
+    report = run_suite(requests=6, concurrency=2, only=["api_chat", "validate_mcq"], token_ms=0.0)
+    assert set(report["scenarios"]) == {"api_chat", "validate_mcq"}
+    assert all(r["errors"] == 0 for r in report["scenarios"].values())
+    base = {"scenarios": {"api_chat": {"p95_ms": 1e-6, "rps": 1e9}}}
+    problems = compare(report, base, tolerance=0.25)
+    assert any("p95" in p for p in problems) and any("débit" in p for p in problems)
+    assert compare(report, report) == []
+    # A slower reference route (busy host) relaxes the limits by the same factor, a faster one never tightens them
+    base = {"scenarios": {"api_chat": {"p95_ms": 100.0, "rps": 10.0, "ref_ms": 5.0}}}
+    busy = {"scenarios": {"api_chat": {"p95_ms": 180.0, "rps": 6.0, "ref_ms": 10.0}}}
+    idle = {"scenarios": {"api_chat": {"p95_ms": 180.0, "rps": 6.0, "ref_ms": 2.0}}}
+    assert compare(busy, base) == [] and len(compare(idle, base)) == 2
+    # A few milliseconds on a fast route are jitter, not a regression
+    fast = {"scenarios": {"sheets_publish": {"p95_ms": 16.0, "rps": 560.0}}}
+    assert compare({"scenarios": {"sheets_publish": {"p95_ms": 30.0, "rps": 400.0}}}, fast) == []
+
+
+def test_chunking_benchmark_reports_throughput_and_rss():
+    from benchmarks.chunking import run
+    report = run(words=20000, variants=["streaming"])
+    r = report["variants"]["streaming"]
+    assert r["chunks"] > 50 and r["mb_per_s"] > 0 and r["peak_rss_mb"] > 0
+
+
+def test_validation_benchmark_counts_the_same_invalid_payloads():
+    from benchmarks.validation import run
+    report = run(n=40, variants=["legacy", "compiled", "batch_endpoint"])
+    rows = report["variants"]
+    assert rows["legacy"]["invalid"] == rows["compiled"]["invalid"] == rows["batch_endpoint"]["invalid"] == 10
+    assert all(r["per_s"] > 0 for r in rows.values())
+
+
+def test_extraction_benchmark_matches_the_former_function():
+    from benchmarks.extraction import run
+    report = run(docs=6, words=800, variants=["legacy", "engine", "batch_inline"])
+    assert report["same_output"] and all(r["mb_per_s"] > 0 for r in report["variants"].values())
@@ -0,0 +1,29 @@
+import time
+import calibration
+
+
+class _FakeLLM:
+    """Timings depend on settings: 4 threads decode fastest, bigger batches eval prompts faster."""
+
+    def tokenize(self, text):
+        return list(range(len(text.split())))
+
+    def reset(self):
+        pass
+
+    def sample(self, **_):
+        return 1
+
+    def eval(self, tokens, batch_size=8, threads=1):
+        per_tok = 0.0002 * (1 + abs(threads - 4)) if len(tokens) == 1 else 0.00002 * 64 / max(8, batch_size)
+        time.sleep(per_tok * len(tokens))
+
+
+def test_calibrate_picks_fastest_and_roundtrips(tmp_path, monkeypatch):
+    monkeypatch.setattr(calibration, "PROFILE_DIR", str(tmp_path))
+    result = calibration.calibrate(_FakeLLM(), threads=[1, 4, 8], batch_sizes=[8, 64], prompt_tokens=64, decode_tokens=8)
+    assert result["best"]["threads"] == 4 and result["best"]["batch_size"] == 64
+    assert "choisi" in calibration.report("fake", result)
+    calibration.save_profile("/models/x", "fake.gguf", result)
+    assert calibration.load_profile("/other/dir", "fake.gguf") == {"threads": 4, "batch_size": 64}
+    assert calibration.load_profile("/models/x", "missing.gguf") == {}
@@ -0,0 +1,91 @@
+import asyncio, json, os, time
+from fastapi.testclient import TestClient
+import server.app as srv
+from benchmarks.endpoints import fake_backend
+from cancellation import GenerationBudget, budgeted
+
+COURSE = "Une opération de paiement consiste à verser, transférer ou retirer des fonds."
+
+
+class _ClosedTab:
+    """Request whose client disconnects after a couple of polls."""
+
+    def __init__(self, body, polls=2):
+        self.body, self.polls = body, polls
+
+    async def json(self):
+        return self.body
+
+    async def is_disconnected(self):
+        self.polls -= 1
+        return self.polls <= 0
+
+
+def _runs():
+    with open(os.path.join(srv.RUNS_DIR, "runs.jsonl"), encoding="utf-8") as f:
+        return [json.loads(l) for l in f]
+
+
+def test_budget_stops_a_stream_at_the_next_token():
+    b = GenerationBudget(deadline_ms=30)
+    n = sum(1 for _ in budgeted((time.sleep(0.005) or "x" for _ in range(1000)), b))
+    assert b.stopped == "timeout" and 0 < n < 100
+    b = GenerationBudget()
+    seen = []
+    b.on_cancel(lambda: seen.append("worker"))
+    toks = budgeted(iter(["a", "b", "c"]), b)
+    assert next(toks) == "a"
+    b.cancel()
+    assert list(toks) == [] and b.stopped == "cancelled" and seen == ["worker"]
+
+
+def test_api_chat_deadline_and_token_budgets():
+    with fake_backend(token_ms=2.0, max_new_tokens=2000) as app:
+        client = TestClient(app)
+        r = client.post("/api/chat", json={"prompt": "Pourquoi ?", "context": COURSE, "deadline_ms": 150}).json()
+        assert r["stopped"] == "timeout" and r["reply"]
+        r = client.post("/api/chat", json={"prompt": "Comment ?", "context": COURSE, "max_tokens": 5}).json()
+        assert "stopped" not in r
+        assert client.post("/api/chat", json={"prompt": "Et ?", "context": COURSE, "max_tokens": "beaucoup"}).json() == {"error": "invalid_budget"}
+        assert client.post("/api/chat", json={"prompt": "Et ?", "context": COURSE, "slo_ms": "vite"}).json() == {"error": "invalid_budget"}
+        timeout, capped = _runs()
+        assert timeout["stopped"] == "timeout" and 0 < timeout["usage_completion_tokens"] < 2000
+        assert capped["usage_completion_tokens"] == 5 and "stopped" not in capped
+
+
+def test_api_chat_stops_generating_when_the_client_disconnects():
+    with fake_backend(token_ms=2.0, max_new_tokens=2000):
+        srv._DISCONNECT_POLL_S = 0.02
+        try:
+            r = asyncio.run(srv.api_chat(_ClosedTab({"prompt": "Pourquoi ?", "context": COURSE})))
+        finally:
+            srv._DISCONNECT_POLL_S = 0.1
+        assert r == {"error": "cancelled"}
+        (rec,) = _runs()
+        assert rec["stopped"] == "cancelled" and rec["usage_completion_tokens"] < 2000
+        assert srv.ANSWERS.lookup(srv.course_id_for(COURSE), "Pourquoi ?") is None  # nothing cached
+
+
+def test_llm_run_deadline():
+    with fake_backend() as app:
+        r = TestClient(app).post("/llm/run", json={"task": "chat", "prompt": "Résume.", "provider": "fake",
+                                                   "max_tokens": 100000, "deadline_ms": 100}).json()
+        assert r["status"] == "ok" and r["stopped"] == "timeout"
+        assert _runs()[-1]["stopped"] == "timeout"
+
+
+def test_api_chat_gives_up_waiting_for_a_busy_model():
+    with fake_backend(token_ms=2.0) as app:
+        client = TestClient(app)
+        with srv._model_lock(srv.qwen_model):  # another generation holds the model
+            t = time.perf_counter()
+            r = client.post("/api/chat", json={"prompt": "Pourquoi ?", "context": COURSE, "deadline_ms": 200}).json()
+            assert time.perf_counter() - t < 1.5
+            assert r["stopped"] == "timeout" and not r["reply"]
+            srv._DISCONNECT_POLL_S = 0.02
+            try:
+                r = asyncio.run(srv.api_chat(_ClosedTab({"prompt": "Comment ?", "context": COURSE})))
+            finally:
+                srv._DISCONNECT_POLL_S = 0.1
+            assert r == {"error": "cancelled"}
+        assert srv.qwen_model.calls == 0
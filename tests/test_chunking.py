@@ -0,0 +1,52 @@
+import io, random
+from fastapi.testclient import TestClient
+import server.app as srv
+from chunking import chunk_text, iter_chunks, iter_file_chunks
+
+COURSE = ("# Moyens de paiement\n\n"
+          "Les moyens de paiement désignent l’ensemble des instruments. Une opération de paiement se définit comme "
+          "toute action consistant à verser des fonds !\nLa phrase continue\nsur deux lignes. Quelle portée ?\n\n"
+          "## 1. Obligations\r\n\r\nLe prestataire est tenu d’une obligation d’information… Sauf faute lourde.\n")
+
+
+def test_chunks_are_whole_sentences_with_exact_offsets():
+    chunks = chunk_text(COURSE, max_tokens=20, overlap=6)
+    for c in chunks:
+        assert COURSE[c["start"]:c["end"]] == c["text"]
+        assert c["tokens"] <= 20
+        assert c["text"][-1] in ".!?…" or c["text"].startswith("#")
+    assert [c["section"] for c in chunks][0] == "Moyens de paiement"
+    last = chunks[-1]
+    assert last["text"].startswith("## 1. Obligations") and last["section"] == "1. Obligations"
+    # Overlap repeats whole trailing sentences of the previous chunk
+    texts = [c["text"] for c in chunk_text("Un deux trois. Quatre cinq six. Sept huit neuf. Dix onze.", max_tokens=6, overlap=3)]
+    assert texts == ["Un deux trois. Quatre cinq six.", "Quatre cinq six. Sept huit neuf.", "Sept huit neuf. Dix onze."]
+
+
+def test_streaming_file_matches_in_memory_and_splits_run_on_text(tmp_path):
+    path = tmp_path / "course.md"
+    body = COURSE + ("mot " * 1000) + "\nFin."
+    path.write_text(body, encoding="utf-8", newline="")
+    from_file = list(iter_file_chunks(str(path), max_tokens=50, overlap=10))
+    assert from_file == chunk_text(body, max_tokens=50, overlap=10)
+    assert from_file == list(iter_chunks(io.StringIO(body, newline=""), max_tokens=50, overlap=10))
+    assert max(c["tokens"] for c in from_file) <= 50 and from_file[-1]["text"].endswith("Fin.")
+
+
+def test_every_chunk_fits_even_with_runs_of_headings():
+    toc = "".join(f"{i}.{j} Section numérotée {i}.{j} du plan du cours\n" for i in range(1, 4) for j in range(1, 6))
+    long_heading = "# " + " ".join(["Titre"] * 45) + "\n\nUne phrase.\n"
+    rnd = random.Random(7)
+    pieces = ["1.2 Objet", "## Portée", "Une phrase courte.", "Une phrase un peu plus longue que la précédente !", "\n", ""]
+    fuzz = ["\n".join(rnd.choice(pieces) for _ in range(rnd.randint(1, 60))) for _ in range(200)]
+    for text in [toc, long_heading] + fuzz:
+        for max_tokens in (5, 12, 30):
+            for c in chunk_text(text, max_tokens=max_tokens, overlap=4):
+                assert c["tokens"] <= max_tokens and text[c["start"]:c["end"]] == c["text"]
+    assert chunk_text(long_heading, max_tokens=30)[0]["section"] == " ".join(["Titre"] * 29)  # "#" is a word
+
+
+def test_rag_retrieve_returns_offsets():
+    body = {"text": COURSE, "query": "obligation d’information prestataire", "k": 1, "chunk_size": 20, "overlap": 0}
+    hit = TestClient(srv.app).post("/rag/retrieve", json=body).json()["passages"][0]
+    assert COURSE[hit["start"]:hit["end"]] == hit["text"] and "prestataire" in hit["text"]
@@ -0,0 +1,116 @@
+import asyncio, json, os, threading, time
+from concurrent.futures import ThreadPoolExecutor
+from fastapi.testclient import TestClient
+import server.app as srv
+from benchmarks.endpoints import fake_backend
+from coalescing import SingleFlight, coalesce_key
+
+COURSE = "Une opération de paiement consiste à verser, transférer ou retirer des fonds."
+
+
+def _runs():
+    with open(os.path.join(srv.RUNS_DIR, "runs.jsonl"), encoding="utf-8") as f:
+        return [json.loads(l) for l in f]
+
+
+def _started(fake, n=1):
+    for _ in range(500):
+        if fake.calls >= n:
+            return
+        time.sleep(0.01)
+
+
+def test_followers_share_one_generation_up_to_the_cap():
+    assert coalesce_key("a", "Que  dit\nle cours ?") == coalesce_key("a", "Que dit le cours ?")
+    flights = SingleFlight(max_followers=2, poll_s=0.01)
+    gate = threading.Event()
+    lead, is_leader = flights.join("k")
+    assert is_leader
+    lead.start(lambda: (lead.push("Bon"), lead.push("jour"), gate.wait(5), "Bonjour")[-1])
+    joined = [flights.join("k") for _ in range(3)]
+    assert [f is lead for f, _ in joined] == [True, True, False] and joined[2][1]  # the third one leads a new flight
+    joined[2][0].start(lambda: "Bonjour")
+    # A follower arriving mid-generation gets the tokens already produced, then the rest
+    tokens = lead.stream()
+    assert next(tokens) + next(tokens) == "Bonjour"
+    gate.set()
+    assert list(tokens) == [] and lead.result(5) == "Bonjour"
+    s = flights.stats()
+    assert (s["generations"], s["coalesced"], s["cap_reached"]) == (2, 2, 1) and s["avoided_ratio"] == 0.5
+
+
+def test_generation_is_cancelled_only_once_everyone_left():
+    flights = SingleFlight(poll_s=0.01)
+    lead, _ = flights.join("k")
+    follower, _ = flights.join("k")
+
+    def generate():
+        while not lead.budget.cancelled:
+            time.sleep(0.01)
+        return "fin"
+    lead.start(generate)
+    lead.detach()
+    assert not lead.budget.cancelled
+    follower.detach()
+    assert lead.budget.cancelled and lead.result(5) == "fin"
+    assert flights.stats()["abandoned"] == 1 and flights.join("k")[1]  # a cancelled flight takes no one
+
+
+def test_flights_started_from_a_handler_use_the_loops_executor():
+    async def handler():
+        asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(1, thread_name_prefix="gen"))
+        flight, _ = SingleFlight().join("k")
+        flight.start(lambda: threading.current_thread().name)
+        return await flight.wait()
+    assert asyncio.run(handler()).startswith("gen")
+
+
+def test_identical_chat_requests_run_one_generation():
+    with fake_backend(token_ms=10.0, max_new_tokens=30) as app:
+        client = TestClient(app)
+        before = client.get("/health").json()["coalescing"]
+        body = {"prompt": "Que dit le cours ?", "context": COURSE}
+        with ThreadPoolExecutor(4) as pool:
+            first = pool.submit(client.post, "/api/chat", json=body)
+            _started(srv.qwen_model)
+            others = [pool.submit(client.post, "/api/chat", json=dict(body, prompt="Que dit  le cours ?")) for _ in range(3)]
+            replies = [first.result().json()] + [f.result().json() for f in others]
+        assert srv.qwen_model.calls == 1
+        assert len({r["reply"] for r in replies}) == 1 and "coalesced" not in replies[0]
+        assert all(r["coalesced"] for r in replies[1:])
+        after = client.get("/health").json()["coalescing"]
+        assert after["coalesced"] - before["coalesced"] == 3 and after["generations"] - before["generations"] == 1
+        runs = _runs()
+        assert sum(bool(r.get("coalesced")) for r in runs) == 3
+
+
+def test_streaming_followers_replay_the_tokens_already_sent():
+    with fake_backend(token_ms=10.0, max_new_tokens=30) as app:
+        client = TestClient(app)
+        body = {"prompt": "Résume le cours.", "context": COURSE, "stream": True}
+        with ThreadPoolExecutor(2) as pool:
+            first = pool.submit(client.post, "/api/chat", json=body)
+            _started(srv.qwen_model)
+            time.sleep(0.05)
+            second = pool.submit(client.post, "/api/chat", json=body)
+            a, b = first.result(), second.result()
+        assert srv.qwen_model.calls == 1 and a.text == b.text and len(a.text.split()) == 30
+        assert (a.headers["X-Coalesced"], b.headers["X-Coalesced"]) == ("0", "1")
+        assert any(r.get("stream") and r.get("coalesced") for r in _runs())
+
+
+def test_llm_run_followers_share_the_output_but_deadlines_are_not_coalesced(monkeypatch):
+    with fake_backend(token_ms=10.0) as app:
+        fake = srv.qwen_model
+        monkeypatch.setitem(srv._LOCAL_RUNNERS, "ctransformers",
+                            lambda req, budget: "".join(srv.budgeted(fake.stream(req.prompt, max_tokens=req.max_tokens), budget)))
+        client = TestClient(app)
+        body = {"task": "chat", "prompt": "Explique le paiement.", "provider": "ctransformers", "max_tokens": 20}
+        with ThreadPoolExecutor(3) as pool:
+            first = pool.submit(client.post, "/llm/run", json=body)
+            _started(fake)
+            second = pool.submit(client.post, "/llm/run", json=body)
+            timed = pool.submit(client.post, "/llm/run", json=dict(body, deadline_ms=5000))
+            a, b, c = first.result().json(), second.result().json(), timed.result().json()
+        assert a["output"] == b["output"] == c["output"] and b["coalesced"] and "coalesced" not in a and "coalesced" not in c
+        assert fake.calls == 2
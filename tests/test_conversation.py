@@ -0,0 +1,85 @@
+import threading
+from fastapi.testclient import TestClient
+import server.app as srv
+from benchmarks.endpoints import fake_backend
+from conversation import ConversationStore
+
+LONG = "Une opération de paiement consiste à verser, transférer ou retirer des fonds. " * 6
+
+
+def test_history_stays_bounded_and_old_turns_are_summarized():
+    store = ConversationStore(keep_turns=4, max_tokens=600, summary_tokens=80)
+    sizes = []
+    for i in range(60):
+        conv = store.ingest("s1", [{"role": "user", "content": f"Question {i} ? {LONG}"}])
+        sizes.append(store.count(store.render(conv)))
+        store.add("s1", "assistant", f"Réponse {i}. {LONG}")
+        store.wait("s1", timeout=5)
+    assert max(sizes) <= 600
+    assert min(sizes[20:]) > 400  # roughly constant once the window is full
+    store.wait("s1", timeout=5)
+    conv = store.get("s1")
+    assert len(conv.turns) == 4 and conv.folded == 116 and not conv.pending
+    text = store.render(conv)
+    assert text.startswith("Résumé") and "Question 59" in text and "Q: Question 57" in text
+    store.close()
+
+
+def test_full_message_list_is_ingested_once_and_summary_runs_in_background():
+    gate = threading.Event()
+
+    def slow(previous, turns, max_words):
+        gate.wait(5)
+        return "résumé"
+
+    store = ConversationStore(summarizer=slow, keep_turns=2, max_tokens=1000)
+    msgs = [{"role": "user", "content": "a"}, {"role": "assistant", "content": "b"}, {"role": "user", "content": "c"}]
+    conv = store.ingest("s", msgs)
+    assert store.ingest("s", msgs) is conv and conv.seen == 3
+    # Folding is blocked, yet render() answers at once with the pending turn verbatim
+    assert store.render(conv) == "user: a\nassistant: b\nuser: c"
+    gate.set()
+    store.wait("s", timeout=5)
+    assert store.render(conv).startswith("Résumé de la conversation précédente :\nrésumé\n")
+    store.close()
+
+
+def test_system_messages_are_not_turns_and_the_budget_is_in_model_tokens():
+    chars = ConversationStore(max_tokens=40, count=len)  # a tokenizer with one token per character
+    msgs = [{"role": "system", "content": "Passages: " + LONG}, {"role": "user", "content": "Que dit le cours ?"}]
+    conv = chars.ingest("s", msgs)
+    assert list(conv.turns) == [("user", "Que dit le cours ?")] and conv.seen == 1
+    chars.add("s", "assistant", LONG)
+    msgs += [{"role": "assistant", "content": LONG}, {"role": "user", "content": LONG}]
+    assert [r for r, _c in chars.ingest("s", msgs).turns] == ["user", "assistant", "user"]
+    text = chars.render(conv)
+    assert len(text) <= 40 and text.startswith("user: … ") and text.endswith("des fonds.")
+    chars.close()
+
+
+def test_api_chat_session_prompt_does_not_grow():
+    with fake_backend(token_ms=0.0) as app:
+        srv.CONVERSATIONS.keep_turns, srv.CONVERSATIONS.max_tokens = 4, 400
+        client = TestClient(app)
+        sizes = []
+        for i in range(25):
+            r = client.post("/api/chat", json={"session_id": "t", "context": "Cours : paiement.",
+                                               "messages": [{"role": "user", "content": f"Question {i} ? {LONG}"}]}).json()
+            assert r.get("reply")
+            sizes.append(len(srv.qwen_model.last_prompt.split()))
+            srv.CONVERSATIONS.wait("t", timeout=5)
+        assert max(sizes) - sizes[6] < 60
+        assert client.get("/health").json()["conversations"]["sessions"] == 1
+        assert client.delete("/conversations/t").json() == {"dropped": True}
+
+
+def test_model_summary_waits_for_the_shared_model():
+    with fake_backend(token_ms=0.0):
+        out = []
+        with srv._model_lock(srv.qwen_model):
+            t = threading.Thread(target=lambda: out.append(srv._model_summary("", [("user", "Bonjour")], 40)))
+            t.start()
+            t.join(0.05)
+            assert srv.qwen_model.calls == 0
+        t.join(5)
+        assert srv.qwen_model.calls == 1 and out[0]
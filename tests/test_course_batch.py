@@ -0,0 +1,44 @@
+import json, os
+import course_batch
+from sheet_store import SheetStore
+from test_jobs import EXTRACT, MCQ, SHEET
+
+
+class _Scripted:
+    def __call__(self, prompt, stream=False, **kw):
+        out = MCQ if "QCM" in prompt else (SHEET if "fiches de cours" in prompt else EXTRACT)
+        return iter(["Résultat : ", json.dumps(out, ensure_ascii=False)])
+
+
+def scripted_loader(spec, threads):
+    return _Scripted()
+
+
+def test_batch_processes_folder_in_parallel_and_resumes(tmp_path):
+    courses = tmp_path / "cours"
+    (courses / "droit").mkdir(parents=True)
+    (courses / "a.md").write_text("# Paiement\n\n## 1. Notions\n\nUne opération de paiement est une action.\n\n"
+                                  "## 2. Chèque\n\nLe chèque est un écrit.\n", encoding="utf-8")
+    (courses / "droit" / "b.txt").write_text("Le cashback a été généralisé en 2021.\n", encoding="latin-1")
+    (courses / "notes.pdf").write_bytes(b"%PDF")
+    store, manifest = str(tmp_path / "sheets"), str(tmp_path / "manifest.json")
+    paths = course_batch.find_courses(str(courses))
+    assert [os.path.basename(p) for p in paths] == ["a.md", "b.txt"]
+
+    report = course_batch.run(paths, store, manifest, {}, workers=2, loader=scripted_loader)
+    assert (report["files"], report["skipped"], report["errors"]) == (2, 0, 0)
+    assert report["tokens"] == 2 * (2 * 3 + 3) and report["files_per_min"] > 0 and report["tokens_per_s"] > 0
+    entries = json.load(open(manifest))
+    a = next(e for e in entries.values() if e["file"].endswith("a.md"))
+    assert (a["status"], a["sections"], a["sheets"], a["mcq"]) == ("ok", 2, 2, 6)
+    sheets = SheetStore(store)
+    doc = sheets.get(a["sheet_id"])
+    sheets.close()
+    assert doc["title"] == "Paiement" and doc["sheets"][0]["summary"].startswith("• ")
+    assert len({it["id"] for it in doc["mcq"]["items"]}) == 6
+
+    # Nothing new: both skipped; an edited course is processed again
+    assert course_batch.run(paths, store, manifest, {}, workers=0, loader=scripted_loader)["skipped"] == 2
+    (courses / "droit" / "b.txt").write_text("Le cashback a été généralisé en 2021 par la loi.\n", encoding="utf-8")
+    again = course_batch.run(paths, store, manifest, {}, workers=0, loader=scripted_loader)
+    assert (again["files"], again["skipped"]) == (1, 1) and len(json.load(open(manifest))) == 3
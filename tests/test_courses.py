@@ -0,0 +1,30 @@
+from fastapi.testclient import TestClient
+import server.app as srv
+from benchmarks.endpoints import fake_backend
+
+COURSE = ("# Moyens de paiement\n\nLes moyens de paiement désignent l’ensemble des instruments permettant le transfert de fonds.\n"
+          + "Le prestataire de services de paiement a une obligation d’information. " * 300
+          + "\n\nLe cashback a été généralisé en France par la loi du 3 août 2021.")
+
+
+def test_course_upload_is_content_addressed_and_used_by_routes():
+    with fake_backend(token_ms=0.0) as app:
+        client = TestClient(app)
+        meta = client.post("/courses", json={"text": COURSE}).json()
+        cid = meta["course_id"]
+        assert meta["title"] == "Moyens de paiement" and meta["chunks"] > 1
+        assert client.post("/courses", json={"text": COURSE.replace("\n", "\r\n") + "  "}).json()["course_id"] == cid
+        assert client.get(f"/courses/{cid}").json()["words"] == meta["words"]
+
+        r = client.post("/api/chat", json={"prompt": "Quand le cashback a-t-il été généralisé ?", "course_id": cid}).json()
+        assert r.get("reply")
+        sent = srv.qwen_model.last_prompt
+        assert "3 août 2021" in sent and len(sent.split()) < meta["words"]
+
+        hits = client.post("/rag/retrieve", json={"course_id": cid, "query": "cashback loi", "k": 2}).json()["passages"]
+        assert "cashback" in hits[0]["text"] and hits[0]["start"] < hits[0]["end"]
+
+        out = client.post("/llm/run", json={"task": "make-mcq", "provider": "fake", "course_id": cid,
+                                            "prompt": "passages: {{retrieved_passages_json}}"}).json()
+        assert out["status"] == "ok"
+        assert client.post("/api/chat", json={"prompt": "x", "course_id": "0" * 16}).json()["error"] == "course_not_found"
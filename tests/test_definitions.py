@@ -0,0 +1,45 @@
+from fastapi.testclient import TestClient
+import server.app as srv
+from benchmarks.endpoints import fake_backend
+from definitions import DefinitionIndex
+
+COURSE = (
+    "# Moyens de paiement\n\n"
+    "## 1. Notions\n\n"
+    "Les moyens de paiement désignent l’ensemble des instruments permettant le transfert de fonds. "
+    "Une opération de paiement se définit comme toute action consistant à verser, transférer ou retirer des fonds. "
+    "Selon le Code monétaire, le chèque est un écrit par lequel le tireur donne l'ordre au tiré de payer.\n\n"
+    "## 2. Réformes\n\n"
+    "Définition de la lettre de change : titre par lequel le tireur donne l'ordre au tiré de payer à échéance. "
+    "Le cashback a été généralisé par la loi du 3 août 2021.\n"
+)
+
+
+def test_index_finds_defined_terms_with_offsets():
+    idx = DefinitionIndex(COURSE)
+    assert [d.term for d in idx.entries] == ["moyens de paiement", "opération de paiement", "chèque", "lettre de change"]
+    hit = idx.lookup("C'est quoi une lettre de change ?")
+    c = hit["citation"]
+    assert hit["confidence"] == 1.0 and c["section"] == "2. Réformes"
+    assert COURSE[c["start"]:c["end"]] == hit["answer"] and hit["answer"].startswith("Définition de la lettre")
+    assert idx.lookup("Le chèque, c'est quoi ?")["term"] == "chèque"
+    # Not a definition question, or a term the course does not define
+    assert idx.lookup("Quand le cashback a-t-il été généralisé ?") is None
+    assert idx.lookup("Qu'est-ce que le cashback ?") is None
+    assert idx.lookup("Qu'est-ce que l'opération de paiement en ligne ?")["confidence"] < 0.7
+
+
+def test_api_chat_answers_definitions_extractively():
+    with fake_backend(token_ms=0.0) as app:
+        client = TestClient(app)
+        cid = client.post("/courses", json={"text": COURSE}).json()["course_id"]
+        r = client.post("/api/chat", json={"prompt": "Qu'est-ce qu'une opération de paiement ?", "course_id": cid}).json()
+        assert r["model"] == "extractive" and r["confidence"] == 1.0 and srv.qwen_model.calls == 0
+        assert r["reply"].startswith("Une opération de paiement se définit") and r["citations"][0]["passage_id"]
+        # Below the threshold: generated by the model as before
+        r = client.post("/api/chat", json={"prompt": "Qu'est-ce qu'un paiement en espèces ?", "course_id": cid}).json()
+        assert r["model"] == "qwen2" and srv.qwen_model.calls == 1
+        inline = client.post("/api/chat", json={"prompt": "Définis le chèque", "context": COURSE}).json()
+        assert inline["model"] == "extractive"  # same text as the course: same content hash, same index
+        stats = client.get("/health").json()["definitions"]
+        assert (stats["checked"], stats["answered"], stats["share"]) == (3, 2, 0.6667)
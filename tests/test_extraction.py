@@ -0,0 +1,55 @@
+import json
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor
+from fastapi.testclient import TestClient
+from benchmarks.endpoints import fake_backend
+from benchmarks.extraction import _legacy
+from extraction import extract_data, extract_many, fold
+
+COURSE = """# Paiement
+Le chèque est un écrit par lequel le tireur donne l'ordre au tiré de payer.
+Définition : la LCEN consiste en un cadre légal.
+
+Chèque, cheque, CHÈQUE et Tireur ; tireur été être ÉTÉ Être.
+Le virement se définit comme un transfert. Paiement paiement opération Opération
+"""
+
+
+def test_engine_matches_the_former_function():
+    for text in (COURSE, "", "  \n ", "a b c", COURSE * 30, "Ça ÿ À\r\nest\rune ligne est"):
+        assert extract_data(text) == _legacy(text)
+    assert fold("Définit") == "definit" and fold("CHÈQUE") == "cheque" and fold("Tireur") == "tireur"
+
+
+def test_extract_many_keeps_input_order_with_a_pool():
+    docs = [(i, f"d{i}", COURSE if i % 2 else "Le droit est une discipline.") for i in range(7)]
+    inline = list(extract_many(docs, chunk_chars=200))
+    with ProcessPoolExecutor(max_workers=2, mp_context=mp.get_context("spawn")) as ex:
+        pooled = list(extract_many(docs, ex, chunk_chars=200))
+    assert pooled == inline and [r["index"] for r in pooled] == list(range(7))
+    assert pooled[1] == {"index": 1, "id": "d1", "data": extract_data(COURSE)}
+
+
+def test_batch_endpoint_streams_ndjson(monkeypatch):
+    with fake_backend() as app:
+        import server.app as srv
+        client = TestClient(app)
+        assert client.post("/v1/extract", json={"content": COURSE}).json()["data"] == extract_data(COURSE)
+        body = "\n".join([json.dumps({"id": "a", "text": COURSE}), "{pas du json", json.dumps("Le droit est une discipline."),
+                          json.dumps({"id": "n", "text": 5})])
+        r = client.post("/v1/extract/batch", content=body.encode("utf-8"), headers={"Content-Type": "application/x-ndjson"})
+        assert r.headers["content-type"].startswith("application/x-ndjson")
+        lines = [json.loads(l) for l in r.text.splitlines()]
+        assert [l.get("index") for l in lines[:-1]] == [0, 1, 2, 3]
+        assert lines[0] == {"index": 0, "id": "a", "data": extract_data(COURSE)}
+        assert lines[1]["error"].startswith("invalid JSON") and lines[3]["id"] == "n" and "error" in lines[3]
+        assert lines[-1]["done"] and lines[-1]["count"] == 4 and lines[-1]["errors"] == 2 and lines[-1]["workers"] == 1
+        # Past EXTRACT_POOL_MIN_CHARS the documents go to the process pool, same output
+        with ProcessPoolExecutor(max_workers=2, mp_context=mp.get_context("spawn")) as ex:
+            monkeypatch.setattr(srv, "_EXTRACT_POOL", ex)
+            monkeypatch.setattr(srv, "_EXTRACT_WORKERS", 2)
+            monkeypatch.setattr(srv, "_EXTRACT_POOL_MIN_CHARS", 0)
+            pooled = client.post("/v1/extract/batch", json={"documents": [COURSE, {"id": "b", "content": COURSE}]}).text
+        pooled = [json.loads(l) for l in pooled.splitlines()]
+        assert [p["data"] for p in pooled[:2]] == [extract_data(COURSE)] * 2 and pooled[-1]["workers"] == 2
+        assert client.post("/v1/extract/batch", json={"documents": "x"}).status_code == 400
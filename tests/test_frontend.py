@@ -0,0 +1,69 @@
+import gzip, os, re
+from fastapi.testclient import TestClient
+from benchmarks.endpoints import fake_backend
+from static_assets import AssetBundle, FileCache, brotli
+
+
+def test_page_references_hashed_immutable_assets():
+    with fake_backend() as app:
+        client = TestClient(app)
+        page = client.get("/", headers={"Accept-Encoding": "gzip"})
+        assert page.status_code == 200 and page.headers["cache-control"] == "no-cache"
+        assert page.headers["content-encoding"] == "gzip" and "Accept-Encoding" in page.headers["vary"]
+        css = re.search(r'href="(/static/style\.[0-9a-f]{10}\.css)"', page.text).group(1)
+        assert 'src="/static/public/validators/qcm_validator.' in page.text
+        r = client.get(css, headers={"Accept-Encoding": "gzip"})
+        assert r.status_code == 200 and r.headers["cache-control"] == "public, max-age=31536000, immutable"
+        assert r.headers["content-type"].startswith("text/css")
+        # Missing files keep their original reference (and the page's onerror fallback)
+        assert "url('assets/nour-chat.png')" in r.text and 'src="/static/prof-mascotte-2.' in page.text
+        assert client.get(css, headers={"If-None-Match": r.headers["etag"], "Accept-Encoding": "gzip"}).status_code == 304
+        if brotli is not None:
+            br = client.get(css, headers={"Accept-Encoding": "gzip, br"})
+            assert br.headers["content-encoding"] == "br" and br.headers["etag"] != r.headers["etag"]
+        plain = client.get(css, headers={"Accept-Encoding": "identity"})
+        assert "content-encoding" not in plain.headers and plain.text == r.text
+        assert client.get("/static/style.0000000000.css").status_code == 404
+        # Original paths still work for URLs built by scripts, revalidated on every use
+        png = client.get("/prof-mascotte-2.png")
+        assert png.status_code == 200 and png.headers["cache-control"] == "no-cache"
+        assert client.get("/inconnu.png").status_code == 404
+
+
+def test_samples_and_discovery():
+    with fake_backend() as app:
+        client = TestClient(app)
+        r = client.get("/samples")
+        assert r.status_code == 200 and r.headers["etag"]
+        assert client.get("/samples", headers={"If-None-Match": r.headers["etag"]}).status_code == 304
+        client.get("/")
+        d = client.get("/api/discovery").json()
+        assert d["status"] == "ok" and d["endpoints"]["chat"] == "/api/chat" and "llm" in d
+        assert d["assets"]["style.css"].startswith("/static/style.")
+
+
+def test_bundle_rewrites_references_and_changes_url_on_edit(tmp_path):
+    (tmp_path / "img").mkdir()
+    (tmp_path / "img" / "a.png").write_bytes(b"\x89PNG" + b"0" * 10)
+    (tmp_path / "site.css").write_text("body{background:url(img/a.png)}\n" + "p{margin:0}\n" * 40)
+    (tmp_path / "index.html").write_text('<link href="site.css"><img src="img/a.png"><a href="https://x.org/a.css">')
+    bundle = AssetBundle(str(tmp_path), entry="index.html", extra=())
+    html = bundle.page.raw.decode()
+    css_url, png_url = bundle.manifest()["site.css"], bundle.manifest()["img/a.png"]
+    assert f'href="{css_url}"' in html and f'src="{png_url}"' in html and "https://x.org/a.css" in html
+    css = bundle.assets[css_url[len("/static/"):]]
+    assert f"url({png_url})" in css.raw.decode() and gzip.decompress(css.gz) == css.raw
+    (tmp_path / "img" / "a.png").write_bytes(b"\x89PNG" + b"1" * 10)
+    # The image changed, so the stylesheet that points at it gets a new URL too
+    assert AssetBundle(str(tmp_path), entry="index.html", extra=()).manifest()["site.css"] != css_url
+
+
+def test_file_cache_reloads_on_change(tmp_path):
+    p = tmp_path / "s.json"
+    p.write_text('{"a": 1}')
+    cache = FileCache()
+    first = cache.get(str(p))
+    assert cache.get(str(p)) is first and cache.get(str(tmp_path / "absent.json")) is None
+    p.write_text('{"a": 2}')
+    os.utime(p, (first.mtime + 5, first.mtime + 5))
+    assert cache.get(str(p)).raw == b'{"a": 2}'
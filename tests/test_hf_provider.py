@@ -0,0 +1,39 @@
+import pytest
+
+pytest.importorskip("torch")
+pytest.importorskip("transformers")
+
+from benchmarks.hf_cpu import make_tiny_model
+from hf_provider import HFProvider
+
+PROMPT = "Une opération de paiement se définit comme"
+
+
+@pytest.fixture(scope="module")
+def tiny(tmp_path_factory):
+    return make_tiny_model(str(tmp_path_factory.mktemp("hf") / "tiny"), layers=2, width=64)
+
+
+def test_int8_mode_quantizes_linear_layers_and_warms_up(tiny):
+    p = HFProvider(tiny, cpu={"mode": "int8", "threads": 1, "warmup_tokens": 2})
+    assert p.info["mode"] == "int8" and p.info["threads"] == 1 and p.info["quantized_layers"] == 15
+    assert p.info["warmup_s"] > 0 and p.info["compiled"] is False
+    assert p.generate(PROMPT, max_tokens=4).startswith(PROMPT.split()[0])
+    calls = []
+    # should_stop still stops generate() in the CPU mode's generation thread
+    text = "".join(p.stream(PROMPT, max_tokens=50, should_stop=lambda: calls.append(1) or len(calls) > 3))
+    assert len(calls) == 4 and len(text.split()) < 50
+
+
+def test_fp32_mode_generates_like_the_former_loading(tiny):
+    fp32 = HFProvider(tiny, cpu={"mode": "fp32", "warmup_tokens": 0})
+    off = HFProvider(tiny)  # CPU modes are opt-in
+    assert off.cpu_mode is None and "threads" not in off.info and "warmup_s" not in fp32.info
+    assert fp32.generate(PROMPT, max_tokens=6, temperature=0.0) == off.generate(PROMPT, max_tokens=6, temperature=0.0)
+
+
+def test_server_keeps_the_loaded_model_between_requests(tiny, monkeypatch):
+    import server.app as srv
+    monkeypatch.setattr(srv, "_HF_PROVIDER", None)
+    a = srv._hf_provider(tiny)
+    assert srv._hf_provider(tiny) is a and srv._llm_health() is not None
@@ -0,0 +1,96 @@
+import threading
+import pytest
+from fastapi.testclient import TestClient
+from benchmarks.endpoints import fake_backend
+from fake_provider import FakeLLMProvider
+from hot_swap import Leases, ModelSwapper, SwapBusy
+
+
+def _swapper(loader, slots, leases):
+    return ModelSwapper(loader, slots.get, lambda name, m, spec: slots.__setitem__(name, m), leases,
+                        warmup_tokens=2, drain_timeout_s=5)
+
+
+def test_switches_after_warmup_and_frees_the_old_model_once_idle():
+    leases = Leases()
+    old, new = FakeLLMProvider(reply="ancienne"), FakeLLMProvider(reply="nouvelle")
+    slots = {"qwen2": old}
+    gate = threading.Event()
+    swaps = _swapper(lambda spec: (gate.wait(5), new)[1], slots, leases)
+    with leases.hold(old):
+        job = swaps.start("qwen2", {"path": "/m", "file": "v2.gguf"})
+        assert job["state"] == "loading" and slots["qwen2"] is old
+        with pytest.raises(SwapBusy):
+            swaps.start("qwen2", {"path": "/m", "file": "v3.gguf"})
+        gate.set()
+        for _ in range(500):
+            if swaps.status()["running"][0]["state"] == "draining":
+                break
+            threading.Event().wait(0.01)
+        # Traffic already goes to the new version while the in-flight generation finishes on the old one
+        assert slots["qwen2"] is new and swaps.status()["running"][0]["in_flight_at_switch"] == 1
+    swaps.join("qwen2", 5)
+    last = swaps.status()["last"]
+    assert last["state"] == "done" and last["drained"] is True and new.calls == 1
+    assert all(k in last for k in ("load_s", "warmup_s", "switch_ms", "drain_s", "total_s"))
+
+
+def test_failed_load_or_warmup_keeps_the_current_model():
+    leases = Leases()
+    old = FakeLLMProvider()
+    slots = {"qwen2": old}
+
+    def broken(spec):
+        raise FileNotFoundError(spec["file"])
+    swaps = _swapper(broken, slots, leases)
+    swaps.start("qwen2", {"path": "/m", "file": "absent.gguf"})
+    swaps.join("qwen2", 5)
+    assert slots["qwen2"] is old and swaps.status()["last"]["state"] == "failed"
+    assert "absent.gguf" in swaps.status()["last"]["error"]
+    swaps = _swapper(lambda spec: (lambda prompt, **kw: "  "), slots, leases)
+    swaps.start("qwen2", {"path": "/m"})
+    swaps.join("qwen2", 5)
+    assert slots["qwen2"] is old and "warm-up" in swaps.status()["last"]["error"]
+
+
+def test_admin_endpoint_swaps_the_served_model(monkeypatch):
+    import server.app as srv
+    monkeypatch.setattr(srv, "_ADMIN_TOKEN", "s3cret")
+    monkeypatch.setattr(srv, "qwen_info", dict(srv.qwen_info))
+    monkeypatch.setattr(srv.SWAPS, "loader", lambda spec: FakeLLMProvider(reply="Nouvelle version chargée."))
+    admin = {"X-Admin-Token": "s3cret"}
+    with fake_backend() as app:
+        client = TestClient(app)
+        assert client.post("/admin/models/qwen2/swap", json={"path": "/m"}).status_code == 403
+        assert client.post("/admin/models/gpt9/swap", json={"path": "/m"}, headers=admin).status_code == 404
+        r = client.post("/admin/models/qwen2/swap", json={"path": "/m", "file": "qwen2-v2.gguf"}, headers=admin)
+        assert r.status_code == 202 and r.json()["swap"]["spec"]["model_type"] == "qwen2"
+        srv.SWAPS.join("qwen2", 5)
+        reply = client.post("/api/chat", json={"prompt": "Que dit le cours ?", "context": "Un cours."}).json()
+        assert reply["reply"].startswith("Nouvelle version")
+        assert srv.qwen_info["file"] == "qwen2-v2.gguf"
+        last = client.get("/health").json()["model_swaps"]["last"]
+        assert last["state"] == "done" and last["model"] == "qwen2" and last["warmup_s"] >= 0
+        assert client.get("/admin/models/swaps", headers=admin).json()["last"]["spec"]["file"] == "qwen2-v2.gguf"
+
+
+
+def test_chat_leases_the_model_it_picked_until_its_generation_ends():
+    import server.app as srv
+    with fake_backend(token_ms=5.0, max_new_tokens=20) as app:
+        client = TestClient(app)
+        fake = srv.qwen_model
+        # Read and leased in one step: a swap that installs right after still counts this request
+        picked = srv.MODEL_LEASES.acquire(lambda: (srv.qwen_model, srv.tinyllama_model))
+        assert picked == [fake, None] and srv.MODEL_LEASES.count(fake) == 1
+        srv.MODEL_LEASES.release(fake)
+        course = {"context": "Un cours."}
+        bodies = [dict(course, prompt="Même question ?")] * 2 + [dict(course, prompt="Autre ?", stream=True),
+                                                                 dict(course, prompt="Vite ?", deadline_ms=5000)]
+        threads = [threading.Thread(target=client.post, args=("/api/chat",), kwargs={"json": b}) for b in bodies]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join(10)
+        # Leader, follower, stream and deadline paths all hand their lease back
+        assert fake.calls >= 3 and srv.MODEL_LEASES.count(fake) == 0
@@ -0,0 +1,125 @@
+import json
+from fastapi.testclient import TestClient
+import server.app as srv
+from benchmarks.endpoints import fake_backend
+from jobs import JobError, JobQueue
+
+COURSE = (
+    "# Moyens de paiement\n\n"
+    "## 1. Définitions\n\n"
+    "Une opération de paiement est une action consistant à verser, transférer ou retirer des fonds. "
+    "Elle est autonome par rapport au rapport sous-jacent.\n\n"
+    "## 2. Responsabilité\n\n"
+    "Le prestataire de services de paiement est tenu d'une obligation d'information renforcée. "
+    "La jurisprudence admet une responsabilité de plein droit sauf faute lourde du payeur.\n"
+)
+
+EXTRACT = {"status": "ok", "themes": [{"title": "Opération de paiement", "summary": "Définition.",
+                                       "quotes": [{"passage_id": "p0", "text": "Une opération de paiement"}]}]}
+MCQ = {"status": "ok", "items": [
+    {"id": f"mcq_{i}", "difficulty": "easy", "bloom": "rappel", "question": f"Question {i} ?",
+     "options": ["Verser", "Prêter", "Garantir", "Emprunter"], "answer_index": 0,
+     "rationale": "Définition du cours.", "citations": ["p0"]} for i in range(3)]}
+SHEET = {"status": "ok", "sheets": [{
+    "title": "Opération de paiement",
+    "short_version": {"type": "bullet_points", "content": ["Verser, transférer ou retirer des fonds"]},
+    "medium_version": {"type": "paragraphs", "content": ["Une opération de paiement est autonome."]},
+    "long_version": {"type": "developed", "content": "Une opération de paiement est une action consistant à verser, "
+                                                     "transférer ou retirer des fonds, autonome du rapport sous-jacent."},
+    "citations": ["p0"]}]}
+
+
+class ScriptedModel:
+    """Answers each pre-generation prompt with a fixed JSON payload, after some chatter."""
+
+    def __init__(self, bad_mcq: int = 0):
+        self.bad_mcq = bad_mcq
+        self.prompts = []
+
+    def __call__(self, prompt, stream=False, **kw):
+        self.prompts.append(prompt)
+        if "QCM" in prompt:
+            if self.bad_mcq:
+                self.bad_mcq -= 1
+                out = {**MCQ, "items": [{**MCQ["items"][0], "options": ["a", "b"]}]}
+            else:
+                out = MCQ
+        elif "fiches de cours" in prompt:
+            out = SHEET
+        else:
+            out = EXTRACT
+        text = "Voici le résultat : " + json.dumps(out, ensure_ascii=False) + "\nBonne révision !"
+        return iter([text]) if stream else text
+
+
+def test_retry_backoff_and_dependency_failure(tmp_path):
+    calls = {"flaky": 0}
+
+    def flaky(job, queue):
+        calls["flaky"] += 1
+        if calls["flaky"] < 2:
+            raise JobError("invalid output")
+        return {"ok": True}
+
+    def broken(job, queue):
+        raise JobError("always invalid")
+
+    q = JobQueue(str(tmp_path), {"flaky": flaky, "broken": broken, "after": lambda job, queue: {}},
+                 max_attempts=2, backoff_s=0.0)
+    a = q.enqueue("c1", "flaky", {})
+    b = q.enqueue("c1", "broken", {})
+    c = q.enqueue("c1", "after", {}, depends_on=b)
+    while q.run_once():
+        pass
+    assert q.get(a)["status"] == "done" and q.get(a)["attempts"] == 2 and q.result(a) == {"ok": True}
+    assert q.get(b)["status"] == "failed" and q.get(b)["error"] == "always invalid"
+    assert q.get(c)["status"] == "failed" and "dependency" in q.get(c)["error"]
+    assert q.counts() == {"done": 1, "failed": 2}
+    q.close()
+
+
+def test_jobs_resume_after_restart(tmp_path):
+    q = JobQueue(str(tmp_path), {})
+    jid = q.enqueue("c1", "extract", {"passages": []})
+    assert q.claim()["id"] == jid and q.get(jid)["status"] == "running"
+    q.close()  # crash while running
+    q2 = JobQueue(str(tmp_path), {"extract": lambda job, queue: {"themes": []}})
+    assert q2.recovered == 1 and q2.get(jid)["status"] == "queued"
+    assert q2.run_once() == jid and q2.result(jid) == {"themes": []}
+    q2.close()
+
+
+def test_course_upload_pregenerates_validated_mcqs_and_sheets(monkeypatch):
+    monkeypatch.setattr(srv, "_PREGENERATE", True)
+    with fake_backend():
+        model = srv.qwen_model = ScriptedModel(bad_mcq=1)
+        srv.JOBS.backoff_s = 0.0
+        client = TestClient(srv.app)
+        meta = client.post("/courses", json={"text": COURSE}).json()
+        listing = client.get(meta["jobs"]).json()
+        assert listing["counts"] == {"queued": 6}  # 2 sections × (extract, sheet, mcq)
+        sheet = next(j for j in listing["jobs"] if j["kind"] == "sheet")
+        assert client.get(f"/jobs/{sheet['id']}/result").status_code == 409
+        while srv.JOBS.run_once():
+            pass
+        jobs = client.get(meta["jobs"]).json()["jobs"]
+        assert {j["status"] for j in jobs} == {"done"}
+        # The invalid MCQ output was rejected by /validate/mcq and generated again
+        assert [j["attempts"] for j in jobs if j["kind"] == "mcq"] == [2, 1]
+        assert client.get(f"/jobs/{jobs[0]['id']}").json()["course_id"] == meta["course_id"]
+        mcq = next(j for j in jobs if j["kind"] == "mcq")
+        assert client.get(f"/jobs/{mcq['id']}/result").json()["items"] == MCQ["items"]
+        res = client.get(f"/jobs/{sheet['id']}/result").json()
+        assert res["sheets"] == SHEET["sheets"]
+        assert "Opération de paiement" in client.get(res["published"]["api"]).json()["sheets"][0]["title"]
+        # The sheet prompt was built from the extract job's themes; the partial was resolved
+        assert any("Définition." in p and "{{" not in p for p in model.prompts if "fiches de cours" in p)
+        # Uploading the same course again does not enqueue anything new
+        client.post("/courses", json={"text": COURSE})
+        assert len(client.get(meta["jobs"]).json()["jobs"]) == 6
+
+
+def test_course_upload_does_not_queue_jobs_by_default():
+    with fake_backend():
+        meta = TestClient(srv.app).post("/courses", json={"text": COURSE}).json()
+        assert "jobs" not in meta and not srv.JOBS.has_jobs(meta["course_id"])
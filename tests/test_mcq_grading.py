@@ -0,0 +1,84 @@
+import json, time
+from fastapi.testclient import TestClient
+import server.app as srv
+from benchmarks.endpoints import fake_backend
+from mcq_grading import AnswerKey, grade
+
+QUIZ = {"status": "ok", "items": [
+    {"id": f"q{i}", "difficulty": ("easy", "medium", "hard")[i % 3], "bloom": "rappel", "question": f"Question {i} ?",
+     "options": ["a", "b", "c", "d"], "answer_index": i % 4, "rationale": f"Parce que {i}.", "citations": [f"p{i}"],
+     "distractors_rationale": "Les autres choix confondent les notions."}
+    for i in range(50)]}
+
+
+def test_bulk_grading_scores_and_item_stats():
+    key = AnswerKey(QUIZ)
+    perfect = [i % 4 for i in range(50)]
+    attempts = [perfect, {"answers": {"q0": 0, "q1": 0, "zz": 1}}, [(i + 1) % 4 for i in range(50)]]
+    out = grade(key, attempts)
+    a, b, c = out["attempts"]
+    assert (a["score"], b["correct"], b["answered"], c["score"]) == (1.0, 1, 2, 0.0)
+    assert a["by_difficulty"]["hard"] == {"correct": 16, "total": 16}
+    q1 = b["items"][1]
+    assert q1 == {"id": "q1", "status": "ok", "correct": False, "user_answer_index": 0, "answer_index": 1,
+                  "explanation_short": "Parce que 1.", "next_hint": "Les autres choix confondent les notions.",
+                  "citations": ["p1"]}
+    assert b["items"][2]["user_answer_index"] is None
+    assert out["item_stats"][0]["p_correct"] == round(2 / 3, 4)
+
+
+def test_grade_endpoint_is_fast_and_hints_are_async():
+    with fake_backend(token_ms=0.0):
+        client = TestClient(srv.app)
+        answers = [0] * 50
+        t0 = time.perf_counter()
+        out = client.post("/mcq/grade", json={"mcq": QUIZ, "answers": answers, "hints": True}).json()
+        assert time.perf_counter() - t0 < 0.5
+        assert out["attempts"][0]["correct"] == 13 and out["hint_job"]
+        # Graded again by id, without resending the quiz
+        again = client.post("/mcq/grade", json={"quiz_id": out["quiz_id"], "answers": answers, "details": False}).json()
+        assert again["attempts"][0]["score"] == out["attempts"][0]["score"] and "items" not in again["attempts"][0]
+        for _ in range(100):
+            job = client.get(f"/mcq/hints/{out['hint_job']}").json()
+            if job["status"] != "pending":
+                break
+            time.sleep(0.02)
+        assert job["status"] == "done" and len(job["hints"]) == 37 and all(job["hints"].values())
+
+        prompt = 'Entrées: ' + json.dumps({"item": QUIZ["items"][3], "user_answer_index": 3})
+        res = client.post("/llm/run", json={"task": "grade-mcq", "prompt": prompt}).json()
+        assert res["provider"] == "native"
+        assert json.loads(res["output"]) == {"status": "ok", "correct": True, "explanation_short": "Parce que 3.",
+                                             "next_hint": "", "citations": ["p3"]}
+
+
+
+def test_hints_wait_for_the_shared_model():
+    import threading
+    with fake_backend(token_ms=0.0):
+        out = []
+        with srv._model_lock(srv.qwen_model):
+            t = threading.Thread(target=lambda: out.append(srv._hint_generate("Donne un indice.")))
+            t.start()
+            time.sleep(0.05)
+            # A chat generation holds the model: the hint does not run on it at the same time
+            assert srv.qwen_model.calls == 0
+        t.join(5)
+        assert srv.qwen_model.calls == 1 and out[0]
+
+
+def test_edited_quiz_gets_a_new_id_and_bad_indexes_are_rejected():
+    with fake_backend(token_ms=0.0):
+        client = TestClient(srv.app)
+        quiz = {"items": [dict(QUIZ["items"][1])]}
+        first = client.post("/mcq/grade", json={"mcq": quiz, "answers": [0]}).json()
+        quiz["items"][0].update(rationale="Nouvelle explication.", citations=["p9"])
+        edited = client.post("/mcq/grade", json={"mcq": quiz, "answers": [0]}).json()
+        assert edited["quiz_id"] != first["quiz_id"]
+        assert edited["attempts"][0]["items"][0]["citations"] == ["p9"]
+        assert edited["attempts"][0]["items"][0]["explanation_short"] == "Nouvelle explication."
+        bad_key = {"items": [dict(QUIZ["items"][1], answer_index=200)]}
+        r = client.post("/mcq/grade", json={"mcq": bad_key, "answers": [0]})
+        assert r.status_code == 400 and r.json()["error"] == "invalid_index"
+        r = client.post("/mcq/grade", json={"quiz_id": edited["quiz_id"], "answers": {"q1": 300}})
+        assert r.status_code == 400 and "q1" in r.json()["detail"]
@@ -0,0 +1,73 @@
+import os, time
+import pytest
+from model_pool import ModelPool
+
+pytestmark = pytest.mark.skipif(not hasattr(os, "fork"), reason="fork start method required")
+
+
+class _EchoModel:
+    def __call__(self, prompt, stream=False, max_new_tokens=4, **_):
+        if "crash" in prompt:
+            os._exit(3)
+        if "slow" in prompt:
+            return self._slow(max_new_tokens)
+        return iter([f"{os.getpid()}:"] + ["x"] * (max_new_tokens - 1))
+
+    def _slow(self, n):
+        for _ in range(n):
+            time.sleep(0.01)
+            yield "x"
+
+
+def _echo_loader(spec, threads):
+    return _EchoModel()
+
+
+def _pool(workers):
+    pool = ModelPool({"echo": {}}, workers=workers, loader=_echo_loader, start_method="fork", health_interval=0.1)
+    pool.start()
+    assert pool.wait_ready(timeout=10)
+    return pool
+
+
+def test_pool_spreads_requests_across_workers():
+    pool = _pool(2)
+    try:
+        futs = [pool.submit("bonjour", model="echo", max_new_tokens=3) for _ in range(6)]
+        outs = [f.result(timeout=10) for f in futs]
+        assert all(u["completion_tokens"] == 3 for _t, u in outs)
+        assert len({t.split(':')[0] for t, _u in outs}) == 2
+        assert sum(w["served"] for w in pool.stats()) == 6
+    finally:
+        pool.close()
+
+
+def test_pool_restarts_crashed_worker():
+    pool = _pool(1)
+    try:
+        with pytest.raises(RuntimeError):
+            pool.submit("crash", model="echo").result(timeout=10)
+        deadline = time.time() + 10
+        while time.time() < deadline and not (pool.stats()[0]["restarts"] and pool.stats()[0]["ready"]):
+            time.sleep(0.05)
+        assert pool.generate("bonjour", model="echo", timeout=10).endswith("xxx")
+    finally:
+        pool.close()
+
+
+def test_pool_cancels_and_times_out_at_the_next_token():
+    pool = _pool(1)
+    try:
+        fut = pool.submit("slow", model="echo", max_new_tokens=2000)
+        queued = pool.submit("bonjour", model="echo", max_new_tokens=3)
+        time.sleep(0.1)
+        assert pool.cancel(fut)
+        text, usage = fut.result(timeout=5)
+        assert usage["stopped"] == "cancelled" and 0 < usage["completion_tokens"] < 100 and text == "x" * len(text)
+        # A request received during the cancelled generation is still served
+        assert queued.result(timeout=5)[1]["completion_tokens"] == 3
+        _text, usage = pool.submit("slow", model="echo", max_new_tokens=2000, deadline_s=0.1).result(timeout=5)
+        assert usage["stopped"] == "timeout" and usage["completion_tokens"] < 100
+        assert not pool.cancel(fut)  # already finished
+    finally:
+        pool.close()
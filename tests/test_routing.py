@@ -0,0 +1,63 @@
+import json
+from routing import ModelRouter, task_class
+
+
+def _router(tmp_path):
+    r = ModelRouter(log_path=str(tmp_path / "routing.jsonl"), enabled=True)
+    for _ in range(5):
+        r.observe("qwen2", True, 3000, prompt_tokens=900, completion_tokens=100)   # 3 ms/token
+        r.observe("tinyllama", True, 1000, prompt_tokens=900, completion_tokens=100)  # 1 ms/token
+    return r
+
+
+def test_task_classes():
+    assert task_class("mcq") == "structured" and task_class("chat", "json") == "structured"
+    assert task_class("chat", question="Qu'est-ce que l'inertie ?") == "short_chat"
+    assert task_class("chat", question="Peux-tu me résumer les causes principales ?") == "chat"
+
+
+def test_routes_by_task_slo_and_success(tmp_path):
+    r = _router(tmp_path)
+    assert r.choose(["qwen2", "tinyllama"], question="C'est quoi la DSP2 ?", prompt_tokens=900)[0][0] == "tinyllama"
+    assert r.choose(["qwen2", "tinyllama"], task="mcq", prompt_tokens=900)[0][0] == "qwen2"
+    order, decision = r.choose(["qwen2", "tinyllama"], task="mcq", prompt_tokens=900, slo_ms=1500)
+    assert order[0] == "tinyllama" and decision["reason"] == "strongest_within_slo"
+    assert r.choose(["qwen2", "tinyllama"], task="mcq", prompt_tokens=900, slo_ms=10)[1]["reason"] == "slo_unreachable_fastest"
+    for _ in range(10):
+        r.observe("qwen2", False, 50)
+    assert r.choose(["qwen2", "tinyllama"], task="sheet", prompt_tokens=900)[0][0] == "tinyllama"
+    r.flush()
+    logged = [json.loads(l) for l in (tmp_path / "routing.jsonl").read_text().splitlines()]
+    assert len(logged) == 5 and logged[0]["chosen"] == "tinyllama"
+
+
+def test_disabled_by_default_and_log_is_batched_and_rotated(tmp_path):
+    log = tmp_path / "routing.jsonl"
+    off = ModelRouter(log_path=str(log))
+    for _ in range(5):
+        off.observe("tinyllama", True, 100, prompt_tokens=900, completion_tokens=100)
+    # No routing unless turned on: the strongest model, even for a short question with a faster one known
+    assert off.choose(["tinyllama", "qwen2"], question="C'est quoi la DSP2 ?")[0] == ["qwen2", "tinyllama"]
+    off.flush()
+    assert not log.exists()
+    r = ModelRouter(log_path=str(log), enabled=True, log_flush_every=4, log_max_bytes=1000)
+    for i in range(3):
+        r.choose(["qwen2"], task="mcq")
+    assert not log.exists()  # still buffered
+    for i in range(37):
+        r.choose(["qwen2"], task="mcq")
+    r.flush()
+    assert (tmp_path / "routing.jsonl.1").exists() and log.stat().st_size < 2000
+
+
+def test_learns_from_runs_log(tmp_path):
+    runs = tmp_path / "runs.jsonl"
+    runs.write_text("\n".join(json.dumps(x) for x in [
+        {"task": "api_chat:chat", "provider": "internal", "model": "qwen2", "ok": True, "ms": 2000, "usage_prompt_tokens": 1000},
+        {"task": "chat", "provider": "none", "ok": False, "ms": 5},
+        {"task": "mcq", "provider": "hf", "ok": False, "ms": 40},
+    ]) + "\n")
+    r = ModelRouter()
+    assert r.load_history(str(runs)) == 2
+    snap = r.snapshot()
+    assert snap["qwen2"]["ms_per_tok"] == 2.0 and snap["hf"]["success"] == 0.0
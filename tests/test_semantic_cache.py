@@ -0,0 +1,59 @@
+from fastapi.testclient import TestClient
+import server.app as srv
+from benchmarks.endpoints import fake_backend
+from semantic_cache import HashingEmbedder, SemanticCache
+
+COURSE = ("# Moyens de paiement\n\nUne opération de paiement se définit comme toute action consistant à verser, "
+          "transférer ou retirer des fonds.\n\nLe cashback a été généralisé par la loi du 3 août 2021.")
+
+
+def test_paraphrases_are_close_and_other_questions_are_not():
+    e = HashingEmbedder()
+    q = e("Qu'est-ce qu'une opération de paiement ?")
+    for p in ("C'est quoi une opération de paiement", "Définis l'opération de paiement.",
+              "Explique-moi les opérations de paiement stp"):
+        assert float(q @ e(p)) > 0.9
+    for other in ("Qu'est-ce que le cashback ?", "Quelle est la responsabilité du payeur ?",
+                  "Qu'est-ce qu'une opération de paiement selon l'article 4 ?"):
+        assert float(q @ e(other)) < 0.7
+
+
+def test_cache_is_per_course_hash_and_reports_savings():
+    cache = SemanticCache(threshold=0.85)
+    cache.store("v1", "C'est quoi le cashback ?", "Une remise.", gen_ms=900.0, model="qwen2")
+    hit = cache.lookup("v1", "Définis le cashback")
+    assert hit["answer"] == "Une remise." and hit["score"] >= 0.85
+    assert cache.lookup("v2", "Définis le cashback") is None  # edited course: new hash, no stale answer
+    assert cache.lookup("v1", "Quelle est la loi de 2021 ?") is None
+    st = cache.stats()
+    assert (st["lookups"], st["hits"], st["hit_rate"]) == (3, 1, 0.3333) and 800 < st["saved_ms"] <= 900
+    assert cache.invalidate("v1") and cache.lookup("v1", "Définis le cashback") is None
+
+
+def test_api_chat_reuses_answers_for_paraphrases():
+    with fake_backend(token_ms=0.0) as app:
+        client = TestClient(app)
+        cid = client.post("/courses", json={"text": COURSE}).json()["course_id"]
+        first = client.post("/api/chat", json={"prompt": "Pourquoi l'opération de paiement est-elle autonome ?", "course_id": cid}).json()
+        calls = srv.qwen_model.calls
+        again = client.post("/api/chat", json={"prompt": "Pourquoi les opérations de paiement sont autonomes", "course_id": cid}).json()
+        assert again["cached"] is True and again["reply"] == first["reply"] and srv.qwen_model.calls == calls
+        # Same course sent inline: same content hash
+        inline = client.post("/api/chat", json={"prompt": "Explique pourquoi l'opération de paiement est autonome.", "context": COURSE}).json()
+        assert inline["cached"] is True
+        # Follow-ups in a conversation depend on earlier turns: never served from the cache
+        msgs = [{"role": "user", "content": "Bonjour"}, {"role": "assistant", "content": "Bonjour !"},
+                {"role": "user", "content": "Pourquoi l'opération de paiement est-elle autonome ?"}]
+        assert "cached" not in client.post("/api/chat", json={"messages": msgs, "course_id": cid}).json()
+        assert client.get("/health").json()["answer_cache"]["hits"] == 2
+
+
+def test_a_negated_question_never_gets_the_affirmative_answer():
+    e = HashingEmbedder()
+    assert float(e("Pourquoi le chèque est valable ?") @ e("Pourquoi le chèque n'est pas valable ?")) < 0.85
+    cache = SemanticCache(threshold=0.85)
+    cache.store("v1", "Pourquoi le chèque est valable ?", "Il est signé.", gen_ms=900.0, model="qwen2")
+    assert cache.lookup("v1", "Pourquoi le chèque n'est pas valable ?") is None
+    assert cache.lookup("v1", "Pourquoi les chèques sont valables") is not None
+    cache.store("v1", "Pourquoi le chèque n'est pas valable ?", "Il n'est pas signé.", gen_ms=900.0, model="qwen2")
+    assert cache.lookup("v1", "Pourquoi le chèque n’est jamais valable ?")["answer"] == "Il n'est pas signé."
@@ -0,0 +1,62 @@
+import gzip, json
+from fastapi.testclient import TestClient
+from benchmarks.endpoints import fake_backend
+from sheet_store import SheetStore
+
+SHEETS = {"title": "Paiement", "sheets": [
+    {"title": "Chèque <b>", "summary": "Écrit\nordre de payer", "full": "Le tireur donne l'ordre au tiré."},
+    {"title": "Cashback", "summary": "Généralisé en 2021"}]}
+
+
+def test_publish_dedups_and_serves_conditional_gzip_pages():
+    with fake_backend() as app:
+        client = TestClient(app)
+        first = client.post("/sheets", json=SHEETS).json()
+        assert client.post("/sheets", json=SHEETS).json()["id"] == first["id"]
+        r = client.get(first["url"], headers={"Accept-Encoding": "identity"})
+        assert r.status_code == 200 and "Chèque &lt;b&gt;" in r.text and "Écrit<br>ordre" in r.text
+        assert r.headers["cache-control"].startswith("public, max-age=") and "Accept-Encoding" in r.headers["vary"]
+        etag = r.headers["etag"]
+        again = client.get(first["url"], headers={"If-None-Match": etag, "Accept-Encoding": "identity"})
+        assert again.status_code == 304 and again.content == b""
+        # Precompressed variant, with its own validator
+        raw = client.get(first["url"], headers={"Accept-Encoding": "gzip"})
+        assert raw.headers["content-encoding"] == "gzip" and raw.headers["etag"] != etag and raw.text == r.text
+        assert client.get(first["url"], headers={"If-None-Match": raw.headers["etag"]}).status_code == 304
+        api = client.get(first["api"], headers={"If-None-Match": '"autre"'})
+        assert api.status_code == 200 and [c["title"] for c in api.json()["sheets"]] == ["Chèque <b>", "Cashback"]
+        assert client.get("/sheets/inconnu").status_code == 404
+
+
+def test_list_and_search_use_the_index():
+    with fake_backend() as app:
+        client = TestClient(app)
+        a = client.post("/sheets", json=SHEETS).json()["id"]
+        b = client.post("/sheets", json={"title": "Droit des contrats", "sheets": [{"title": "Vices du consentement"}]}).json()["id"]
+        listed = client.get("/api/sheets", params={"limit": 1}).json()
+        assert listed["total"] == 2 and [it["id"] for it in listed["items"]] == [b]
+        assert [it["id"] for it in client.get("/api/sheets/search", params={"q": "cheque"}).json()["items"]] == [a]
+        assert [it["id"] for it in client.get("/api/sheets/search", params={"q": "consent"}).json()["items"]] == [b]
+        assert client.get("/api/sheets/search", params={"q": "paiement contrats"}).json()["items"] == []
+
+
+def test_legacy_json_files_are_imported_once(tmp_path):
+    (tmp_path / "dc8960f193.json").write_text(json.dumps(SHEETS, ensure_ascii=False), encoding="utf-8")
+    store = SheetStore(str(tmp_path))
+    assert store.imported == 1 and store.get("dc8960f193") == SHEETS
+    r = store.rendered("dc8960f193")
+    assert gzip.decompress(r.html_gz) == r.html
+    store.close()
+    assert SheetStore(str(tmp_path)).imported == 0
+
+
+def test_hot_pages_follow_updates_from_another_process(tmp_path):
+    server, batch = SheetStore(str(tmp_path)), SheetStore(str(tmp_path))
+    server.put(SHEETS, sid="c1")
+    old = server.rendered("c1")
+    assert server.rendered("c1") is old  # hot
+    batch.put(dict(SHEETS, title="Paiement v2"), sid="c1")
+    new = server.rendered("c1")
+    assert new.etag != old.etag and b"Paiement v2" in new.html
+    server.close()
+    batch.close()
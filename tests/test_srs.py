@@ -0,0 +1,80 @@
+import json, time
+from collections import OrderedDict
+from fastapi.testclient import TestClient
+import server.app as srv
+import srs
+from benchmarks.endpoints import fake_backend
+
+NOW = "2026-03-10T08:00:00Z"
+
+
+def test_plan_matches_prompt_shape_and_is_deterministic():
+    items = [
+        {"id": "q1", "difficulty": "easy", "last_result": "correct", "last_seen": "2026-03-09T08:00:00Z"},
+        {"id": "q2", "difficulty": "hard", "last_result": "incorrect", "last_seen": "2026-03-09T08:00:00Z"},
+        {"id": "q3", "difficulty": "medium"},
+        {"difficulty": "easy"},
+    ]
+    out = srs.plan(items, now=srs.parse_time(NOW))
+    assert out == srs.plan(items, now=srs.parse_time(NOW))
+    assert out["status"] == "ok" and out["skipped"] == 1
+    sched = {s["id"]: s for s in out["schedule"]}
+    assert set(sched) == {"q1", "q2", "q3"}
+    assert all(set(s) == {"id", "next_review", "priority"} and 0 <= s["priority"] <= 1 for s in out["schedule"])
+    # Failed hard card comes back first (overdue → now), the easy correct one after 4 days
+    assert sched["q2"]["next_review"] == NOW and sched["q2"]["priority"] == 1.0
+    assert sched["q1"]["next_review"] == "2026-03-13T08:00:00Z" and sched["q1"]["priority"] < 0.5
+
+
+def test_store_applies_reviews_once_and_caps_days():
+    st = srs.SrsStore()
+    now = srs.parse_time(NOW)
+    item = {"id": "c", "difficulty": "medium", "last_result": "correct", "last_seen": "2026-03-01T00:00:00Z"}
+    srs.plan([item], now=now, store=st)
+    srs.plan([item], now=now, store=st)
+    assert st.reps[st.index["c"]] == 1 and st.stability[st.index["c"]] == srs.INITIAL_STABILITY[1]
+    srs.plan([{**item, "last_seen": "2026-03-05T00:00:00Z"}], now=now, store=st)
+    assert st.stability[st.index["c"]] == srs.INITIAL_STABILITY[1] * srs.EASE[1]
+    assert srs.SrsStore.from_dict(json.loads(json.dumps(st.to_dict()))).to_dict() == st.to_dict()
+
+    many = [{"id": f"n{i}", "difficulty": "hard"} for i in range(25)]
+    days = [s["next_review"][:10] for s in srs.plan(many, now=now, max_per_day=10)["schedule"]]
+    assert days.count("2026-03-10") == 10 and days.count("2026-03-11") == 10 and days.count("2026-03-12") == 5
+
+
+def test_srs_endpoint_handles_thousands_of_items(tmp_path, monkeypatch):
+    monkeypatch.setattr(srv, "SRS_DIR", str(tmp_path))
+    monkeypatch.setattr(srv, "_SRS_DECKS", OrderedDict())
+    items = [{"id": f"q{i}", "difficulty": ("easy", "medium", "hard")[i % 3],
+              "last_result": ("correct", "incorrect")[i % 2], "last_seen": f"2026-03-0{1 + i % 9}T10:00:00Z"}
+             for i in range(5000)]
+    client = TestClient(srv.app)
+    t0 = time.perf_counter()
+    r = client.post("/srs/plan", json={"items_stats": items, "deck": "alice", "now": NOW}).json()
+    assert time.perf_counter() - t0 < 2.0
+    assert len(r["schedule"]) == 5000 and (tmp_path / "alice.json").exists()
+    assert client.get("/srs/due/alice").json()["cards"] == 5000
+
+    prompt = "Entrées: " + json.dumps({"items_stats": items[:3], "now": NOW})
+    with fake_backend():
+        out = client.post("/llm/run", json={"task": "srs-plan", "prompt": prompt}).json()
+    assert out["provider"] == "native" and len(json.loads(out["output"])["schedule"]) == 3
+
+
+def test_decks_are_shared_between_concurrent_requests_and_evicted_when_idle(tmp_path, monkeypatch):
+    from concurrent.futures import ThreadPoolExecutor
+    monkeypatch.setattr(srv, "SRS_DIR", str(tmp_path))
+    monkeypatch.setattr(srv, "_SRS_DECKS", OrderedDict())
+    monkeypatch.setattr(srv, "_SRS_MAX_DECKS", 2)
+    client = TestClient(srv.app)
+
+    def review(i):
+        item = {"id": f"q{i}", "difficulty": "easy", "last_result": "correct", "last_seen": "2026-03-01T10:00:00Z"}
+        return client.post("/srs/plan", json={"items_stats": [item], "deck": "bob", "now": NOW}).status_code
+    with ThreadPoolExecutor(8) as pool:
+        assert set(pool.map(review, range(40))) == {200}
+    assert client.get("/srs/due/bob").json()["cards"] == 40  # no update lost to a second store
+    for deck in ("d1", "d2", "d3"):
+        client.get(f"/srs/due/{deck}")
+    assert list(srv._SRS_DECKS) == ["d2", "d3"]
+    assert client.get("/srs/due/bob").json()["cards"] == 40  # reloaded from disk
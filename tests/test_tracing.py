@@ -0,0 +1,30 @@
+from fastapi.testclient import TestClient
+import server.app as srv
+from benchmarks.endpoints import fake_backend
+
+
+def test_chat_exposes_stage_spans_and_json_trace(monkeypatch):
+    monkeypatch.setattr(srv, "_ADMIN_TOKEN", "s3cret")
+    with fake_backend(token_ms=0.0) as app:
+        client = TestClient(app)
+        r = client.post("/api/chat", json={"prompt": "À quoi sert l'inertie ?", "context": "L'inertie est une propriété."},
+                        headers={"X-Trace": "1"})
+        timing = r.headers["Server-Timing"]
+        for stage in ("parse", "prompt", "select", "prompt_eval", "decode", "postprocess", "log", "total"):
+            assert f"{stage};dur=" in timing
+        tid = r.headers["X-Trace-Id"]
+        assert client.get(f"/admin/traces/{tid}").status_code == 403
+        trace = client.get(f"/admin/traces/{tid}", headers={"X-Admin-Token": "s3cret"}).json()
+        assert trace["path"] == "/api/chat" and any(s["name"] == "decode" for s in trace["spans"])
+
+
+def test_profiling_is_admin_only_and_covers_next_requests(monkeypatch):
+    monkeypatch.setattr(srv, "_ADMIN_TOKEN", "s3cret")
+    client = TestClient(srv.app)
+    assert client.post("/admin/profile", json={"requests": 2}).status_code == 403
+    r = client.post("/admin/profile", json={"requests": 2}, headers={"X-Admin-Token": "s3cret"})
+    assert r.json()["remaining"] == 2
+    for _ in range(3):
+        client.post("/v1/extract", json={"text": "La force se définit comme une action mécanique. " * 2000})
+    r = client.get("/admin/profile", headers={"X-Admin-Token": "s3cret"})
+    assert r.status_code == 200 and '"profiled_requests": 2' in r.headers["X-Profile-Status"]
@@ -0,0 +1,50 @@
+import copy, json, os, shutil
+from fastapi.testclient import TestClient
+import validation
+from benchmarks.endpoints import _MCQ, fake_backend
+
+
+def test_all_schema_and_extra_rule_errors_are_reported():
+    bad = copy.deepcopy(_MCQ)
+    bad["items"][0]["difficulty"] = "impossible"
+    bad["items"][1]["options"] = ["a", "a", "b"]
+    del bad["items"][2]["rationale"]
+    res = validation.validate("mcq", bad)
+    errs = res["errors"]
+    assert not res["ok"]
+    assert any(e.startswith("items/0/difficulty:") for e in errs)
+    assert any(e.startswith("items/1/options:") for e in errs)
+    assert any(e.startswith("items/2:") and "rationale" in e for e in errs)
+    assert "q1: options must be 4" in errs and "q0: invalid difficulty" in errs
+    assert validation.validate("mcq", [1, 2])["errors"] == ["<root>: [1, 2] is not of type 'object'"]
+
+
+def test_validator_is_compiled_once_and_reloaded_when_the_schema_changes(tmp_path, monkeypatch):
+    shutil.copy(os.path.join(validation.SCHEMAS_DIR, "mcq.schema.json"), tmp_path / "mcq.schema.json")
+    monkeypatch.setattr(validation, "SCHEMAS_DIR", str(tmp_path))
+    monkeypatch.setattr(validation, "_VALIDATORS", {})
+    first = validation._validator("mcq")
+    assert validation._validator("mcq") is first
+    schema = json.loads((tmp_path / "mcq.schema.json").read_text(encoding="utf-8"))
+    schema["properties"]["status"] = {"enum": ["ok"]}
+    (tmp_path / "mcq.schema.json").write_text(json.dumps(schema), encoding="utf-8")
+    st = os.stat(tmp_path / "mcq.schema.json")
+    os.utime(tmp_path / "mcq.schema.json", (st.st_atime, st.st_mtime + 5))
+    assert validation._validator("mcq") is not first
+    assert not validation.validate("mcq", {**_MCQ, "status": "insufficient_context"})["ok"]
+
+
+def test_batch_endpoint_accepts_arrays_and_ndjson():
+    bad = copy.deepcopy(_MCQ)
+    bad["items"][0]["answer_index"] = 7
+    with fake_backend() as app:
+        client = TestClient(app)
+        r = client.post("/validate/mcq/batch", json=[_MCQ, bad, _MCQ]).json()
+        assert (r["count"], r["valid"], r["invalid"]) == (3, 2, 1) and not r["results"][1]["ok"]
+        assert client.post("/validate/mcq/batch", json={"payloads": [_MCQ]}).json()["valid"] == 1
+        body = "\n".join([json.dumps(_MCQ), "{pas du json", "", json.dumps(bad)])
+        r = client.post("/validate/mcq/batch", content=body, headers={"Content-Type": "application/x-ndjson"}).json()
+        assert [x["ok"] for x in r["results"]] == [True, False, False]
+        assert r["results"][1]["errors"][0].startswith("invalid JSON")
+        assert client.post("/validate/mcq/batch", json={"autre": 1}).status_code == 400
+        assert client.post("/validate/quiz/batch", json=[]).json()["errors"] == ["unknown schema kind"]
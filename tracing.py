@@ -0,0 +1,162 @@
+from __future__ import annotations
+from collections import Counter, OrderedDict, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Deque, Dict, Iterator, List, Optional, Tuple
+import os, sys, time, threading, uuid
+
+# Spans are recorded only while a request trace is active; otherwise span() is a no-op
+_current: ContextVar[Optional["Trace"]] = ContextVar("coach_trace", default=None)
+
+
+class Trace:
+    __slots__ = ("id", "t0", "spans")
+
+    def __init__(self) -> None:
+        self.id = uuid.uuid4().hex[:12]
+        self.t0 = time.perf_counter()
+        self.spans: List[Tuple[str, float, float]] = []
+
+    def add(self, name: str, start: float, end: float) -> None:
+        self.spans.append((name, start, end))
+
+    def server_timing(self, total_end: Optional[float] = None) -> str:
+        # Same-name spans are summed so a header stays short even for token loops
+        agg: "OrderedDict[str, float]" = OrderedDict()
+        for name, s, e in self.spans:
+            agg[name] = agg.get(name, 0.0) + (e - s)
+        parts = [f"{n};dur={d * 1000:.1f}" for n, d in agg.items()]
+        if total_end is not None:
+            parts.append(f"total;dur={(total_end - self.t0) * 1000:.1f}")
+        return ", ".join(parts)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"id": self.id, "spans": [
+            {"name": n, "start_ms": round((s - self.t0) * 1000, 3), "dur_ms": round((e - s) * 1000, 3)}
+            for n, s, e in self.spans
+        ]}
+
+
+def begin() -> Tuple[Trace, Any]:
+    tr = Trace()
+    return tr, _current.set(tr)
+
+
+def end(token: Any) -> None:
+    _current.reset(token)
+
+
+def active() -> bool:
+    return _current.get() is not None
+
+
+@contextmanager
+def span(name: str) -> Iterator[None]:
+    tr = _current.get()
+    if tr is None:
+        yield
+        return
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        tr.add(name, t0, time.perf_counter())
+
+
+def record(name: str, start: float, end: Optional[float] = None) -> None:
+    """Record a span measured by the caller (e.g. time to first token)."""
+    tr = _current.get()
+    if tr is not None:
+        tr.add(name, start, time.perf_counter() if end is None else end)
+
+
+class TraceBuffer:
+    """Last N JSON traces, for requests that asked for one (X-Trace: 1)."""
+
+    def __init__(self, maxlen: int = 200):
+        self._items: Deque[Dict[str, Any]] = deque(maxlen=maxlen)
+
+    def add(self, trace: Trace, path: str, method: str, status: int) -> None:
+        self._items.append({**trace.to_dict(), "path": path, "method": method, "status": status, "at": time.time()})
+
+    def get(self, tid: str) -> Optional[Dict[str, Any]]:
+        return next((t for t in reversed(self._items) if t["id"] == tid), None)
+
+    def recent(self, n: int = 20) -> List[Dict[str, Any]]:
+        return list(self._items)[-n:][::-1]
+
+
+# Leaf functions of idle threads (pool workers, selectors) are not interesting samples
+_IDLE_FILES = ("threading.py", "selectors.py", "queue.py", "connection.py")
+
+
+class StackSampler:
+    """Samples every thread's Python stack while armed requests are running.
+
+    arm(n) profiles the next n requests; results accumulate as collapsed stacks
+    (one 'frame;frame;frame count' line each), the input format of flamegraph.pl
+    and speedscope. When not armed, begin() is a single integer check.
+    """
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.remaining = 0
+        self._lock = threading.Lock()
+        self._active = 0
+        self._done = 0
+        self._samples = 0
+        self._counts: Counter = Counter()
+        self._thread: Optional[threading.Thread] = None
+
+    def arm(self, requests: int) -> None:
+        with self._lock:
+            self.remaining = max(0, int(requests))
+            self._done, self._samples = 0, 0
+            self._counts = Counter()
+
+    def begin(self) -> bool:
+        if not self.remaining:
+            return False
+        with self._lock:
+            if self.remaining <= 0:
+                return False
+            self.remaining -= 1
+            self._active += 1
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+        return True
+
+    def end(self) -> None:
+        with self._lock:
+            self._active = max(0, self._active - 1)
+            self._done += 1
+
+    def status(self) -> Dict[str, Any]:
+        return {"remaining": self.remaining, "active": self._active, "profiled_requests": self._done,
+                "samples": self._samples, "interval_ms": self.interval * 1000}
+
+    def folded(self) -> str:
+        with self._lock:
+            items = sorted(self._counts.items(), key=lambda kv: -kv[1])
+        return "".join(f"{stack} {n}\n" for stack, n in items)
+
+    def _run(self) -> None:
+        me = threading.get_ident()
+        while True:
+            with self._lock:
+                if self._active <= 0:
+                    self._thread = None
+                    return
+            for tid, frame in sys._current_frames().items():
+                if tid == me or os.path.basename(frame.f_code.co_filename) in _IDLE_FILES:
+                    continue
+                stack = []
+                f: Any = frame
+                while f is not None:
+                    stack.append(f"{f.f_code.co_name} ({os.path.basename(f.f_code.co_filename)}:{f.f_code.co_firstlineno})")
+                    f = f.f_back
+                with self._lock:
+                    self._counts[";".join(reversed(stack))] += 1
+                    self._samples += 1
+            time.sleep(self.interval)
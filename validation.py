@@ -0,0 +1,152 @@
+from __future__ import annotations
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+import os, re, json, threading
+from jsonschema.validators import validator_for
+
+SCHEMAS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "schemas")
+KINDS = ("mcq", "sheet")
+
+# kind -> (schema file mtime, compiled validator); rebuilt only when the file changes
+_VALIDATORS: Dict[str, Tuple[float, Any]] = {}
+_LOCK = threading.Lock()
+
+
+def _validator(kind: str) -> Optional[Any]:
+    path = os.path.join(SCHEMAS_DIR, f"{kind}.schema.json")
+    try:
+        mtime = os.stat(path).st_mtime
+    except OSError:
+        return None
+    cached = _VALIDATORS.get(kind)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+    with _LOCK:
+        with open(path, 'r', encoding='utf-8') as f:
+            schema = json.load(f)
+        cls = validator_for(schema)
+        cls.check_schema(schema)  # once per schema version, not per payload
+        _VALIDATORS[kind] = (mtime, cls(schema))
+    return _VALIDATORS[kind][1]
+
+
+def compile_all() -> List[str]:
+    """Compile every schema now (server startup) instead of on the first request."""
+    return [k for k in KINDS if _validator(k) is not None]
+
+
+def _schema_error(e: Any) -> str:
+    where = "/".join(str(p) for p in e.absolute_path)
+    return f"{where or '<root>'}: {e.message}"
+
+
+def _extra_validate_mcq(payload: Dict[str, Any]) -> list:
+    errs = []
+    items = payload.get('items') or []
+    if not isinstance(items, list) or not items:
+        errs.append('items empty')
+        return errs
+    for it in items:
+        opts = it.get('options') or []
+        if len(opts) != 4:
+            errs.append(f"{it.get('id')}: options must be 4")
+        if len(set(opts)) != len(opts):
+            errs.append(f"{it.get('id')}: duplicate options")
+        ai = it.get('answer_index')
+        if not isinstance(ai, int) or ai < 0 or ai > 3:
+            errs.append(f"{it.get('id')}: answer_index out of range")
+        if isinstance(ai, int) and 0 <= ai < len(opts):
+            if isinstance(opts[ai], str) and re.search(r"toutes", opts[ai], re.I):
+                errs.append(f"{it.get('id')}: invalid 'Toutes les réponses'")
+        q = (it.get('question') or '').strip().lower()
+        ans = ''
+        if isinstance(ai, int) and 0 <= ai < len(opts):
+            ans = (opts[ai] or '').strip().lower()
+        # Leakage only if answer is substantive (>=4 chars or contains space)
+        if ans and q and (len(ans) >= 4 or ' ' in ans):
+            frag = ans[: min(12, len(ans))]
+            if frag and frag in q:
+                errs.append(f"{it.get('id')}: answer leakage in question")
+        if it.get('difficulty') not in ("easy","medium","hard"):
+            errs.append(f"{it.get('id')}: invalid difficulty")
+        if it.get('bloom') not in ("rappel","compréhension","application","analyse"):
+            errs.append(f"{it.get('id')}: invalid bloom")
+    return errs
+
+
+def _extra_validate_sheet(payload: Dict[str, Any]) -> list:
+    errs = []
+    sheets = payload.get('sheets') or []
+    if not isinstance(sheets, list) or not sheets:
+        errs.append('sheets empty')
+        return errs
+    for s in sheets:
+        title = s.get('title')
+        if not isinstance(title, str) or not title.strip():
+            errs.append('missing title')
+        sv = s.get('short_version') or {}
+        mv = s.get('medium_version') or {}
+        lv = s.get('long_version') or {}
+        if sv.get('type') != 'bullet_points':
+            errs.append(f"{title or '?'}: short_version.type must be bullet_points")
+        if not isinstance(sv.get('content'), list) or not (1 <= len(sv['content']) <= 5):
+            errs.append(f"{title or '?'}: short_version.content 1..5 bullets")
+        if mv.get('type') != 'paragraphs':
+            errs.append(f"{title or '?'}: medium_version.type must be paragraphs")
+        if not isinstance(mv.get('content'), list) or not (1 <= len(mv['content']) <= 2):
+            errs.append(f"{title or '?'}: medium_version.content 1..2 paragraphs")
+        if lv.get('type') != 'developed' or not isinstance(lv.get('content'), str):
+            errs.append(f"{title or '?'}: long_version.type must be developed with string content")
+        if isinstance(lv.get('content'), str) and len(lv['content']) < 100:
+            errs.append(f"{title or '?'}: long_version too short (<100 chars)")
+        if not isinstance(s.get('citations'), list):
+            errs.append(f"{title or '?'}: citations missing")
+    return errs
+
+
+def validate(kind: str, payload: Any) -> Dict[str, Any]:
+    """Check an LLM payload against schemas/<kind>.schema.json plus the extra rules: {"ok", "errors"}.
+
+    Every schema violation is reported (by JSON path), followed by the extra rules' errors.
+    """
+    if kind not in KINDS:
+        return {"ok": False, "errors": ["unknown schema kind"]}
+    v = _validator(kind)
+    if v is None:
+        return {"ok": False, "errors": ["schema not found"]}
+    errors = [_schema_error(e) for e in sorted(v.iter_errors(payload), key=lambda e: list(map(str, e.absolute_path)))]
+    extra = _extra_validate_mcq if kind == 'mcq' else _extra_validate_sheet
+    try:
+        errors.extend(extra(payload))
+    except (AttributeError, TypeError):
+        # Payload too malformed for the extra rules; the schema errors already say why
+        if not errors:
+            raise
+    return {"ok": not errors, "errors": errors}
+
+
+class _BadLine:
+    __slots__ = ("error",)
+
+    def __init__(self, error: str):
+        self.error = error
+
+
+def iter_ndjson(text: str) -> Iterator[Any]:
+    """One payload per non-empty line; a line that is not JSON is reported, not fatal."""
+    for line in text.splitlines():
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError as e:
+            yield _BadLine(f"invalid JSON: {e}")
+
+
+def validate_many(kind: str, payloads: Iterable[Any]) -> Dict[str, Any]:
+    """validate() over many payloads: {"count", "valid", "invalid", "results": [{"index", "ok", "errors"}]}."""
+    results = []
+    for i, p in enumerate(payloads):
+        res = {"ok": False, "errors": [p.error]} if isinstance(p, _BadLine) else validate(kind, p)
+        results.append({"index": i, **res})
+    valid = sum(r["ok"] for r in results)
+    return {"kind": kind, "count": len(results), "valid": valid, "invalid": len(results) - valid, "results": results}